@@ -19,6 +19,12 @@ export const useDebouncedSuggestions = ({
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const abortControllerRef = useRef<AbortController | null>(null);
+  // One suggestion session per input, so the server can refine results keystroke by keystroke
+  const sessionIdRef = useRef<string>(
+    typeof crypto !== 'undefined' && 'randomUUID' in crypto
+      ? crypto.randomUUID()
+      : Math.random().toString(36).slice(2) + Date.now().toString(36)
+  );
 
   useEffect(() => {
     // Cancel previous request
@@ -42,7 +48,7 @@ export const useDebouncedSuggestions = ({
       setError(null);
 
       try {
-        const response = await tradeAPI.getFuzzySuggestions(query, searchType, 10);
+        const response = await tradeAPI.getFuzzySuggestions(query, searchType, 10, sessionIdRef.current);
         
         // Only update if this request wasn't aborted
         if (!abortControllerRef.current?.signal.aborted) {
@@ -96,13 +96,32 @@ export default function Home() {
       };
 
       let results: SearchResponse;
+      // With a top importers/suppliers panel open, fetch rows and both panels in one round-trip
+      const refreshPanels = showTopImporters || showTopSuppliers;
+      let panelsRefreshed = false;
       
       // Call appropriate API based on what's selected
       if (productNames.length > 0) {
-        results = await tradeAPI.searchProducts(productNames, filters);
+        if (refreshPanels) {
+          const dashboard = await tradeAPI.getDashboard(productNames, 'product_name', filters);
+          results = dashboard.search;
+          setTopImporters(dashboard.top_importers);
+          setTopSuppliers(dashboard.top_suppliers);
+          panelsRefreshed = true;
+        } else {
+          results = await tradeAPI.searchProducts(productNames, filters);
+        }
         setSuccessMessage(`Found ${results.count} products matching your search criteria`);
       } else if (uniqueProductNames.length > 0) {
-        results = await tradeAPI.searchUniqueProducts(uniqueProductNames, filters);
+        if (refreshPanels) {
+          const dashboard = await tradeAPI.getDashboard(uniqueProductNames, 'unique_product_name', filters);
+          results = dashboard.search;
+          setTopImporters(dashboard.top_importers);
+          setTopSuppliers(dashboard.top_suppliers);
+          panelsRefreshed = true;
+        } else {
+          results = await tradeAPI.searchUniqueProducts(uniqueProductNames, filters);
+        }
         setSuccessMessage(`Found ${results.count} unique products matching your search criteria`);
       } else if (entities.length > 0) {
         results = await tradeAPI.searchEntities(entities, filters);
@@ -117,12 +136,12 @@ export default function Home() {
       setShowFilters(true);
       
       // Auto-refresh top importers if they were already showing
-      if (showTopImporters && (productNames.length > 0 || uniqueProductNames.length > 0)) {
+      if (!panelsRefreshed && showTopImporters && (productNames.length > 0 || uniqueProductNames.length > 0)) {
         await refreshTopImporters(filters);
       }
       
       // Auto-refresh top suppliers if they were already showing
-      if (showTopSuppliers && (productNames.length > 0 || uniqueProductNames.length > 0)) {
+      if (!panelsRefreshed && showTopSuppliers && (productNames.length > 0 || uniqueProductNames.length > 0)) {
         await refreshTopSuppliers(filters);
       }
       
@@ -7,6 +7,14 @@ export interface SuggestionResponse {
   search_type: string;
 }
 
+export interface BatchSuggestionResponse {
+  results: {
+    query: string;
+    suggestions: { name: string; score: number }[];
+  }[];
+  search_type: string;
+}
+
 export interface SearchFilters {
   hs_code?: string;
   importer_id?: string;
@@ -17,10 +25,17 @@ export interface SearchFilters {
   date_mode?: 'single' | 'range';
 }
 
+// Entity search: match names as importer, supplier or either; rows carry matched_role
+export type EntityRole = 'importer' | 'supplier' | 'either';
+
 export interface SearchResponse {
   data: any[];
   count: number;
   search_type: string;
+  total_records?: number | null;
+  page_size?: number;
+  has_more?: boolean;
+  next_cursor?: string | null;
   error?: string;
 }
 
@@ -64,20 +79,32 @@ export interface TopSuppliersResponse {
   error?: string;
 }
 
+export interface DashboardResponse {
+  search: SearchResponse;
+  top_importers: TopImportersResponse;
+  top_suppliers: TopSuppliersResponse;
+  search_type: string;
+  products_searched: string[];
+  error?: string;
+}
+
 export const tradeAPI = {
   // Get fuzzy suggestions with debouncing support
   async getFuzzySuggestions(
     query: string, 
     searchType: 'product_name' | 'unique_product_name' | 'entity', 
-    limit: number = 10
+    limit: number = 10,
+    sessionId?: string
   ): Promise<SuggestionResponse> {
     if (!query || query.length < 2) {
       return { suggestions: [], query, search_type: searchType };
     }
 
     try {
+      // The session id lets the server narrow the previous keystroke's candidates instead of starting over
+      const session = sessionId ? `&session_id=${encodeURIComponent(sessionId)}` : '';
       const response = await fetch(
-        `${API_BASE_URL}/api/search/suggestions?query=${encodeURIComponent(query)}&search_type=${searchType}&limit=${limit}`
+        `${API_BASE_URL}/api/search/suggestions?query=${encodeURIComponent(query)}&search_type=${searchType}&limit=${limit}${session}`
       );
       
       if (!response.ok) {
@@ -91,6 +118,34 @@ export const tradeAPI = {
     }
   },
 
+  // Best matches with scores for many queries at once (e.g. a pasted product list)
+  async getBatchSuggestions(
+    queries: string[],
+    searchType: 'product_name' | 'unique_product_name' | 'entity',
+    limit: number = 5
+  ): Promise<BatchSuggestionResponse> {
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/search/suggestions/batch`, {
+        method: 'POST',
+        headers: { 
+          'Content-Type': 'application/json',
+          'Accept': 'application/json'
+        },
+        body: JSON.stringify({ queries, search_type: searchType, limit })
+      });
+      
+      if (!response.ok) {
+        const errorData = await response.text();
+        throw new Error(`HTTP error! status: ${response.status}, message: ${errorData}`);
+      }
+      
+      return response.json();
+    } catch (error) {
+      console.error('Error fetching batch suggestions:', error);
+      throw new Error(error instanceof Error ? error.message : 'Failed to fetch batch suggestions');
+    }
+  },
+
   // Search by product names
   async searchProducts(productNames: string[], filters?: SearchFilters): Promise<SearchResponse> {
     try {
@@ -148,7 +203,7 @@ export const tradeAPI = {
   },
 
   // Search by entities
-  async searchEntities(entities: string[], filters?: SearchFilters): Promise<SearchResponse> {
+  async searchEntities(entities: string[], filters?: SearchFilters, role: EntityRole = 'either'): Promise<SearchResponse> {
     try {
       const response = await fetch(`${API_BASE_URL}/api/search/entities`, {
         method: 'POST',
@@ -158,6 +213,7 @@ export const tradeAPI = {
         },
         body: JSON.stringify({ 
           entities, 
+          role,
           filters: filters || {} 
         })
       });
@@ -285,5 +341,38 @@ export const tradeAPI = {
       console.error('Error fetching top suppliers:', error);
       throw new Error(error instanceof Error ? error.message : 'Failed to fetch top suppliers');
     }
+  },
+
+  // Search rows, top importers and top suppliers in one request (queried concurrently on the server)
+  async getDashboard(
+    names: string[],
+    searchType: 'product_name' | 'unique_product_name',
+    filters?: SearchFilters
+  ): Promise<DashboardResponse> {
+    try {
+      const isProduct = searchType === 'product_name';
+      const response = await fetch(`${API_BASE_URL}/api/search/dashboard/${isProduct ? 'products' : 'unique-products'}`, {
+        method: 'POST',
+        headers: { 
+          'Content-Type': 'application/json',
+          'Accept': 'application/json'
+        },
+        body: JSON.stringify({ 
+          [isProduct ? 'product_names' : 'unique_product_names']: names, 
+          filters: filters || {} 
+        })
+      });
+      
+      if (!response.ok) {
+        const errorData = await response.text();
+        throw new Error(`HTTP error! status: ${response.status}, message: ${errorData}`);
+      }
+      
+      const data = await response.json();
+      return data;
+    } catch (error) {
+      console.error('Error fetching dashboard:', error);
+      throw new Error(error instanceof Error ? error.message : 'Failed to fetch dashboard');
+    }
   }
 };
\ No newline at end of file
@@ -1,19 +1,69 @@
 # app.py
-from fastapi import FastAPI, HTTPException, Query
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from models import ProductSearchRequest, UniqueProductSearchRequest, EntitySearchRequest
+from models import ProductSearchRequest, UniqueProductSearchRequest, EntitySearchRequest, BatchSuggestionRequest
+from db import (
+    init_engine,
+    dispose_engine,
+    get_pool_stats,
+    init_async_engine,
+    dispose_async_engine,
+    shutdown_executor
+)
+from corpora import CORPUS_COLUMNS, preload_snapshots, start_corpus_refresher, stop_corpus_refresher
+from rollups import start_rollup_refresher, stop_rollup_refresher, get_rollup_status
+from result_cache import result_cache
+from metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, TimedJSONResponse, render_metrics
+from tracing import TracingMiddleware, stop_tracing
+from pagination import decode_cursor
+from filter_compiler import compile_filters
+from export import EXPORT_FORMATS, export_headers, export_stream
+from arrow_format import wants_arrow, arrow_search_response, arrow_query_response
 from services import (
+    ENTITY_ROLES,
+    entity_match,
+    name_match,
+    build_top_importers_query,
+    build_top_suppliers_query,
     get_fuzzy_suggestions,
-    search_by_product_names,
-    search_by_unique_product_names,
-    search_by_entities,
-    get_top_importers_by_product,
-    get_top_importers_by_unique_product,
-    get_top_suppliers_by_product,
-    get_top_suppliers_by_unique_product
+    get_batch_suggestions,
+    shutdown_batch_executor,
+    SUGGESTION_BATCH_MAX_QUERIES,
+    search_by_product_names_async,
+    search_by_unique_product_names_async,
+    search_by_entities_async,
+    get_top_importers_by_product_async,
+    get_top_importers_by_unique_product_async,
+    get_top_suppliers_by_product_async,
+    get_top_suppliers_by_unique_product_async,
+    get_dashboard_by_product_async,
+    get_dashboard_by_unique_product_async
 )
 
-app = FastAPI(title="Trade Analytics API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled engine per worker process, created up front and closed on shutdown
+    try:
+        init_engine()
+        init_async_engine()
+    except Exception as e:
+        print(f"Error creating database engine: {e}")
+    preload_snapshots()
+    start_corpus_refresher()
+    start_rollup_refresher()
+    yield
+    stop_rollup_refresher()
+    stop_corpus_refresher()
+    await dispose_async_engine()
+    dispose_engine()
+    shutdown_executor()
+    shutdown_batch_executor()
+    stop_tracing()
+
+app = FastAPI(title="Trade Analytics API", lifespan=lifespan, default_response_class=TimedJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,126 +72,364 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
+def check_cursor(cursor):
+    """Reject malformed pagination cursors with a 400 instead of a database error"""
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+def check_entity_role(role: str):
+    """Reject an unknown entity search role with a 400"""
+    if role not in ENTITY_ROLES:
+        raise HTTPException(status_code=400, detail=f"Unknown entity role '{role}', use one of {list(ENTITY_ROLES)}")
+
+def check_filters(filters):
+    """Reject malformed filter values (e.g. a non-numeric HS code) with a 400"""
+    try:
+        compile_filters(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/")
 def root():
     return {"message": "Trade Analytics API", "status": "running"}
 
+@app.get("/api/db/pool")
+def db_pool_stats():
+    """Connection pool usage for this worker"""
+    return get_pool_stats()
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    """Result cache hit/miss counters for this worker"""
+    return result_cache.stats()
+
+@app.get("/api/rollups")
+def rollup_status():
+    """Whether top-N queries can be answered from the monthly rollups, and how often they were"""
+    return get_rollup_status()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint: per-stage latency histograms, cache, pool and corpus counters for this worker"""
+    return Response(content=render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.delete("/api/cache")
+def clear_cache():
+    """Drop all cached search results"""
+    result_cache.clear()
+    return {"cleared": True}
+
 @app.get("/api/search/suggestions")
 def get_suggestions(
     query: str = Query(...),
     search_type: str = Query(...),
-    limit: int = Query(10)
+    limit: int = Query(10),
+    session_id: Optional[str] = Query(None, max_length=64)
 ):
-    """Get fuzzy search suggestions"""
+    """Get fuzzy search suggestions; a per-input session_id lets each keystroke narrow the previous one's candidates"""
     try:
-        suggestions = get_fuzzy_suggestions(query, search_type, limit)
+        suggestions = get_fuzzy_suggestions(query, search_type, limit, session_id)
         return {
             "suggestions": suggestions,
             "query": query,
             "search_type": search_type
         }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/search/suggestions/batch")
+def get_batch_suggestions_endpoint(request: BatchSuggestionRequest):
+    """Best corpus matches with scores for many queries at once (e.g. a pasted product list)"""
+    if request.search_type not in CORPUS_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Unknown search_type {request.search_type!r}")
+    if len(request.queries) > SUGGESTION_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {SUGGESTION_BATCH_MAX_QUERIES} queries per batch")
+    try:
+        return {
+            "results": get_batch_suggestions(request.queries, request.search_type, request.limit),
+            "search_type": request.search_type
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/search/products")
-def search_products(request: ProductSearchRequest):
+async def search_products(request: ProductSearchRequest, http_request: Request, format: Optional[str] = Query(None)):
     """Search by product names"""
     try:
         if not request.product_names:
             raise HTTPException(status_code=400, detail="Product names cannot be empty")
         
-        result = search_by_product_names(request.product_names, request.filters)
+        check_cursor(request.cursor)
+        check_filters(request.filters)
+        if wants_arrow(http_request, format):
+            return await arrow_search_response(
+                name_match("product_name", request.product_names),
+                request.filters,
+                "product_name",
+                page_size=request.page_size,
+                cursor=request.cursor
+            )
+        result = await search_by_product_names_async(
+            request.product_names,
+            request.filters,
+            page_size=request.page_size,
+            cursor=request.cursor,
+            include_total=request.include_total
+        )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/search/unique-products")
-def search_unique_products(request: UniqueProductSearchRequest):
+async def search_unique_products(request: UniqueProductSearchRequest, http_request: Request, format: Optional[str] = Query(None)):
     """Search by unique product names"""
     try:
         if not request.unique_product_names:
             raise HTTPException(status_code=400, detail="Unique product names cannot be empty")
         
-        result = search_by_unique_product_names(request.unique_product_names, request.filters)
+        check_cursor(request.cursor)
+        check_filters(request.filters)
+        if wants_arrow(http_request, format):
+            return await arrow_search_response(
+                name_match("unique_product_name", request.unique_product_names),
+                request.filters,
+                "unique_product_name",
+                page_size=request.page_size,
+                cursor=request.cursor
+            )
+        result = await search_by_unique_product_names_async(
+            request.unique_product_names,
+            request.filters,
+            page_size=request.page_size,
+            cursor=request.cursor,
+            include_total=request.include_total
+        )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/search/entities")
-def search_entities(request: EntitySearchRequest):
+async def search_entities(request: EntitySearchRequest, http_request: Request, format: Optional[str] = Query(None)):
     """Search by entity names"""
     try:
         if not request.entities:
             raise HTTPException(status_code=400, detail="Entities cannot be empty")
         
-        result = search_by_entities(request.entities, request.filters)
+        check_entity_role(request.role)
+        check_cursor(request.cursor)
+        check_filters(request.filters)
+        if wants_arrow(http_request, format):
+            return await arrow_search_response(
+                entity_match(request.entities, request.role),
+                request.filters,
+                "entity",
+                page_size=request.page_size,
+                cursor=request.cursor
+            )
+        result = await search_by_entities_async(
+            request.entities,
+            request.filters,
+            page_size=request.page_size,
+            cursor=request.cursor,
+            include_total=request.include_total,
+            role=request.role
+        )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Fixed top importers endpoints - using existing request models
 @app.post("/api/search/top-importers/products")
-async def get_top_importers_products(request: ProductSearchRequest):
+async def get_top_importers_products(request: ProductSearchRequest, http_request: Request, format: Optional[str] = Query(None)):
     """Get top importers for product names"""
     try:
         if not request.product_names:
             raise HTTPException(status_code=400, detail="Product names cannot be empty")
             
-        result = get_top_importers_by_product(
+        check_filters(request.filters)
+        if wants_arrow(http_request, format):
+            query, params = build_top_importers_query("product_name", request.product_names, request.filters, limit=10)
+            return await arrow_query_response(query, params, "top_importers")
+        result = await get_top_importers_by_product_async(
             request.product_names, 
             request.filters,
             limit=10
         )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/search/top-importers/unique-products")
-async def get_top_importers_unique_products(request: UniqueProductSearchRequest):
+async def get_top_importers_unique_products(request: UniqueProductSearchRequest, http_request: Request, format: Optional[str] = Query(None)):
     """Get top importers for unique product names"""
     try:
         if not request.unique_product_names:
             raise HTTPException(status_code=400, detail="Unique product names cannot be empty")
             
-        result = get_top_importers_by_unique_product(
+        check_filters(request.filters)
+        if wants_arrow(http_request, format):
+            query, params = build_top_importers_query("unique_product_name", request.unique_product_names, request.filters, limit=10)
+            return await arrow_query_response(query, params, "top_importers")
+        result = await get_top_importers_by_unique_product_async(
             request.unique_product_names, 
             request.filters,
             limit=10
         )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Top Suppliers endpoints
 @app.post("/api/search/top-suppliers/products")
-async def get_top_suppliers_products(request: ProductSearchRequest):
+async def get_top_suppliers_products(request: ProductSearchRequest, http_request: Request, format: Optional[str] = Query(None)):
     """Get top suppliers for product names"""
     try:
         if not request.product_names:
             raise HTTPException(status_code=400, detail="Product names cannot be empty")
             
-        result = get_top_suppliers_by_product(
+        check_filters(request.filters)
+        if wants_arrow(http_request, format):
+            query, params = build_top_suppliers_query("product_name", request.product_names, request.filters, limit=10)
+            return await arrow_query_response(query, params, "top_suppliers")
+        result = await get_top_suppliers_by_product_async(
             request.product_names, 
             request.filters,
             limit=10
         )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/search/top-suppliers/unique-products")
-async def get_top_suppliers_unique_products(request: UniqueProductSearchRequest):
+async def get_top_suppliers_unique_products(request: UniqueProductSearchRequest, http_request: Request, format: Optional[str] = Query(None)):
     """Get top suppliers for unique product names"""
     try:
         if not request.unique_product_names:
             raise HTTPException(status_code=400, detail="Unique product names cannot be empty")
             
-        result = get_top_suppliers_by_unique_product(
+        check_filters(request.filters)
+        if wants_arrow(http_request, format):
+            query, params = build_top_suppliers_query("unique_product_name", request.unique_product_names, request.filters, limit=10)
+            return await arrow_query_response(query, params, "top_suppliers")
+        result = await get_top_suppliers_by_unique_product_async(
             request.unique_product_names, 
             request.filters,
             limit=10
         )
         return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Dashboard endpoints - rows + top importers + top suppliers in one round-trip
+@app.post("/api/search/dashboard/products")
+async def get_dashboard_products(request: ProductSearchRequest):
+    """Search rows, top importers and top suppliers for product names, run concurrently"""
+    try:
+        if not request.product_names:
+            raise HTTPException(status_code=400, detail="Product names cannot be empty")
+        
+        check_cursor(request.cursor)
+        check_filters(request.filters)
+        result = await get_dashboard_by_product_async(
+            request.product_names,
+            request.filters,
+            page_size=request.page_size,
+            cursor=request.cursor,
+            include_total=request.include_total,
+            limit=10
+        )
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/search/dashboard/unique-products")
+async def get_dashboard_unique_products(request: UniqueProductSearchRequest):
+    """Search rows, top importers and top suppliers for unique product names, run concurrently"""
+    try:
+        if not request.unique_product_names:
+            raise HTTPException(status_code=400, detail="Unique product names cannot be empty")
+        
+        check_cursor(request.cursor)
+        check_filters(request.filters)
+        result = await get_dashboard_by_unique_product_async(
+            request.unique_product_names,
+            request.filters,
+            page_size=request.page_size,
+            cursor=request.cursor,
+            include_total=request.include_total,
+            limit=10
+        )
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Bulk export endpoints - stream every matching row instead of one page
+def check_export_format(format: str):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format '{format}', use one of {list(EXPORT_FORMATS)}")
+
+@app.post("/api/export/products")
+def export_products(request: ProductSearchRequest, format: str = Query("ndjson")):
+    """Stream all rows for product names as NDJSON or CSV"""
+    check_export_format(format)
+    if not request.product_names:
+        raise HTTPException(status_code=400, detail="Product names cannot be empty")
+    check_filters(request.filters)
+    return StreamingResponse(
+        export_stream(name_match("product_name", request.product_names), request.filters, format),
+        media_type=EXPORT_FORMATS[format],
+        headers=export_headers("product_name", format)
+    )
+
+@app.post("/api/export/unique-products")
+def export_unique_products(request: UniqueProductSearchRequest, format: str = Query("ndjson")):
+    """Stream all rows for unique product names as NDJSON or CSV"""
+    check_export_format(format)
+    if not request.unique_product_names:
+        raise HTTPException(status_code=400, detail="Unique product names cannot be empty")
+    check_filters(request.filters)
+    return StreamingResponse(
+        export_stream(name_match("unique_product_name", request.unique_product_names), request.filters, format),
+        media_type=EXPORT_FORMATS[format],
+        headers=export_headers("unique_product_name", format)
+    )
+
+@app.post("/api/export/entities")
+def export_entities(request: EntitySearchRequest, format: str = Query("ndjson")):
+    """Stream all rows for entity names as NDJSON or CSV"""
+    check_export_format(format)
+    if not request.entities:
+        raise HTTPException(status_code=400, detail="Entities cannot be empty")
+    check_entity_role(request.role)
+    check_filters(request.filters)
+    return StreamingResponse(
+        export_stream(entity_match(request.entities, request.role), request.filters, format),
+        media_type=EXPORT_FORMATS[format],
+        headers=export_headers("entity", format)
+    )
@@ -0,0 +1,83 @@
+# arrow_format.py - Opt-in Apache Arrow IPC (columnar) responses for search and top-N endpoints
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from sqlalchemy import text
+from models import SearchFilters
+from db import get_engine, get_async_engine, run_sync
+from pagination import clamp_page_size, encode_cursor
+from services import build_match_search_query
+from bulk_match import load_temp_tables, load_temp_tables_async
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def wants_arrow(request: Request, format: Optional[str]) -> bool:
+    """Arrow is selected with ?format=arrow or an Accept header naming the Arrow stream type"""
+    if format:
+        return format.lower() == "arrow"
+    return ARROW_STREAM_MEDIA_TYPE in request.headers.get("accept", "")
+
+def fetch_columns(query: str, params: Dict) -> Tuple[List[str], List[List[Any]]]:
+    """Execute a query and transpose the driver's rows straight into per-column lists"""
+    with get_engine().connect() as conn:
+        params = load_temp_tables(conn, params)
+        result = conn.execute(text(query), params)
+        names = list(result.keys())
+        rows = result.fetchall()
+    return names, _transpose(names, rows)
+
+async def fetch_columns_async(query: str, params: Dict) -> Tuple[List[str], List[List[Any]]]:
+    """fetch_columns without blocking the event loop"""
+    engine = get_async_engine()
+    if engine is None:
+        return await run_sync(fetch_columns, query, params)
+    async with engine.connect() as conn:
+        params = await load_temp_tables_async(conn, params)
+        result = await conn.execute(text(query), params)
+        names = list(result.keys())
+        rows = result.fetchall()
+    return names, _transpose(names, rows)
+
+def _transpose(names: List[str], rows: List[Any]) -> List[List[Any]]:
+    if not rows:
+        return [[] for _ in names]
+    return [list(column) for column in zip(*rows)]
+
+def to_arrow_ipc(names: List[str], columns: List[List[Any]], metadata: Optional[Dict[str, str]] = None) -> bytes:
+    """Serialize column lists as a single-batch Arrow IPC stream"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise HTTPException(status_code=406, detail="Arrow responses require pyarrow on the server")
+    arrays = [pa.array(column) for column in columns]
+    schema = pa.schema([pa.field(name, array.type) for name, array in zip(names, arrays)], metadata=metadata)
+    batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+def arrow_response(names: List[str], columns: List[List[Any]], metadata: Dict[str, str]) -> Response:
+    # Pagination state travels in both schema metadata and headers so clients can use either
+    headers = {f"X-{key.replace('_', '-').title()}": value for key, value in metadata.items()}
+    return Response(content=to_arrow_ipc(names, columns, metadata), media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers)
+
+async def arrow_search_response(match: Any, filters: Optional[SearchFilters], search_type: str,
+                                page_size: Optional[int] = None, cursor: Optional[str] = None) -> Response:
+    """One keyset page of a row search as Arrow, mirroring the JSON response's pagination"""
+    query, params = build_match_search_query(match, filters, page_size, cursor)
+    names, columns = await fetch_columns_async(query, params)
+    page_size = clamp_page_size(page_size)
+    has_more = bool(columns) and len(columns[0]) > page_size
+    metadata = {"search_type": search_type, "has_more": str(has_more).lower()}
+    if has_more:
+        columns = [column[:page_size] for column in columns]
+        metadata["next_cursor"] = encode_cursor(
+            columns[names.index("reg_date")][-1], columns[names.index("id")][-1]
+        )
+    return arrow_response(names, columns, metadata)
+
+async def arrow_query_response(query: str, params: Dict, search_type: str) -> Response:
+    """Any (non-paginated) query result, e.g. a top-N aggregation, as Arrow"""
+    names, columns = await fetch_columns_async(query, params)
+    return arrow_response(names, columns, {"search_type": search_type})
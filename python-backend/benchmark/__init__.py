@@ -0,0 +1,5 @@
+# benchmark/__init__.py - Synthetic dataset generator, endpoint load driver and JSON reports
+#
+#   python -m benchmark generate --rows 10000000          fill DATABASE_URL with synthetic imports
+#   python -m benchmark load --url http://localhost:8000  replay mixed traffic, save a JSON report
+#   python -m benchmark compare base.json new.json        latency / throughput deltas between runs
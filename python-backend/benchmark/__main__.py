@@ -0,0 +1,65 @@
+# benchmark/__main__.py - Command line entry point: python -m benchmark {generate,load,compare}
+import argparse
+import asyncio
+import json
+from typing import Dict
+
+def _parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for item in filter(None, value.split(",")):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = int(weight)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Synthetic data, load runs and reports")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="fill DATABASE_URL with synthetic imports")
+    generate.add_argument("--rows", type=int, default=1000000)
+    generate.add_argument("--products", type=int, default=20000)
+    generate.add_argument("--entities", type=int, default=5000)
+    generate.add_argument("--skew", type=float, default=3.0, help="higher = more traffic on the top names")
+    generate.add_argument("--seed", type=int, default=42)
+    generate.add_argument("--truncate", action="store_true", help="empty the table first")
+    generate.add_argument("--with-indexes", action="store_true", help="create the index advisor's indexes afterwards")
+
+    load = commands.add_parser("load", help="replay mixed traffic against a running API")
+    load.add_argument("--url", default="http://localhost:8000")
+    load.add_argument("--users", type=int, default=20)
+    load.add_argument("--duration", type=float, default=60)
+    load.add_argument("--warmup", type=float, default=5)
+    load.add_argument("--mix", type=_parse_mix, default=None, help='e.g. "typeahead=50,search=30,dashboard=20"')
+    load.add_argument("--keystroke-interval", type=float, default=None)
+    load.add_argument("--server-pid", type=int, default=None, help="sample this process's RSS (and its workers')")
+    load.add_argument("--seed-queries", type=json.loads, default=None,
+                      help='JSON {"product_name": [...], ...} used to discover names')
+    load.add_argument("--out", default=None, help="report path (default benchmark-results/load-<time>.json)")
+
+    compare = commands.add_parser("compare", help="compare two saved load reports")
+    compare.add_argument("base")
+    compare.add_argument("new")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        from benchmark.generator import generate as generate_rows
+        print(generate_rows(args.rows, products=args.products, entities=args.entities, skew=args.skew,
+                            seed=args.seed, truncate=args.truncate, with_indexes=args.with_indexes))
+    elif args.command == "load":
+        from benchmark.load import KEYSTROKE_INTERVAL, run_load
+        from benchmark.report import build_report, print_report, save_report
+        result = asyncio.run(run_load(
+            args.url, args.users, args.duration, warmup=args.warmup, mix=args.mix,
+            seed_queries=args.seed_queries, server_pid=args.server_pid,
+            keystroke_interval=args.keystroke_interval if args.keystroke_interval is not None else KEYSTROKE_INTERVAL,
+        ))
+        report = build_report(result)
+        print_report(report)
+        print(f"Saved {save_report(report, args.out)}")
+    elif args.command == "compare":
+        from benchmark.report import compare_reports, print_comparison
+        with open(args.base) as base, open(args.new) as new:
+            print_comparison(compare_reports(json.load(base), json.load(new)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# benchmark/generator.py - Fills a Postgres stand-in with a realistic, skewed product_icegate_imports
+import time
+from typing import Any, Dict
+from sqlalchemy import text
+from db import get_engine
+
+SOURCE_TABLE = "analytics.product_icegate_imports"
+
+# Rows inserted (and committed) per statement; keeps WAL and memory bounded at 100M-row scale
+GENERATOR_CHUNK_ROWS = 1000000
+
+TABLE_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {SOURCE_TABLE} (
+        id BIGSERIAL PRIMARY KEY,
+        system_id TEXT, reg_date DATE, month_year TEXT, hs_code BIGINT, chapter INTEGER,
+        unique_product_name TEXT, quantity DOUBLE PRECISION, unit_quantity TEXT,
+        unit_price_usd DOUBLE PRECISION, total_value_usd DOUBLE PRECISION, importer_id TEXT,
+        true_importer_name TEXT, city TEXT, cha_number TEXT, type TEXT, true_supplier_name TEXT,
+        indian_port TEXT, foreign_port TEXT, exchange_rate_usd DOUBLE PRECISION, duty DOUBLE PRECISION,
+        product_name TEXT, supplier_name TEXT, supplier_address TEXT, target_date DATE,
+        importer TEXT, origin_country TEXT
+    )
+"""
+
+# Product (p), importer (i) and supplier (s) ranks are drawn as power(random(), skew) * N, so low ranks
+# dominate the way a few products and entities dominate real trade data. Names are built from word
+# pools plus the rank, and every tenth product carries a leading item code like the raw descriptions.
+CHUNK_INSERT = f"""
+    INSERT INTO {SOURCE_TABLE} (
+        system_id, reg_date, month_year, hs_code, chapter, unique_product_name, quantity, unit_quantity,
+        unit_price_usd, total_value_usd, importer_id, true_importer_name, city, cha_number, type,
+        true_supplier_name, indian_port, foreign_port, exchange_rate_usd, duty, product_name,
+        supplier_name, supplier_address, target_date, importer, origin_country
+    )
+    SELECT
+        'SYS' || g, d, to_char(d, 'YYYY-MM'), hs, hs / 1000000,
+        material || ' ' || form || ' GRADE ' || (p % 97), quantity, 'KGS',
+        round((shipment_value / greatest(quantity, 1))::numeric, 4), shipment_value,
+        lpad(i::text, 10, '0'), importer_name, 'CITY ' || (i % 60), 'CHA' || (g % 500), 'HOME',
+        supplier_name || ' CO LTD',
+        (ARRAY['INNSA1', 'INMAA1', 'INMUN1', 'INBOM4', 'INDEL4', 'INCCU1', 'INHZA1', 'INBLR4'])[1 + floor(power(random(), 2) * 8)::int],
+        (ARRAY['CNSHA', 'CNNGB', 'SGSIN', 'AEJEA', 'USNYC', 'DEHAM', 'KRPUS', 'JPTYO'])[1 + floor(power(random(), 2) * 8)::int],
+        83.0, round((shipment_value * 0.075)::numeric, 2),
+        CASE WHEN p % 10 = 0 THEN lpad((p * 7919)::text, 11, '0') || ' ' ELSE '' END
+            || material || ' ' || form || ' ' || p || ' MM',
+        supplier_name, 'ADDRESS ' || s, d, importer_name,
+        (ARRAY['CN', 'US', 'DE', 'JP', 'KR', 'VN', 'AE', 'SG'])[1 + floor(power(random(), 2) * 8)::int]
+    FROM (
+        SELECT
+            g, p, i, s, d, hs,
+            round((1 + random() * 5000)::numeric, 2) AS quantity,
+            round((100 + power(random(), 4) * 500000)::numeric, 2) AS shipment_value,
+            (ARRAY['STEEL', 'COPPER', 'ALUMINIUM', 'POLYPROPYLENE', 'POLYETHYLENE', 'NYLON', 'COTTON',
+                   'GLASS', 'RUBBER', 'BRASS', 'PVC', 'CERAMIC'])[1 + p % 12] AS material,
+            (ARRAY['PIPE', 'WIRE', 'SHEET', 'GRANULES', 'FILM', 'YARN', 'FITTING', 'VALVE', 'BOLT',
+                   'CABLE'])[1 + (p / 12) % 10] AS form,
+            (ARRAY['SHREE', 'GLOBAL', 'ACME', 'SUNRISE', 'BHARAT', 'ORIENT', 'PACIFIC', 'KLJ', 'NOVA',
+                   'UNITED'])[1 + i % 10] || ' ' ||
+            (ARRAY['POLYMERS', 'STEELS', 'TRADING', 'INDUSTRIES', 'EXPORTS', 'CHEMICALS'])[1 + (i / 10) % 6]
+                || ' ' || i || ' PRIVATE LIMITED' AS importer_name,
+            (ARRAY['ZHEJIANG', 'JIANGSU', 'GUANGDONG', 'OSAKA', 'BUSAN', 'HAMBURG', 'TEXAS',
+                   'HANOI'])[1 + s % 8] || ' ' ||
+            (ARRAY['MATERIALS', 'MANUFACTURING', 'IMPORT EXPORT', 'TECHNOLOGY'])[1 + (s / 8) % 4]
+                || ' ' || s AS supplier_name
+        FROM (
+            SELECT
+                g,
+                (1 + floor(power(random(), :skew) * :products))::int AS p,
+                (1 + floor(power(random(), :skew) * :entities))::int AS i,
+                (1 + floor(power(random(), :skew) * :entities))::int AS s,
+                CAST(:start_date AS DATE) + (random() * :days)::int AS d,
+                (ARRAY[39011000, 39012000, 39021000, 39076100, 72081000, 72082500, 74081100,
+                       84713010, 85171290, 85444999])[1 + floor(power(random(), 1.5) * 10)::int] AS hs
+            FROM generate_series(:first, :last) AS g
+        ) AS ranks
+    ) AS synthetic
+"""
+
+def generate(rows: int, products: int = 20000, entities: int = 5000, skew: float = 3.0,
+             start_date: str = "2021-01-01", days: int = 1460, seed: int = 42,
+             chunk_rows: int = GENERATOR_CHUNK_ROWS, truncate: bool = False, with_indexes: bool = False) -> Dict[str, Any]:
+    """Create the source table (if needed) and append `rows` synthetic rows in committed chunks"""
+    engine = get_engine()
+    with engine.begin() as conn:
+        conn.execute(text("CREATE SCHEMA IF NOT EXISTS analytics"))
+        conn.execute(text(TABLE_DDL))
+        if truncate:
+            conn.execute(text(f"TRUNCATE {SOURCE_TABLE} RESTART IDENTITY"))
+
+    started = time.perf_counter()
+    params = {"products": products, "entities": entities, "skew": skew,
+              "start_date": start_date, "days": days}
+    for chunk, first in enumerate(range(1, rows + 1, chunk_rows)):
+        last = min(first + chunk_rows - 1, rows)
+        with engine.begin() as conn:
+            # Deterministic per chunk, so the same arguments reproduce the same data
+            conn.execute(text("SELECT setseed(:value)"), {"value": ((seed * 7919 + chunk) % 2000) / 1000.0 - 1})
+            conn.execute(text(CHUNK_INSERT), dict(params, first=first, last=last))
+        elapsed = time.perf_counter() - started
+        print(f"Generated {last}/{rows} rows ({last / elapsed:.0f} rows/s)")
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"ANALYZE {SOURCE_TABLE}"))
+    if with_indexes:
+        # Building indexes once after the load is much faster than maintaining them row by row
+        from index_advisor import apply_indexes
+        apply_indexes()
+    return {"rows": rows, "products": products, "entities": entities, "skew": skew,
+            "seconds": round(time.perf_counter() - started, 1)}
@@ -0,0 +1,280 @@
+# benchmark/load.py - Replays a weighted mix of user traffic against every API endpoint
+import asyncio
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional
+import httpx
+
+# Percentage weights of user actions; override with --mix "typeahead=50,search=30,..."
+DEFAULT_MIX = {
+    "typeahead": 40,     # keystroke-paced /api/search/suggestions
+    "search": 20,        # row search, sometimes filtered, sometimes paging with next_cursor
+    "search_arrow": 4,   # row search as Arrow IPC
+    "top": 12,           # top importers / suppliers
+    "dashboard": 12,     # combined rows + top-N
+    "export": 2,         # streamed NDJSON / CSV export
+    "admin": 10,         # root, pool, cache and rollup status
+    "cache_clear": 0,    # DELETE /api/cache - skews every other measurement, so opt-in only
+}
+
+# Seconds between keystrokes while typing a suggestion query (plus up to 50% jitter)
+KEYSTROKE_INTERVAL = 0.12
+# The frontend only asks for suggestions from the second character on
+MIN_SUGGESTION_CHARS = 2
+
+# Queries used to discover real names through the suggestions endpoint before the run
+DEFAULT_SEED_QUERIES = {
+    "product_name": ["STEEL", "COPPER", "POLY", "NYLON", "GLASS", "COTTON", "PVC", "BRASS"],
+    "unique_product_name": ["STEEL", "COPPER", "POLY", "RUBBER", "CERAMIC", "ALUMINIUM"],
+    "entity": ["SHREE", "GLOBAL", "ACME", "KLJ", "ZHEJIANG", "OSAKA", "HAMBURG"],
+}
+
+NAME_FIELDS = {
+    "product_name": ("product_names", "products"),
+    "unique_product_name": ("unique_product_names", "unique-products"),
+    "entity": ("entities", "entities"),
+}
+
+class Recorder:
+    """Latency samples, error counts and bytes per endpoint label"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.bytes: Dict[str, int] = {}
+        self.enabled = True
+
+    def record(self, label: str, seconds: float, ok: bool, size: int):
+        if not self.enabled:
+            return
+        self.samples.setdefault(label, []).append(seconds)
+        self.bytes[label] = self.bytes.get(label, 0) + size
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+class LoadDriver:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, vocabulary: Dict[str, List[str]],
+                 keystroke_interval: float = KEYSTROKE_INTERVAL):
+        self.client = client
+        self.recorder = recorder
+        self.vocabulary = vocabulary
+        self.keystroke_interval = keystroke_interval
+
+    async def request(self, method: str, path: str, label: Optional[str] = None, stream: bool = False, **kwargs) -> Optional[Any]:
+        label = label or f"{method} {path}"
+        started = time.perf_counter()
+        try:
+            if stream:
+                size = 0
+                async with self.client.stream(method, path, **kwargs) as response:
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                ok = response.status_code < 400
+                body = None
+            else:
+                response = await self.client.request(method, path, **kwargs)
+                size = len(response.content)
+                ok = response.status_code < 400
+                body = response
+        except httpx.HTTPError:
+            ok, size, body = False, 0, None
+        self.recorder.record(label, time.perf_counter() - started, ok, size)
+        return body
+
+    # Request building
+    def pick_names(self, search_type: str, most: int = 3) -> List[str]:
+        names = self.vocabulary.get(search_type) or []
+        if not names:
+            return []
+        # Favour the head of the list like real users favour popular products
+        count = random.randint(1, min(most, len(names)))
+        return list({names[int(len(names) * random.random() ** 2)] for _ in range(count)})
+
+    def random_filters(self) -> Dict[str, Any]:
+        if random.random() < 0.6:
+            return {}
+        filters: Dict[str, Any] = {}
+        roll = random.random()
+        if roll < 0.3:
+            filters["hs_code"] = random.choice(["3901", "3902", "7208", "390110", "8471"])
+        elif roll < 0.5:
+            filters["port_name"] = random.choice(["INNSA1", "INMAA", "INMUN1", "CNSHA"])
+        if random.random() < 0.6:
+            end = date.today().replace(day=1) - timedelta(days=random.randint(1, 400))
+            if random.random() < 0.5:
+                # Whole months, answerable from the rollups
+                end = end.replace(day=1) - timedelta(days=1)
+                start = (end - timedelta(days=random.choice([28, 89, 180]))).replace(day=1)
+            else:
+                start = end - timedelta(days=random.randint(7, 120))
+            filters.update(date_mode="range", start_date=start.isoformat(), end_date=end.isoformat())
+        return filters
+
+    def body(self, search_type: str, names: List[str], **extra) -> Dict[str, Any]:
+        return dict({NAME_FIELDS[search_type][0]: names, "filters": self.random_filters()}, **extra)
+
+    # User actions
+    async def typeahead(self):
+        search_type = random.choice(list(NAME_FIELDS))
+        names = self.pick_names(search_type, 1)
+        if not names:
+            return
+        target = names[0][:random.randint(4, 14)]
+        # Like the frontend hook: one suggestion session per typed query
+        session_id = f"load-{random.getrandbits(48):x}"
+        for length in range(1, len(target) + 1):
+            await asyncio.sleep(self.keystroke_interval * (1 + random.random() * 0.5))
+            if length >= MIN_SUGGESTION_CHARS:
+                await self.request("GET", "/api/search/suggestions",
+                                   params={"query": target[:length], "search_type": search_type, "limit": 10,
+                                           "session_id": session_id})
+
+    async def search(self):
+        search_type = random.choice(list(NAME_FIELDS))
+        names = self.pick_names(search_type)
+        if not names:
+            return
+        path = f"/api/search/{NAME_FIELDS[search_type][1]}"
+        body = self.body(search_type, names, page_size=random.choice([100, 500, 1000]),
+                         include_total=random.random() < 0.2)
+        for _ in range(3):
+            response = await self.request("POST", path, json=body)
+            if response is None or response.status_code >= 400 or random.random() < 0.6:
+                return
+            next_cursor = response.json().get("next_cursor")
+            if not next_cursor:
+                return
+            body = dict(body, cursor=next_cursor, include_total=False)
+
+    async def search_arrow(self):
+        search_type = random.choice(list(NAME_FIELDS))
+        names = self.pick_names(search_type)
+        if names:
+            path = f"/api/search/{NAME_FIELDS[search_type][1]}"
+            await self.request("POST", path, label=f"POST {path}?format=arrow",
+                               params={"format": "arrow"}, json=self.body(search_type, names))
+
+    async def top(self):
+        search_type = random.choice(["product_name", "unique_product_name"])
+        names = self.pick_names(search_type)
+        if names:
+            kind = random.choice(["top-importers", "top-suppliers"])
+            await self.request("POST", f"/api/search/{kind}/{NAME_FIELDS[search_type][1]}",
+                               json=self.body(search_type, names))
+
+    async def dashboard(self):
+        search_type = random.choice(["product_name", "unique_product_name"])
+        names = self.pick_names(search_type)
+        if names:
+            await self.request("POST", f"/api/search/dashboard/{NAME_FIELDS[search_type][1]}",
+                               json=self.body(search_type, names))
+
+    async def export(self):
+        search_type = random.choice(list(NAME_FIELDS))
+        names = self.pick_names(search_type, 1)
+        if names:
+            fmt = random.choice(["ndjson", "csv"])
+            path = f"/api/export/{NAME_FIELDS[search_type][1]}"
+            await self.request("POST", path, label=f"POST {path}?format={fmt}", stream=True,
+                               params={"format": fmt}, json=self.body(search_type, names))
+
+    async def admin(self):
+        await self.request("GET", random.choice(["/", "/api/db/pool", "/api/cache/stats", "/api/rollups"]))
+
+    async def cache_clear(self):
+        await self.request("DELETE", "/api/cache")
+
+async def discover_vocabulary(client: httpx.AsyncClient, seed_queries: Dict[str, List[str]],
+                              per_type: int = 200) -> Dict[str, List[str]]:
+    """Collect real names for each search type through the suggestions endpoint"""
+    vocabulary: Dict[str, List[str]] = {}
+    for search_type, queries in seed_queries.items():
+        names: Dict[str, None] = {}
+        for query in queries:
+            response = await client.get("/api/search/suggestions",
+                                        params={"query": query, "search_type": search_type, "limit": 50})
+            if response.status_code < 400:
+                names.update(dict.fromkeys(response.json().get("suggestions", [])))
+        vocabulary[search_type] = list(names)[:per_type]
+        print(f"Discovered {len(vocabulary[search_type])} {search_type} names")
+    return vocabulary
+
+def _process_rss_kb(pid: int) -> int:
+    """Resident set size of a process and its direct children (e.g. uvicorn workers), in KiB"""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            pids += [int(child) for child in children.read().split()]
+    except OSError:
+        pass
+    total = 0
+    for process_id in pids:
+        try:
+            with open(f"/proc/{process_id}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+async def sample_memory(pid: int, samples: List[int], stop: asyncio.Event, interval: float = 1.0):
+    while not stop.is_set():
+        rss = _process_rss_kb(pid)
+        if rss:
+            samples.append(rss)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+async def _virtual_user(driver: LoadDriver, actions: List[Callable], weights: List[int], deadline: float):
+    while time.perf_counter() < deadline:
+        action = random.choices(actions, weights=weights)[0]
+        await action()
+
+async def run_load(base_url: str, users: int, duration: float, warmup: float = 5.0,
+                   mix: Optional[Dict[str, int]] = None, seed_queries: Optional[Dict[str, List[str]]] = None,
+                   server_pid: Optional[int] = None, keystroke_interval: float = KEYSTROKE_INTERVAL,
+                   timeout: float = 60.0) -> Dict[str, Any]:
+    """Run `users` concurrent virtual users for warmup + duration seconds; returns raw measurements"""
+    mix = dict(DEFAULT_MIX, **(mix or {}))
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=users * 2, max_keepalive_connections=users * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        vocabulary = await discover_vocabulary(client, seed_queries or DEFAULT_SEED_QUERIES)
+        driver = LoadDriver(client, recorder, vocabulary, keystroke_interval)
+        actions = [getattr(driver, name) for name, weight in mix.items() if weight > 0]
+        weights = [weight for weight in mix.values() if weight > 0]
+
+        memory: List[int] = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_memory(server_pid, memory, stop)) if server_pid else None
+
+        recorder.enabled = False
+        started = time.perf_counter()
+        deadline = started + warmup + duration
+        tasks = [asyncio.create_task(_virtual_user(driver, actions, weights, deadline)) for _ in range(users)]
+        await asyncio.sleep(warmup)
+        # Only requests finishing after the warm-up are measured
+        recorder.enabled = True
+        measured_from = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - measured_from
+
+        stop.set()
+        if sampler is not None:
+            await sampler
+    return {
+        "recorder": recorder,
+        "elapsed": elapsed,
+        "server_rss_kb": memory,
+        "config": {
+            "base_url": base_url, "users": users, "duration": duration, "warmup": warmup,
+            "mix": mix, "keystroke_interval": keystroke_interval, "server_pid": server_pid,
+            "vocabulary_sizes": {search_type: len(names) for search_type, names in vocabulary.items()},
+            "client_pid": os.getpid(),
+        },
+    }
@@ -0,0 +1,105 @@
+# benchmark/report.py - Latency percentiles, throughput and memory summaries saved as comparable JSON
+import json
+import os
+import platform
+import resource
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated percentile (q in 0..100) of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def latency_summary(seconds: List[float], elapsed: float) -> Dict[str, Any]:
+    values = sorted(seconds)
+    return {
+        "requests": len(values),
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+def build_report(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarize a run_load result: per-endpoint and overall latency, errors, bytes and memory"""
+    recorder, elapsed = result["recorder"], result["elapsed"]
+    endpoints = {}
+    for label in sorted(recorder.samples):
+        summary = latency_summary(recorder.samples[label], elapsed)
+        summary["errors"] = recorder.errors.get(label, 0)
+        summary["bytes"] = recorder.bytes.get(label, 0)
+        endpoints[label] = summary
+    everything = [sample for samples in recorder.samples.values() for sample in samples]
+    overall = latency_summary(everything, elapsed)
+    overall["errors"] = sum(recorder.errors.values())
+    rss = result["server_rss_kb"]
+    return {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "git_commit": _git_commit(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": result["config"],
+        "elapsed_seconds": round(elapsed, 2),
+        "overall": overall,
+        "endpoints": endpoints,
+        "memory": {
+            "server_rss_peak_mb": round(max(rss) / 1024, 1) if rss else None,
+            "server_rss_mean_mb": round(sum(rss) / len(rss) / 1024, 1) if rss else None,
+            "client_rss_peak_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+
+def save_report(report: Dict[str, Any], path: Optional[str] = None) -> str:
+    if path is None:
+        os.makedirs("benchmark-results", exist_ok=True)
+        stamp = report["created_at"].replace(":", "").replace("-", "")
+        path = os.path.join("benchmark-results", f"load-{stamp}.json")
+    with open(path, "w") as handle:
+        json.dump(report, handle, indent=2, default=str)
+    return path
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'endpoint':<52}{'reqs':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}")
+    for label, summary in list(report["endpoints"].items()) + [("OVERALL", report["overall"])]:
+        print(f"{label:<52}{summary['requests']:>8}{summary['throughput_rps']:>9}"
+              f"{summary['p50_ms']:>9}{summary['p95_ms']:>9}{summary['p99_ms']:>9}{summary['errors']:>8}")
+    memory = report["memory"]
+    if memory["server_rss_peak_mb"] is not None:
+        print(f"server RSS peak {memory['server_rss_peak_mb']} MB, mean {memory['server_rss_mean_mb']} MB")
+
+def compare_reports(base: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Per-endpoint p50/p95/p99 and throughput change (percent, negative latency = faster)"""
+    def change(old: float, current: float) -> Optional[float]:
+        return round((current - old) / old * 100, 1) if old else None
+
+    rows = []
+    labels = [label for label in base["endpoints"] if label in new["endpoints"]] + ["OVERALL"]
+    for label in labels:
+        old = base["overall"] if label == "OVERALL" else base["endpoints"][label]
+        current = new["overall"] if label == "OVERALL" else new["endpoints"][label]
+        rows.append({
+            "endpoint": label,
+            **{f"{metric}_change_pct": change(old[metric], current[metric])
+               for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")},
+        })
+    return rows
+
+def print_comparison(rows: List[Dict[str, Any]]):
+    print(f"{'endpoint':<52}{'p50':>9}{'p95':>9}{'p99':>9}{'rps':>9}  (% change)")
+    for row in rows:
+        values = [row[f"{metric}_change_pct"] for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")]
+        print(f"{row['endpoint']:<52}" + "".join(f"{'-' if value is None else value:>9}" for value in values))
@@ -0,0 +1,112 @@
+# bulk_match.py - Name-list membership predicates sized to the list: IN placeholders, one array
+# parameter, or a COPY-loaded temp table joined by the query
+import csv
+import io
+import os
+from typing import Any, Dict, List, Tuple
+from sqlalchemy import text
+from db import get_engine
+from metrics import Counter, register
+
+# Lists at least this long bind as a single text[] parameter (`= ANY(:names)`): the SQL text no longer
+# depends on the list length, so parsing stays cheap and asyncpg's prepared-statement cache hits
+BULK_MATCH_ARRAY_MIN = int(os.getenv("BULK_MATCH_ARRAY_MIN", "100"))
+# Lists at least this long are COPYed into a temp table that the query joins against
+BULK_MATCH_TEMP_TABLE_MIN = int(os.getenv("BULK_MATCH_TEMP_TABLE_MIN", "5000"))
+
+NAME_MATCHES = register(Counter(
+    "trade_api_name_match_total", "Name-list predicates built, by membership strategy", ("strategy",)
+))
+
+class TempTableNames:
+    """Parameter value standing for names to load into a transaction-scoped temp table before the query runs"""
+
+    __slots__ = ("table", "names")
+
+    def __init__(self, table: str, names: List[str]):
+        self.table = table
+        self.names = names
+
+    def create_sql(self) -> str:
+        # Dropped with the transaction, so a pooled connection never carries it into the next checkout
+        return f"CREATE TEMP TABLE {self.table} (name text) ON COMMIT DROP"
+
+    def __repr__(self) -> str:
+        return f"TempTableNames({self.table}, {len(self.names)} names)"
+
+def _bulk_capable() -> bool:
+    # Arrays and COPY are PostgreSQL features; other databases (local SQLite/MySQL) keep IN lists
+    try:
+        return get_engine().dialect.name == "postgresql"
+    except Exception:
+        return False
+
+def membership_strategy(count: int) -> str:
+    """'in', 'array' or 'temp_table' for a list of `count` names"""
+    if count < BULK_MATCH_ARRAY_MIN or not _bulk_capable():
+        return "in"
+    return "temp_table" if count >= BULK_MATCH_TEMP_TABLE_MIN else "array"
+
+def membership_predicates(columns: List[str], names: List[str], key: str = "names") -> Tuple[List[str], Dict[str, Any]]:
+    """One predicate per column, each true when that column equals one of the names, and their shared params"""
+    strategy = membership_strategy(len(names))
+    NAME_MATCHES.inc(strategy)
+    if strategy == "temp_table":
+        table = f"bulk_{key}"
+        params: Dict[str, Any] = {key: TempTableNames(table, list(names))}
+        predicates = [f"{column} IN (SELECT name FROM {table})" for column in columns]
+    elif strategy == "array":
+        params = {key: list(names)}
+        predicates = [f"{column} = ANY(CAST(:{key} AS text[]))" for column in columns]
+    else:
+        # Every column shares the same placeholders
+        placeholders = ",".join([f":{key}_{i}" for i in range(len(names))]) or "NULL"
+        params = {f"{key}_{i}": name for i, name in enumerate(names)}
+        predicates = [f"{column} IN ({placeholders})" for column in columns]
+    return predicates, params
+
+def membership(columns: List[str], names: List[str], key: str = "names") -> Tuple[str, Dict[str, Any]]:
+    """Predicate true when any of `columns` equals one of the names, and its params (named after `key`)"""
+    predicates, params = membership_predicates(columns, names, key)
+    if len(predicates) == 1:
+        return predicates[0], params
+    return "(" + " OR ".join(predicates) + ")", params
+
+def _split(params: Dict[str, Any]) -> Tuple[Dict[str, Any], List[TempTableNames]]:
+    tables = [value for value in params.values() if isinstance(value, TempTableNames)]
+    if not tables:
+        return params, tables
+    return {name: value for name, value in params.items() if not isinstance(value, TempTableNames)}, tables
+
+def _csv_rows(names: List[str]) -> io.StringIO:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([name] for name in names)
+    buffer.seek(0)
+    return buffer
+
+def load_temp_tables(conn, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Create and COPY-load the temp tables a query's params refer to; returns the params to execute with"""
+    params, tables = _split(params)
+    for table in tables:
+        conn.execute(text(table.create_sql()))
+        # The DBAPI (psycopg2) connection is inside the transaction SQLAlchemy just began
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table.table} (name) FROM STDIN WITH (FORMAT csv)", _csv_rows(table.names))
+        finally:
+            cursor.close()
+        # Temp tables are never auto-analyzed; without statistics the planner guesses the join badly
+        conn.execute(text(f"ANALYZE {table.table}"))
+    return params
+
+async def load_temp_tables_async(conn, params: Dict[str, Any]) -> Dict[str, Any]:
+    """load_temp_tables on an AsyncConnection (asyncpg's binary COPY)"""
+    params, tables = _split(params)
+    for table in tables:
+        await conn.execute(text(table.create_sql()))
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            table.table, records=[(name,) for name in table.names], columns=["name"]
+        )
+        await conn.execute(text(f"ANALYZE {table.table}"))
+    return params
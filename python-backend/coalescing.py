@@ -0,0 +1,80 @@
+# coalescing.py - Single-flight: concurrent calls with the same key share one in-flight computation
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from metrics import Counter, ScrapeMetric, register
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+
+COALESCED_CALLS = register(Counter(
+    "trade_api_single_flight_calls_total",
+    "Service calls that ran the computation (leader) or waited for an identical in-flight one (follower)",
+    ("group", "role"),
+))
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Deduplicates identical concurrent calls, in threads (run) and on the event loop (run_async)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def run(self, key: Hashable, fn: Callable[[], Any], group: str = "") -> Any:
+        """Return fn(), or the result of the identical call already running in another thread"""
+        if not SINGLE_FLIGHT_ENABLED:
+            return fn()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        COALESCED_CALLS.inc(group, "leader" if leader else "follower")
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Later callers start a fresh computation; waiters already hold the finished call
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def run_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]], group: str = "") -> Any:
+        """Await fn(), or the identical computation already in flight on this event loop"""
+        if not SINGLE_FLIGHT_ENABLED:
+            return await fn()
+        # Only the event loop thread touches _tasks, so no lock is needed between check and insert
+        task = self._tasks.get(key)
+        leader = task is None
+        if leader:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        COALESCED_CALLS.inc(group, "leader" if leader else "follower")
+        # Shielded: one caller disconnecting must not cancel the work the others are waiting for
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._tasks)
+
+# Shared by every coalesced service function in this worker; keys carry their namespace
+single_flight = SingleFlight()
+
+register(ScrapeMetric("trade_api_single_flight_in_flight", "Distinct computations currently shared by coalesced calls",
+                      "gauge", (), lambda: {(): single_flight.in_flight()}))
@@ -0,0 +1,196 @@
+# corpora.py - Suggestion corpora: initial load and incremental, watermark-based refresh
+import os
+import threading
+from typing import Any, Dict, List, Optional
+import pandas as pd
+from sqlalchemy import text
+from db import get_engine
+from search_index import SuggestionCorpus
+from name_cleaning import clean_product_name
+from metrics import ScrapeMetric, register, stage
+from corpus_snapshot import load_latest_snapshot, map_snapshot, write_snapshot
+
+# Source columns for each suggestion search type
+CORPUS_COLUMNS = {
+    "product_name": ["product_name"],
+    "unique_product_name": ["unique_product_name"],
+    "entity": ["true_importer_name", "true_supplier_name"],
+}
+
+# Placeholder corpora used when the database is unreachable
+SAMPLE_NAMES = {
+    "product_name": ["Sample Product 1", "Sample Product 2"],
+    "unique_product_name": ["Sample Unique Product 1", "Sample Unique Product 2"],
+    "entity": ["Sample Entity 1", "Sample Entity 2"],
+}
+
+# Cleaned form precomputed per name at load time (used by suggestion matching)
+CORPUS_CLEANERS = {
+    "product_name": clean_product_name,
+}
+
+# Monotonic column used as the high-water mark for new rows
+CORPUS_WATERMARK_COLUMN = os.getenv("CORPUS_WATERMARK_COLUMN", "id")
+# Seconds between background refreshes; 0 disables the refresher
+CORPUS_REFRESH_INTERVAL = int(os.getenv("CORPUS_REFRESH_INTERVAL", "300"))
+# Start workers from memory-mapped snapshots (see corpus_snapshot.py) and rewrite them after each change
+CORPUS_SNAPSHOT_ENABLED = os.getenv("CORPUS_SNAPSHOT_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+
+_corpora: Dict[str, SuggestionCorpus] = {}
+_load_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+def _fetch_watermark(engine, above: Optional[Any] = None) -> Optional[Any]:
+    """Highest watermark value in the table (optionally only rows above a previous mark)"""
+    query = f"SELECT MAX({CORPUS_WATERMARK_COLUMN}) AS watermark FROM analytics.product_icegate_imports"
+    params: Dict[str, Any] = {}
+    if above is not None:
+        query += f" WHERE {CORPUS_WATERMARK_COLUMN} > :above"
+        params["above"] = above
+    with engine.connect() as conn:
+        return conn.execute(text(query), params).scalar()
+
+def _fetch_distinct_names(engine, search_type: str, lower: Optional[Any] = None, upper: Optional[Any] = None) -> List[str]:
+    """Distinct non-empty names for a search type, optionally restricted to a watermark window"""
+    names: List[str] = []
+    for column in CORPUS_COLUMNS[search_type]:
+        query = f"SELECT DISTINCT {column} FROM analytics.product_icegate_imports WHERE {column} IS NOT NULL"
+        params: Dict[str, Any] = {}
+        if lower is not None:
+            query += f" AND {CORPUS_WATERMARK_COLUMN} > :lower"
+            params["lower"] = lower
+        if upper is not None:
+            query += f" AND {CORPUS_WATERMARK_COLUMN} <= :upper"
+            params["upper"] = upper
+        df = pd.read_sql(text(query), engine, params=params)
+        names.extend(df[column].tolist())
+    # Remove duplicates (entities appear as both importer and supplier) and empty entries
+    return [name for name in dict.fromkeys(names) if name and name.strip()]
+
+def _save_snapshot(search_type: str, corpus: SuggestionCorpus) -> Optional[str]:
+    try:
+        path = write_snapshot(search_type, corpus)
+        if path:
+            print(f"Wrote {search_type} corpus snapshot {path}")
+        return path
+    except Exception as e:
+        print(f"Error writing {search_type} corpus snapshot: {e}")
+        return None
+
+def _in_background(target, *args):
+    threading.Thread(target=target, args=args, name="corpus-snapshot", daemon=True).start()
+
+def _load_corpus(search_type: str, use_snapshot: bool = CORPUS_SNAPSHOT_ENABLED) -> SuggestionCorpus:
+    """Map the newest snapshot, or do a full load from the database (falling back to sample names)"""
+    if use_snapshot:
+        corpus = load_latest_snapshot(search_type, CORPUS_CLEANERS.get(search_type))
+        if corpus is not None:
+            return corpus
+    try:
+        engine = get_engine()
+        # Read the mark before the names: rows landing in between are picked up again and deduplicated
+        watermark = _fetch_watermark(engine)
+        names = _fetch_distinct_names(engine, search_type)
+        print(f"Loaded {len(names)} {search_type} names into cache (watermark={watermark})")
+    except Exception as e:
+        print(f"Error loading {search_type} names: {e}")
+        names, watermark = list(SAMPLE_NAMES[search_type]), None
+    # Cleaning every name and building the indexes dominates cold-start suggestion latency
+    with stage("corpus_build", search_type):
+        corpus = SuggestionCorpus.build(names, watermark, with_prefix_index=search_type == "entity",
+                                        cleaner=CORPUS_CLEANERS.get(search_type))
+    if use_snapshot:
+        # Spare the next worker (or restart) this load
+        _in_background(_save_snapshot, search_type, corpus)
+    return corpus
+
+def get_corpus(search_type: str) -> SuggestionCorpus:
+    """Current corpus for a search type, loading it on first use"""
+    corpus = _corpora.get(search_type)
+    if corpus is None:
+        with _load_lock:
+            corpus = _corpora.get(search_type)
+            if corpus is None:
+                corpus = _corpora[search_type] = _load_corpus(search_type)
+    return corpus
+
+def preload_snapshots():
+    """Map every available snapshot at startup (no database work), then catch up on newer rows in the background"""
+    if not CORPUS_SNAPSHOT_ENABLED:
+        return
+    with _load_lock:
+        for search_type in CORPUS_COLUMNS:
+            if search_type not in _corpora:
+                corpus = load_latest_snapshot(search_type, CORPUS_CLEANERS.get(search_type))
+                if corpus is not None:
+                    _corpora[search_type] = corpus
+    if _corpora:
+        _in_background(refresh_corpora)
+
+def refresh_corpora():
+    """Merge names added since each loaded corpus's watermark and swap the new corpora in"""
+    with _refresh_lock:
+        if not _corpora:
+            return
+        engine = get_engine()
+        for search_type, corpus in list(_corpora.items()):
+            try:
+                if corpus.watermark is None:
+                    # Previous load failed or the table was empty - try a full load again
+                    fresh = _load_corpus(search_type, use_snapshot=False)
+                    if fresh.watermark is not None:
+                        _corpora[search_type] = fresh
+                        if CORPUS_SNAPSHOT_ENABLED:
+                            _save_snapshot(search_type, fresh)
+                    continue
+                watermark = _fetch_watermark(engine, above=corpus.watermark)
+                if watermark is None:
+                    continue
+                new_names = _fetch_distinct_names(engine, search_type, lower=corpus.watermark, upper=watermark)
+                with stage("corpus_merge", search_type):
+                    refreshed = corpus.merged(new_names, watermark)
+                # Single reference swap: readers see either the old or the new corpus, never a mix
+                _corpora[search_type] = refreshed
+                print(f"Refreshed {search_type} corpus: +{len(refreshed) - len(corpus)} names (watermark={watermark})")
+                if CORPUS_SNAPSHOT_ENABLED:
+                    # Already on a background thread; new workers map this version, and so does this one
+                    # so its postings go back to shared pages instead of private copies
+                    path = _save_snapshot(search_type, refreshed)
+                    if path:
+                        _corpora[search_type] = map_snapshot(path, CORPUS_CLEANERS.get(search_type))
+            except Exception as e:
+                print(f"Error refreshing {search_type} corpus: {e}")
+
+register(ScrapeMetric("trade_api_corpus_names", "Names held by each loaded suggestion corpus",
+                      "gauge", ("search_type",),
+                      lambda: {(search_type,): len(corpus) for search_type, corpus in list(_corpora.items())}))
+register(ScrapeMetric("trade_api_corpus_bytes", "Bytes held by each loaded corpus's name pools (page cache when mapped)",
+                      "gauge", ("search_type",),
+                      lambda: {(search_type,): corpus.nbytes for search_type, corpus in list(_corpora.items())}))
+
+_refresher_thread: Optional[threading.Thread] = None
+_refresher_stop = threading.Event()
+
+def _refresh_loop(interval: int):
+    while not _refresher_stop.wait(interval):
+        try:
+            refresh_corpora()
+        except Exception as e:
+            print(f"Error in corpus refresher: {e}")
+
+def start_corpus_refresher(interval: int = CORPUS_REFRESH_INTERVAL):
+    """Start the background refresher thread (no-op when the interval is 0)"""
+    global _refresher_thread
+    if interval <= 0 or _refresher_thread is not None:
+        return
+    _refresher_stop.clear()
+    _refresher_thread = threading.Thread(target=_refresh_loop, args=(interval,), name="corpus-refresher", daemon=True)
+    _refresher_thread.start()
+
+def stop_corpus_refresher():
+    """Stop the background refresher thread"""
+    global _refresher_thread
+    if _refresher_thread is not None:
+        _refresher_stop.set()
+        _refresher_thread.join(timeout=5)
+        _refresher_thread = None
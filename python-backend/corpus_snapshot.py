@@ -0,0 +1,199 @@
+# corpus_snapshot.py - Memory-mappable on-disk snapshots of suggestion corpora and their indexes
+#
+#   python corpus_snapshot.py build    load every corpus from DATABASE_URL and write its snapshot
+#   python corpus_snapshot.py list     show the snapshots in CORPUS_SNAPSHOT_DIR
+#
+# One file per search type and watermark: <dir>/<search_type>-<watermark>.snap. Layout: magic, a
+# length-prefixed JSON header with section offsets, then 8-byte aligned sections - StringPool buffers
+# and offsets, NUL-joined key pools and native uint32 id arrays. Workers map the file read-only; name
+# pools and trigram postings stay views into the mapping, so the page cache holds them once for every worker.
+import glob
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from search_index import PrefixIndex, SuggestionCorpus, TrigramIndex
+from string_pool import StringPool
+
+CORPUS_SNAPSHOT_DIR = os.getenv("CORPUS_SNAPSHOT_DIR", "corpus-snapshots")
+# Snapshots kept per search type; older ones may still be mapped by running workers, which is safe on unlink
+CORPUS_SNAPSHOT_KEEP = int(os.getenv("CORPUS_SNAPSHOT_KEEP", "2"))
+
+SNAPSHOT_MAGIC = b"TRADECORPUS\n"
+SNAPSHOT_VERSION = 2
+_ALIGN = 8
+_SAFE_NAME = re.compile(r'[^0-9A-Za-z_.-]')
+
+def snapshot_path(search_type: str, watermark: Any, directory: str = CORPUS_SNAPSHOT_DIR) -> str:
+    return os.path.join(directory, f"{search_type}-{_SAFE_NAME.sub('_', str(watermark))}.snap")
+
+def _pool(strings: List[str]) -> bytes:
+    # Database text cannot contain NUL, so it is a safe separator
+    return "\0".join(strings).encode("utf-8")
+
+def _unpool(view: memoryview, count: int) -> List[str]:
+    if count == 0:
+        return []
+    return bytes(view).decode("utf-8").split("\0")
+
+def _id_table(table: Dict[str, Any]) -> Tuple[bytes, array, array]:
+    """Sorted keys pool, offsets (len + 1) and concatenated ids of a str -> ids mapping"""
+    keys = sorted(table)
+    offsets = array('I', [0])
+    ids = array('I')
+    for key in keys:
+        ids.extend(table[key])
+        offsets.append(len(ids))
+    return _pool(keys), offsets, ids
+
+def _pool_sections(name: str, pool: StringPool) -> Dict[str, Any]:
+    return {f"{name}_buffer": memoryview(pool.buffer)[pool.base:pool.base + pool.offsets[-1]],
+            f"{name}_offsets": pool.offsets.tobytes()}
+
+def write_snapshot(search_type: str, corpus: SuggestionCorpus, directory: str = CORPUS_SNAPSHOT_DIR) -> Optional[str]:
+    """Write a corpus and its indexes atomically; returns the path (None without a watermark to version it by)"""
+    if corpus.watermark is None:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    sections: Dict[str, Any] = _pool_sections("names", corpus.names)
+    # An upper pool that is the names pool itself (all names upper case) is not stored twice
+    if corpus.upper is not corpus.names:
+        sections.update(_pool_sections("upper", corpus.upper))
+    if corpus.cleaned is not None:
+        sections.update(_pool_sections("cleaned", corpus.cleaned))
+    keys, offsets, ids = _id_table(corpus.trigram_index.postings)
+    sections.update(trigram_keys=keys, trigram_offsets=offsets.tobytes(), trigram_ids=ids.tobytes())
+    if corpus.prefix_index is not None:
+        prefix = corpus.prefix_index
+        keys, offsets, ids = _id_table(prefix._short_prefix_ids)
+        sections.update(
+            prefix_order=prefix.order.tobytes(),
+            prefix_short_keys=keys, prefix_short_offsets=offsets.tobytes(), prefix_short_ids=ids.tobytes(),
+        )
+
+    layout: Dict[str, List[int]] = {}
+    position = 0
+    for name, data in sections.items():
+        layout[name] = [position, len(data)]
+        position += len(data) + (-len(data) % _ALIGN)
+    header = json.dumps({
+        "version": SNAPSHOT_VERSION,
+        "search_type": search_type,
+        "watermark": corpus.watermark,
+        "byteorder": sys.byteorder,
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "counts": {"names": len(corpus), "trigrams": len(corpus.trigram_index.postings)},
+        "sections": layout,
+    }, default=str).encode("utf-8")
+    preamble = SNAPSHOT_MAGIC + struct.pack("<I", len(header)) + header
+    preamble += b"\0" * (-len(preamble) % _ALIGN)
+
+    path = snapshot_path(search_type, corpus.watermark, directory)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(preamble)
+        for data in sections.values():
+            handle.write(data)
+            handle.write(b"\0" * (-len(data) % _ALIGN))
+    # Readers only ever see complete files
+    os.replace(temporary, path)
+    _prune(search_type, directory, keep=path)
+    return path
+
+def _snapshot_files(search_type: str, directory: str) -> List[str]:
+    # Newest first by modification time; watermarks need not sort as strings
+    return sorted(glob.glob(os.path.join(directory, f"{search_type}-*.snap")), key=os.path.getmtime, reverse=True)
+
+def _prune(search_type: str, directory: str, keep: str):
+    for path in [p for p in _snapshot_files(search_type, directory) if p != keep][max(CORPUS_SNAPSHOT_KEEP - 1, 0):]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _read_header(mapped: mmap.mmap) -> Tuple[Dict[str, Any], int]:
+    if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError("not a corpus snapshot")
+    start = len(SNAPSHOT_MAGIC)
+    (length,) = struct.unpack("<I", mapped[start:start + 4])
+    header = json.loads(mapped[start + 4:start + 4 + length])
+    if header["version"] != SNAPSHOT_VERSION or header["byteorder"] != sys.byteorder:
+        raise ValueError(f"incompatible snapshot (version {header['version']}, {header['byteorder']}-endian)")
+    base = start + 4 + length
+    return header, base + (-base % _ALIGN)
+
+def map_snapshot(path: str, cleaner=None) -> SuggestionCorpus:
+    """Map a snapshot read-only and assemble the corpus around it"""
+    with open(path, "rb") as handle:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    header, base = _read_header(mapped)
+    view = memoryview(mapped)
+
+    def section(name: str) -> memoryview:
+        offset, length = header["sections"][name]
+        return view[base + offset:base + offset + length]
+
+    def ids(name: str) -> memoryview:
+        return section(name).cast('I')
+
+    def table(prefix: str) -> Tuple[List[str], memoryview, memoryview]:
+        offsets = ids(f"{prefix}_offsets")
+        return _unpool(section(f"{prefix}_keys"), len(offsets) - 1), offsets, ids(f"{prefix}_ids")
+
+    def pool(name: str) -> StringPool:
+        # Decoded on access straight from the mapping
+        offset = header["sections"][f"{name}_buffer"][0]
+        return StringPool(mapped, ids(f"{name}_offsets"), base + offset)
+
+    names = pool("names")
+    upper = pool("upper") if "upper_buffer" in header["sections"] else names
+    cleaned = pool("cleaned") if "cleaned_buffer" in header["sections"] else None
+
+    # Postings are zero-copy slices of the mapping; TrigramIndex.remapped copies them into arrays on refresh
+    keys, offsets, posting_ids = table("trigram")
+    postings = {key: posting_ids[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}
+
+    prefix_index = None
+    if "prefix_order" in header["sections"]:
+        short_keys, short_offsets, short_ids = table("prefix_short")
+        prefix_index = PrefixIndex.from_order(
+            names, upper, ids("prefix_order"),
+            {key: short_ids[short_offsets[i]:short_offsets[i + 1]] for i, key in enumerate(short_keys)},
+        )
+    return SuggestionCorpus(names, upper, cleaned, header["watermark"],
+                            TrigramIndex.from_postings(names, postings), prefix_index, cleaner)
+
+def load_latest_snapshot(search_type: str, cleaner=None, directory: str = CORPUS_SNAPSHOT_DIR) -> Optional[SuggestionCorpus]:
+    """Newest readable snapshot for a search type, or None"""
+    for path in _snapshot_files(search_type, directory):
+        try:
+            started = time.perf_counter()
+            corpus = map_snapshot(path, cleaner)
+            print(f"Mapped {len(corpus)} {search_type} names from {path} "
+                  f"in {(time.perf_counter() - started) * 1000:.0f} ms (watermark={corpus.watermark})")
+            return corpus
+        except Exception as e:
+            print(f"Skipping corpus snapshot {path}: {e}")
+    return None
+
+def main():
+    from corpora import CORPUS_COLUMNS, _load_corpus
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "build":
+        for search_type in CORPUS_COLUMNS:
+            print(write_snapshot(search_type, _load_corpus(search_type, use_snapshot=False)))
+    elif command == "list":
+        for search_type in CORPUS_COLUMNS:
+            for path in _snapshot_files(search_type, CORPUS_SNAPSHOT_DIR):
+                print(f"{path}  {os.path.getsize(path) / 1e6:.1f} MB")
+    else:
+        print(f"Unknown command {command!r}, use build or list")
+
+if __name__ == "__main__":
+    main()
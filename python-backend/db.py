@@ -0,0 +1,214 @@
+# db.py - Process-wide database engines, connection pool and blocking-call executor
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import QueuePool
+from dotenv import load_dotenv
+from metrics import ScrapeMetric, register
+
+try:
+    import asyncpg  # noqa: F401
+    ASYNCPG_AVAILABLE = True
+except ImportError:
+    ASYNCPG_AVAILABLE = False
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Pool configuration (override through environment variables)
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 20)
+DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+
+# Async access: native asyncpg engine when possible, otherwise a bounded thread pool
+DB_ASYNC_ENABLED = _env_bool("DB_ASYNC_ENABLED", True)
+DB_THREADPOOL_SIZE = _env_int("DB_THREADPOOL_SIZE", DB_POOL_SIZE + DB_MAX_OVERFLOW)
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait to check out a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.checkout_errors = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._wait_lock:
+                self.checkout_errors += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._wait_lock:
+                self.wait_count += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+def init_engine() -> Engine:
+    """Create the process-wide engine (idempotent)"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if not DATABASE_URL:
+                    raise Exception("DATABASE_URL not found in environment variables")
+                _engine = create_engine(
+                    DATABASE_URL,
+                    poolclass=TimedQueuePool,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_timeout=DB_POOL_TIMEOUT,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=DB_POOL_PRE_PING,
+                )
+                print(f"Database engine created (pool_size={DB_POOL_SIZE}, max_overflow={DB_MAX_OVERFLOW})")
+    return _engine
+
+def get_engine() -> Engine:
+    """Return the shared engine, creating it on first use outside the app lifecycle"""
+    return _engine if _engine is not None else init_engine()
+
+def dispose_engine():
+    """Close all pooled connections and drop the shared engine"""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+            print("Database engine disposed")
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Snapshot of connection pool usage"""
+    if _engine is None:
+        return {"initialized": False}
+    pool = _engine.pool
+    stats: Dict[str, Any] = {
+        "initialized": True,
+        "pool_size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "recycle_seconds": DB_POOL_RECYCLE,
+        "pre_ping": DB_POOL_PRE_PING,
+    }
+    if isinstance(pool, TimedQueuePool):
+        with pool._wait_lock:
+            stats.update({
+                "checkouts": pool.wait_count,
+                "checkout_errors": pool.checkout_errors,
+                "wait_seconds_total": round(pool.wait_seconds_total, 6),
+                "wait_seconds_avg": round(pool.wait_seconds_total / pool.wait_count, 6) if pool.wait_count else 0.0,
+                "wait_seconds_max": round(pool.wait_seconds_max, 6),
+            })
+    return stats
+
+def _pool_metric(*keys: str) -> Callable[[], Dict[tuple, Any]]:
+    def read() -> Dict[tuple, Any]:
+        stats = get_pool_stats()
+        return {(key,): stats[key] for key in keys if key in stats}
+    return read
+
+register(ScrapeMetric("trade_api_db_pool_connections", "Connections of the sync engine pool by state",
+                      "gauge", ("state",), _pool_metric("pool_size", "checked_in", "checked_out", "overflow")))
+register(ScrapeMetric("trade_api_db_pool_checkouts_total", "Connection checkouts and failed checkouts",
+                      "counter", ("result",),
+                      lambda: {(result,): get_pool_stats().get(key) for result, key in
+                               (("all", "checkouts"), ("error", "checkout_errors"))}))
+register(ScrapeMetric("trade_api_db_pool_wait_seconds_total", "Time spent waiting for a pooled connection",
+                      "counter", (), lambda: {(): get_pool_stats().get("wait_seconds_total")}))
+
+def _async_database_url() -> Optional[str]:
+    """asyncpg flavour of DATABASE_URL, or None when the native async path can't be used"""
+    if not (DB_ASYNC_ENABLED and ASYNCPG_AVAILABLE and DATABASE_URL):
+        return None
+    scheme, sep, rest = DATABASE_URL.partition("://")
+    if not sep or scheme.split("+")[0] not in ("postgresql", "postgres"):
+        return None
+    return f"postgresql+asyncpg://{rest}"
+
+_async_engine: Optional[AsyncEngine] = None
+
+def init_async_engine() -> Optional[AsyncEngine]:
+    """Create the process-wide asyncpg engine, if the driver and URL support it"""
+    global _async_engine
+    if _async_engine is None:
+        url = _async_database_url()
+        if url is None:
+            return None
+        _async_engine = create_async_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+        print("Async database engine created (asyncpg)")
+    return _async_engine
+
+def get_async_engine() -> Optional[AsyncEngine]:
+    """Shared async engine, or None when queries must go through the thread pool"""
+    return _async_engine if _async_engine is not None else init_async_engine()
+
+async def dispose_async_engine():
+    """Close the async engine's pooled connections"""
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        print("Async database engine disposed")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _engine_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_THREADPOOL_SIZE, thread_name_prefix="db-sync")
+    return _executor
+
+async def run_sync(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking call on the bounded DB thread pool instead of the event loop"""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context (request metric labels) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_get_executor(), functools.partial(context.run, fn, *args, **kwargs))
+
+def shutdown_executor():
+    """Stop the DB thread pool"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
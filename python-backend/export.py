@@ -0,0 +1,108 @@
+# export.py - Streaming NDJSON / CSV exports backed by server-side cursors
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+from sqlalchemy import text
+from models import SearchFilters
+from db import get_engine, get_async_engine
+from services import SEARCH_COLUMNS, EntityMatch, add_filter_predicates
+from bulk_match import load_temp_tables, load_temp_tables_async
+
+# Rows fetched from the server-side cursor (and encoded) per chunk
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+def build_export_query(match: Any, filters: Optional[SearchFilters]) -> tuple:
+    """Every matching row, unordered so the database can start streaming immediately"""
+    if isinstance(match, EntityMatch):
+        return build_entity_export_query(match, filters)
+    match_sql, match_params = match
+    params = dict(match_params)
+    query = add_filter_predicates(f"""
+        SELECT {SEARCH_COLUMNS}
+        FROM analytics.product_icegate_imports
+        WHERE {match_sql}
+    """, params, filters)
+    return query, params
+
+def build_entity_export_query(match: EntityMatch, filters: Optional[SearchFilters]) -> tuple:
+    """Every row of a role-aware entity match with its matched_role; the branches stream one after the other"""
+    params = dict(match.params)
+    branches = [add_filter_predicates(f"""
+        SELECT {SEARCH_COLUMNS}, {match.role_sql} AS matched_role
+        FROM analytics.product_icegate_imports
+        WHERE {predicate}
+    """, params, filters) for predicate in match.branches]
+    return " UNION ALL ".join(branches), params
+
+def encode_header(columns: List[str], fmt: str) -> str:
+    if fmt != "csv":
+        return ""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue()
+
+def encode_rows(columns: List[str], rows: Sequence[Sequence[Any]], fmt: str) -> str:
+    """Encode one chunk of rows as NDJSON lines or CSV records"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(rows)
+        return buffer.getvalue()
+    return "".join(
+        json.dumps(dict(zip(columns, row)), default=_json_default) + "\n" for row in rows
+    )
+
+def iter_export_chunks(match: Any, filters: Optional[SearchFilters], fmt: str,
+                       chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """Stream an export through a server-side cursor; memory stays at one chunk regardless of row count"""
+    query, params = build_export_query(match, filters)
+    with get_engine().connect() as conn:
+        params = load_temp_tables(conn, params)
+        # stream_results makes psycopg2 use a named (server-side) cursor instead of buffering everything
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(text(query), params)
+        columns = list(result.keys())
+        header = encode_header(columns, fmt)
+        if header:
+            yield header
+        for rows in result.partitions(chunk_size):
+            yield encode_rows(columns, rows, fmt)
+
+async def aiter_export_chunks(match: Any, filters: Optional[SearchFilters], fmt: str,
+                              chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[str]:
+    """Async counterpart of iter_export_chunks using an asyncpg server-side cursor"""
+    query, params = build_export_query(match, filters)
+    async with get_async_engine().connect() as conn:
+        params = await load_temp_tables_async(conn, params)
+        result = await conn.stream(text(query), params)
+        columns = list(result.keys())
+        header = encode_header(columns, fmt)
+        if header:
+            yield header
+        async for rows in result.partitions(chunk_size):
+            yield encode_rows(columns, rows, fmt)
+
+def export_stream(match: Any, filters: Optional[SearchFilters], fmt: str):
+    """Chunk iterator for a StreamingResponse: native async when asyncpg is available, otherwise
+    a sync generator that Starlette drives from its thread pool"""
+    if get_async_engine() is not None:
+        return aiter_export_chunks(match, filters, fmt)
+    return iter_export_chunks(match, filters, fmt)
+
+def export_headers(search_type: str, fmt: str) -> Dict[str, str]:
+    return {"Content-Disposition": f'attachment; filename="{search_type}_export.{fmt}"'}
@@ -0,0 +1,145 @@
+# filter_compiler.py - Compiles SearchFilters into index-friendly SQL predicates and a canonical filter key
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+from models import SearchFilters
+
+# Full HS codes are stored as 8-digit integers; shorter inputs are chapter/heading/subheading prefixes
+# and longer ones (national tariff lines) are cut to their 8-digit code. Codes in chapters 01-09 are
+# shown without their leading zero (09011100 as 9011100), so an odd digit count gets it restored.
+HS_CODE_DIGITS = 8
+
+# Text filters match as a substring (served by the pg_trgm indexes) unless the input is code-shaped:
+# a complete code matches with '=', the start of an importer code as a prefix. Port names are free
+# text, so only ICEGATE port codes (letters plus a digit, e.g. INNSA1) count as code-shaped there.
+_FULL_IMPORTER_ID = re.compile(r'^(?=.*\d)[A-Z0-9]{10}$')  # IEC codes
+_PARTIAL_IMPORTER_ID = re.compile(r'^(?=.*\d)[A-Z0-9]{1,9}$')
+_FULL_PORT_CODE = re.compile(r'^[A-Z]{5}\d$')
+_HS_CODE_SEPARATORS = re.compile(r'[\s.\-]')
+
+# A leading '*' forces a substring match even for code-shaped input
+CONTAINS_MARKER = "*"
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _text_match(value: str, full_code: re.Pattern, partial_code: Optional[re.Pattern] = None) -> Tuple[str, str, str]:
+    """(mode, operator, parameter) for a text filter: exact '=', prefix or contains LIKE"""
+    forced = value.startswith(CONTAINS_MARKER)
+    value = value.strip(CONTAINS_MARKER)
+    if not forced and full_code.match(value):
+        return "exact", "=", value
+    if not forced and partial_code is not None and partial_code.match(value):
+        return "prefix", "LIKE", f"{_escape_like(value)}%"
+    return "contains", "LIKE", f"%{_escape_like(value)}%"
+
+def _like_suffix(operator: str) -> str:
+    return " ESCAPE '\\'" if operator == "LIKE" else ""
+
+def hs_code_range(hs_code: str) -> Tuple[int, int]:
+    """Half-open [low, high) range of full HS codes covered by a (possibly partial) code"""
+    digits = _HS_CODE_SEPARATORS.sub("", hs_code)
+    if not digits.isdigit():
+        raise ValueError(f"Invalid HS code '{hs_code}'")
+    digits = digits[:HS_CODE_DIGITS]
+    if len(digits) % 2:
+        digits = "0" + digits
+    scale = 10 ** (HS_CODE_DIGITS - len(digits))
+    return int(digits) * scale, (int(digits) + 1) * scale
+
+def date_range(filters: Optional[SearchFilters]) -> Tuple[Optional[date], Optional[date]]:
+    """Half-open [start, end) reg_date range selected by the filters (None = unbounded)"""
+    if filters is None:
+        return None, None
+    if filters.date_mode == "single" and filters.single_date:
+        return filters.single_date, filters.single_date + timedelta(days=1)
+    if filters.date_mode == "range":
+        end = filters.end_date + timedelta(days=1) if filters.end_date else None
+        return filters.start_date, end
+    return None, None
+
+class CompiledFilters:
+    """Predicates for one SearchFilters, keyed by filter field, with stable parameter names.
+
+    Every predicate is ' AND ...' SQL against the source table's column names, so the same
+    compiled filters can be appended to row, count, top-N and rollup queries.
+    """
+
+    def __init__(self, parts: Dict[str, Tuple[str, Dict[str, Any]]], key: str,
+                 dates: Tuple[Optional[date], Optional[date]]):
+        self.parts = parts
+        self.key = key
+        self.date_range = dates
+
+    @property
+    def fields(self) -> set:
+        return set(self.parts)
+
+    def predicate(self, exclude: Iterable[str] = ()) -> Tuple[str, Dict[str, Any]]:
+        """Combined (' AND ...' SQL, params), optionally leaving some fields out"""
+        sql = ""
+        params: Dict[str, Any] = {}
+        for field, (part_sql, part_params) in self.parts.items():
+            if field not in exclude:
+                sql += part_sql
+                params.update(part_params)
+        return sql, params
+
+    @property
+    def sql(self) -> str:
+        return self.predicate()[0]
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return self.predicate()[1]
+
+def compile_filters(filters: Optional[SearchFilters]) -> CompiledFilters:
+    """Compile SearchFilters once; raises ValueError for malformed values"""
+    parts: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+    key_parts = []
+    if filters is not None:
+        hs_code = (filters.hs_code or "").strip()
+        if hs_code:
+            low, high = hs_code_range(hs_code)
+            if high - low == 1:
+                parts["hs_code"] = (" AND hs_code = :filter_hs_code", {"filter_hs_code": low})
+            else:
+                # Chapter / heading prefixes become a range scan on the hs_code index
+                parts["hs_code"] = (" AND hs_code >= :filter_hs_code_low AND hs_code < :filter_hs_code_high",
+                                    {"filter_hs_code_low": low, "filter_hs_code_high": high})
+            key_parts.append(f"hs=[{low},{high})")
+
+        importer_id = (filters.importer_id or "").strip()
+        if importer_id:
+            mode, operator, value = _text_match(importer_id, _FULL_IMPORTER_ID, _PARTIAL_IMPORTER_ID)
+            parts["importer_id"] = (f" AND importer_id {operator} :filter_importer_id{_like_suffix(operator)}",
+                                    {"filter_importer_id": value})
+            key_parts.append(f"importer_id={mode}:{value}")
+
+        port_name = (filters.port_name or "").strip()
+        if port_name:
+            mode, operator, value = _text_match(port_name, _FULL_PORT_CODE)
+            suffix = _like_suffix(operator)
+            parts["port_name"] = (f" AND (indian_port {operator} :filter_port{suffix} OR foreign_port {operator} :filter_port{suffix})",
+                                  {"filter_port": value})
+            key_parts.append(f"port={mode}:{value}")
+
+    dates = date_range(filters)
+    start, end = dates
+    if start is not None or end is not None:
+        sql = ""
+        params: Dict[str, Any] = {}
+        if start is not None:
+            sql += " AND reg_date >= :filter_date_from"
+            params["filter_date_from"] = start
+        if end is not None:
+            sql += " AND reg_date < :filter_date_to"
+            params["filter_date_to"] = end
+        parts["date"] = (sql, params)
+        key_parts.append(f"date=[{start.isoformat() if start else ''},{end.isoformat() if end else ''})")
+
+    return CompiledFilters(parts, "|".join(key_parts), dates)
+
+def filter_key(filters: Optional[SearchFilters]) -> str:
+    """Canonical key: filters selecting the same rows map to the same string ('' for no filters)"""
+    return compile_filters(filters).key
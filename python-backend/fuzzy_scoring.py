@@ -0,0 +1,81 @@
+# fuzzy_scoring.py - fuzzywuzzy-compatible partial_ratio ranking of a query against a whole candidate array
+import heapq
+import os
+from typing import Any, Dict, List, Tuple, Union
+from fuzzywuzzy import fuzz, process, utils
+
+try:
+    import numpy as np
+    from rapidfuzz import fuzz as rf_fuzz, process as rf_process, utils as rf_utils
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
+# Threads used to score large candidate arrays (-1 = all cores)
+FUZZY_WORKERS = int(os.getenv("FUZZY_WORKERS", "-1"))
+# Candidate count at which scoring is sharded across FUZZY_WORKERS instead of one native call
+FUZZY_PARALLEL_THRESHOLD = int(os.getenv("FUZZY_PARALLEL_THRESHOLD", "50000"))
+
+Choices = Union[List[str], Dict[Any, str]]
+
+def extract_best(query: str, choices: Choices, score_cutoff: int, limit: int) -> List[Tuple]:
+    """Same results as fuzzywuzzy's process.extractBests with scorer=partial_ratio.
+
+    Returns (choice, score) tuples for lists and (choice, score, key) for dicts, best first,
+    ties in input order.
+    """
+    if not query or not choices or limit <= 0:
+        return []
+    if not RAPIDFUZZ_AVAILABLE:
+        return process.extractBests(query, choices, scorer=fuzz.partial_ratio, score_cutoff=score_cutoff, limit=limit)
+
+    processed_query = utils.full_process(query)
+    if not processed_query:
+        # Punctuation-only query: fuzzywuzzy still scores choices that also process to '' as 100
+        return process.extractBests(query, choices, scorer=fuzz.partial_ratio, score_cutoff=score_cutoff, limit=limit)
+    keys = list(choices.keys()) if isinstance(choices, dict) else None
+    values = list(choices.values()) if keys is not None else choices
+
+    # rapidfuzz's partial_ratio tries every alignment while fuzzywuzzy's only tries those starting at a
+    # matching block, so the rounded rapidfuzz score bounds fuzzywuzzy's from above (it is often far
+    # higher: the cutoffs were tuned on fuzzywuzzy scores). Bounds are computed natively over the
+    # whole array; exact scores only for candidates that can still enter the result, best bound first.
+    if len(values) < FUZZY_PARALLEL_THRESHOLD:
+        bounds = [(index, score) for _, score, index in rf_process.extract(
+            processed_query, values, scorer=rf_fuzz.partial_ratio, processor=rf_utils.default_process,
+            score_cutoff=max(score_cutoff - 0.5, 0), limit=None,
+        )]
+    else:
+        bounds = _bounds_parallel(processed_query, values, score_cutoff)
+    candidates = sorted((-int(score + 0.5), index) for index, score in bounds)
+
+    best: List[Tuple[int, int]] = []  # min-heap of (score, -index)
+    for negative_bound, index in candidates:
+        if len(best) == limit and (-negative_bound, -index) < best[0]:
+            break
+        score = fuzz.partial_ratio(processed_query, utils.full_process(values[index]))
+        if score < score_cutoff:
+            continue
+        if len(best) < limit:
+            heapq.heappush(best, (score, -index))
+        elif (score, -index) > best[0]:
+            heapq.heapreplace(best, (score, -index))
+    ranked = [(-negative_index, score) for score, negative_index in sorted(best, reverse=True)]
+
+    if keys is None:
+        return [(values[index], score) for index, score in ranked]
+    return [(values[index], score, keys[index]) for index, score in ranked]
+
+def _bounds_parallel(processed_query: str, values: List[str], score_cutoff: int) -> List[Tuple[int, float]]:
+    # cdist releases the GIL and splits the candidate array across FUZZY_WORKERS threads
+    scores = rf_process.cdist(
+        [processed_query], values, scorer=rf_fuzz.partial_ratio, processor=rf_utils.default_process,
+        score_cutoff=max(score_cutoff - 0.5, 0), dtype=np.float32, workers=FUZZY_WORKERS,
+    )[0]
+    hits = np.flatnonzero(scores >= max(score_cutoff - 0.5, 0))
+    return list(zip(hits.tolist(), scores[hits].tolist()))
+
+def score_choices(query: str, choices: List[str]) -> List[int]:
+    """fuzzywuzzy partial_ratio of the query against each choice, normalized like extract_best (0 for an empty query)"""
+    processed_query = utils.full_process(query)
+    return [fuzz.partial_ratio(processed_query, utils.full_process(choice)) for choice in choices]
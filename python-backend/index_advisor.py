@@ -0,0 +1,229 @@
+# index_advisor.py - Index DDL for the API's query shapes, EXPLAIN reports and a synthetic Postgres stand-in
+#
+#   python index_advisor.py ddl                  print the index DDL
+#   python index_advisor.py apply                create the indexes (CONCURRENTLY, outside a transaction)
+#   python index_advisor.py seed --rows 1000000  create analytics.product_icegate_imports with synthetic rows
+#   python index_advisor.py explain [--json]     EXPLAIN (ANALYZE, BUFFERS) every services.py query template
+#
+# All commands use DATABASE_URL, e.g. a local `docker run -e POSTGRES_PASSWORD=... postgres:15`.
+import argparse
+import json
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from models import SearchFilters
+from db import get_engine
+from pagination import encode_cursor
+from filter_compiler import HS_CODE_DIGITS, compile_filters
+import rollups
+from export import build_export_query
+from bulk_match import load_temp_tables
+from services import (
+    name_match,
+    entity_match,
+    build_search_query,
+    build_count_query,
+    build_match_search_query,
+    build_match_count_query,
+    build_top_importers_query,
+    build_top_suppliers_query,
+)
+
+SOURCE_TABLE = "analytics.product_icegate_imports"
+
+# (index name, definition). Name lookups carry (reg_date, id) so keyset pages are index-ordered,
+# text_pattern_ops serves code-shaped '=' / prefix LIKE filters and pg_trgm GIN serves substring filters.
+INDEXES: List[Tuple[str, str]] = [
+    ("pii_product_name_keyset", "(product_name, reg_date DESC, id DESC)"),
+    ("pii_unique_product_name_keyset", "(unique_product_name, reg_date DESC, id DESC)"),
+    ("pii_importer_name_keyset", "(true_importer_name, reg_date DESC, id DESC)"),
+    ("pii_supplier_name_keyset", "(true_supplier_name, reg_date DESC, id DESC)"),
+    ("pii_hs_code_reg_date", "(hs_code, reg_date)"),
+    ("pii_reg_date_keyset", "(reg_date DESC, id DESC)"),
+    ("pii_importer_id_prefix", "(importer_id text_pattern_ops)"),
+    ("pii_indian_port_prefix", "(indian_port text_pattern_ops)"),
+    ("pii_foreign_port_prefix", "(foreign_port text_pattern_ops)"),
+    ("pii_importer_id_trgm", "USING gin (importer_id gin_trgm_ops)"),
+    ("pii_indian_port_trgm", "USING gin (indian_port gin_trgm_ops)"),
+    ("pii_foreign_port_trgm", "USING gin (foreign_port gin_trgm_ops)"),
+]
+
+def index_ddl() -> List[str]:
+    statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+    for name, definition in INDEXES:
+        statements.append(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {SOURCE_TABLE} {definition}")
+    statements.append(f"ANALYZE {SOURCE_TABLE}")
+    return statements
+
+def apply_indexes():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in index_ddl():
+            print(statement)
+            conn.execute(text(statement))
+
+# Synthetic stand-in
+def seed_stand_in(rows: int, products: int, entities: int):
+    """Create the source table in the target database and fill it with synthetic rows"""
+    from benchmark.generator import generate
+    generate(rows, products=products, entities=entities)
+
+# Query templates with a representative parameter set
+def _top_values(conn, column: str, count: int = 3) -> List[Any]:
+    rows = conn.execute(text(f"""
+        SELECT {column} FROM {SOURCE_TABLE} WHERE {column} IS NOT NULL
+        GROUP BY {column} ORDER BY COUNT(*) DESC LIMIT {int(count)}
+    """)).fetchall()
+    return [row[0] for row in rows]
+
+def representative_parameters(conn) -> Dict[str, Any]:
+    """Most frequent names (worst case for row counts) and filters that exercise every predicate shape"""
+    products = _top_values(conn, "product_name")
+    max_date = conn.execute(text(f"SELECT MAX(reg_date) FROM {SOURCE_TABLE}")).scalar()
+    hs_codes = _top_values(conn, "hs_code", 1)
+    ports = _top_values(conn, "indian_port", 1)
+    end = max_date.replace(day=1) - timedelta(days=1) if max_date else None
+    start = (end - timedelta(days=62)).replace(day=1) if end else None
+    cursor_row = conn.execute(text(f"""
+        SELECT reg_date, id FROM {SOURCE_TABLE} WHERE product_name = :name
+        ORDER BY reg_date DESC, id DESC OFFSET 1000 LIMIT 1
+    """), {"name": products[0] if products else None}).first()
+    return {
+        "products": products,
+        "unique_products": _top_values(conn, "unique_product_name"),
+        "entities": _top_values(conn, "true_importer_name", 2) + _top_values(conn, "true_supplier_name", 1),
+        "filters": SearchFilters(
+            hs_code=str(hs_codes[0]).zfill(HS_CODE_DIGITS)[:4] if hs_codes else None,
+            port_name=ports[0][:4] if ports else None,
+            date_mode="range", start_date=start, end_date=end,
+        ),
+        "month_filters": SearchFilters(date_mode="range", start_date=start, end_date=end),
+        "cursor": encode_cursor(*cursor_row) if cursor_row else None,
+    }
+
+def query_templates(sample: Dict[str, Any]) -> List[Tuple[str, str, Dict]]:
+    """(label, query, params) for every query shape services.py issues"""
+    products, uniques, entities = sample["products"], sample["unique_products"], sample["entities"]
+    filters = sample["filters"]
+    product_match = name_match("product_name", products)
+    templates = [
+        ("search products page 1", *build_search_query(*product_match, None)),
+        ("search products page 1 filtered", *build_search_query(*product_match, filters)),
+        ("search products keyset page", *build_search_query(*product_match, None, cursor=sample["cursor"])),
+        ("search unique products page 1", *build_search_query(*name_match("unique_product_name", uniques), None)),
+        ("search entities page 1", *build_match_search_query(entity_match(entities), None)),
+        ("search entities as importer page 1", *build_match_search_query(entity_match(entities, "importer"), None)),
+        ("count entities", *build_match_count_query(entity_match(entities), None)),
+        ("count products filtered", *build_count_query(*product_match, filters)),
+        ("export products filtered", *build_export_query(product_match, filters)),
+    ]
+    # Raw-table aggregations, whatever the rollup router would choose
+    templates += [
+        ("top importers products (raw)", *build_top_importers_query("product_name", products, filters, 10, use_rollups=False)),
+        ("top importers unique products (raw)", *build_top_importers_query("unique_product_name", uniques, None, 10, use_rollups=False)),
+        ("top suppliers products (raw)", *build_top_suppliers_query("product_name", products, filters, 10, use_rollups=False)),
+        ("top suppliers unique products (raw)", *build_top_suppliers_query("unique_product_name", uniques, None, 10, use_rollups=False)),
+    ]
+    # Standalone runs have not loaded the rollup state yet; a live process keeps what it has
+    if not rollups.get_rollup_status()["available"]:
+        rollups.load_rollup_state()
+    if rollups.get_rollup_status()["available"]:
+        compiled = compile_filters(sample["month_filters"])
+        for rollup in ("top_importers", "top_suppliers"):
+            routed = rollups.route_top_query(rollup, "product_name", products, compiled, 10)
+            if routed is not None:
+                templates.append((f"{rollup.replace('_', ' ')} products (rollup)", *routed))
+    return templates
+
+# EXPLAIN reporting
+def _walk(plan: Dict[str, Any]):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+def summarize_plan(explained: Dict[str, Any]) -> Dict[str, Any]:
+    """Seq scans, worst row misestimate, buffers and timings from one EXPLAIN (FORMAT JSON) result"""
+    root = explained["Plan"]
+    seq_scans = []
+    worst: Optional[Dict[str, Any]] = None
+    for node in _walk(root):
+        if node["Node Type"] == "Seq Scan":
+            seq_scans.append(f"{node.get('Schema', '')}.{node.get('Relation Name', '')}".lstrip("."))
+        estimated = node.get("Plan Rows", 0)
+        actual = node.get("Actual Rows", 0) * max(node.get("Actual Loops", 1), 1)
+        ratio = max(estimated, 1) / max(actual, 1)
+        factor = max(ratio, 1 / ratio)
+        if worst is None or factor > worst["factor"]:
+            worst = {"node": node["Node Type"], "estimated_rows": estimated, "actual_rows": actual, "factor": round(factor, 1)}
+    return {
+        "execution_ms": round(explained.get("Execution Time", 0.0), 2),
+        "planning_ms": round(explained.get("Planning Time", 0.0), 2),
+        "seq_scans": seq_scans,
+        "estimated_rows": root.get("Plan Rows"),
+        "actual_rows": root.get("Actual Rows"),
+        "worst_estimate": worst,
+        "shared_hit_blocks": root.get("Shared Hit Blocks"),
+        "shared_read_blocks": root.get("Shared Read Blocks"),
+    }
+
+def explain_templates() -> List[Dict[str, Any]]:
+    engine = get_engine()
+    with engine.connect() as conn:
+        sample = representative_parameters(conn)
+    reports = []
+    for label, query, params in query_templates(sample):
+        with engine.connect() as conn:
+            try:
+                params = load_temp_tables(conn, params)
+                raw = conn.execute(text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query), params).scalar()
+                explained = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+                reports.append(dict(summarize_plan(explained), template=label))
+            except Exception as e:
+                reports.append({"template": label, "error": str(e)})
+            finally:
+                # EXPLAIN ANALYZE really executes the statement; never keep anything it did
+                conn.rollback()
+    return reports
+
+def print_report(reports: List[Dict[str, Any]]):
+    for report in reports:
+        if "error" in report:
+            print(f"{report['template']:<40} ERROR {report['error']}")
+            continue
+        worst = report["worst_estimate"]
+        print(
+            f"{report['template']:<40} {report['execution_ms']:>9.2f} ms"
+            f"  rows est/actual {report['estimated_rows']}/{report['actual_rows']}"
+            f"  worst {worst['node']} x{worst['factor']}"
+            f"  buffers hit/read {report['shared_hit_blocks']}/{report['shared_read_blocks']}"
+            + (f"  SEQ SCAN {', '.join(report['seq_scans'])}" if report["seq_scans"] else "")
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Index DDL, EXPLAIN reports and a synthetic stand-in for the imports table")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("ddl", help="print index DDL")
+    commands.add_parser("apply", help="create the indexes")
+    seed = commands.add_parser("seed", help="fill a stand-in database with synthetic rows")
+    seed.add_argument("--rows", type=int, default=1000000)
+    seed.add_argument("--products", type=int, default=20000)
+    seed.add_argument("--entities", type=int, default=5000)
+    explain = commands.add_parser("explain", help="EXPLAIN (ANALYZE, BUFFERS) every query template")
+    explain.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    if args.command == "ddl":
+        print(";\n".join(index_ddl()) + ";")
+    elif args.command == "apply":
+        apply_indexes()
+    elif args.command == "seed":
+        seed_stand_in(args.rows, args.products, args.entities)
+    elif args.command == "explain":
+        reports = explain_templates()
+        if args.json:
+            print(json.dumps(reports, indent=2, default=str))
+        else:
+            print_report(reports)
+
+if __name__ == "__main__":
+    main()
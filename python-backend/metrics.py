@@ -0,0 +1,236 @@
+# metrics.py - Per-stage latency histograms and counters in the Prometheus text exposition format
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds; fine-grained at the low end where autocomplete stages live
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Last path segment of a search endpoint -> search_type label
+ENDPOINT_SEARCH_TYPES = {
+    "products": "product_name",
+    "unique-products": "unique_product_name",
+    "entities": "entity",
+}
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        # Per-bucket counts (plus +Inf) are made cumulative only when scraped
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = _label_text(self.label_names, labels, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _label_text(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_number(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values"""
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_label_text(self.label_names, labels)} {_number(value)}")
+        return lines
+
+class ScrapeMetric:
+    """Counter or gauge whose values are read from existing stats when /metrics is scraped (no hot-path cost)"""
+
+    def __init__(self, name: str, documentation: str, metric_type: str, label_names: Tuple[str, ...],
+                 read: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.label_names = label_names
+        self.read = read
+
+    def collect(self) -> List[str]:
+        try:
+            values = self.read()
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {e}")
+            return []
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for labels, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f"{self.name}{_label_text(self.label_names, labels)} {_number(value)}")
+        return lines
+
+_registry: List[Any] = []
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text format"""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+REQUEST_SECONDS = register(Histogram(
+    "trade_api_request_seconds", "End-to-end request latency",
+    ("endpoint", "method", "status"),
+))
+STAGE_SECONDS = register(Histogram(
+    "trade_api_stage_seconds", "Latency of one processing stage inside a request",
+    ("endpoint", "search_type", "stage"),
+))
+STAGE_ITEMS = register(Counter(
+    "trade_api_stage_items_total", "Items handled by a stage (rows fetched, candidates scored, ...)",
+    ("endpoint", "search_type", "stage"),
+))
+
+# Request labels
+# The ASGI scope of the request being served; the router fills in "route" before the endpoint runs
+_request_scope: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_scope", default=None)
+
+def _endpoint_label(scope: Optional[Dict[str, Any]]) -> str:
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    # Route templates, never raw paths, so unknown URLs cannot blow up the label set
+    return route.path if route is not None else "unmatched"
+
+def _search_type_label(scope: Optional[Dict[str, Any]]) -> str:
+    if scope is None:
+        return ""
+    search_type = scope.get("metrics_search_type")
+    if search_type is None:
+        search_type = ENDPOINT_SEARCH_TYPES.get(scope["path"].rsplit("/", 1)[-1], "")
+        if not search_type and scope.get("query_string"):
+            search_type = parse_qs(scope["query_string"].decode("latin-1")).get("search_type", [""])[0]
+            # Only known values; the query string is user input
+            if search_type not in ENDPOINT_SEARCH_TYPES.values():
+                search_type = ""
+        scope["metrics_search_type"] = search_type
+    return search_type
+
+def observe_stage(stage_name: str, seconds: float, search_type: Optional[str] = None, items: Optional[int] = None):
+    """Record one stage timing, labelled with the current request's endpoint and search type"""
+    if not METRICS_ENABLED:
+        return
+    scope = _request_scope.get()
+    labels = (_endpoint_label(scope), search_type if search_type is not None else _search_type_label(scope), stage_name)
+    STAGE_SECONDS.observe(seconds, *labels)
+    if items is not None:
+        STAGE_ITEMS.inc(*labels, amount=items)
+
+@contextmanager
+def stage(stage_name: str, search_type: Optional[str] = None) -> Iterator[None]:
+    """Time the enclosed block as one stage of the current request"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage_name, time.perf_counter() - started, search_type)
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request and exposing its scope to stage timers"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        status = ["500"]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        token = _request_scope.set(scope)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, _endpoint_label(scope), scope["method"], status[0])
+            _request_scope.reset(token)
+
+try:
+    from fastapi.responses import JSONResponse
+
+    class TimedJSONResponse(JSONResponse):
+        """JSONResponse whose body encoding is recorded as the json_encode stage"""
+
+        def render(self, content: Any) -> bytes:
+            started = time.perf_counter()
+            body = super().render(content)
+            observe_stage("json_encode", time.perf_counter() - started)
+            return body
+except ImportError:
+    TimedJSONResponse = None
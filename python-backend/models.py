@@ -15,11 +15,26 @@ class SearchFilters(BaseModel):
 class ProductSearchRequest(BaseModel):
     product_names: List[str]
     filters: Optional[SearchFilters] = None
+    page_size: Optional[int] = None  # rows per page (default 1000)
+    cursor: Optional[str] = None  # next_cursor from the previous page
+    include_total: bool = False  # also count all matching rows
 
 class UniqueProductSearchRequest(BaseModel):
     unique_product_names: List[str]
     filters: Optional[SearchFilters] = None
+    page_size: Optional[int] = None  # rows per page (default 1000)
+    cursor: Optional[str] = None  # next_cursor from the previous page
+    include_total: bool = False  # also count all matching rows
 
 class EntitySearchRequest(BaseModel):
     entities: List[str]
-    filters: Optional[SearchFilters] = None
\ No newline at end of file
+    role: str = "either"  # 'importer', 'supplier' or 'either'
+    filters: Optional[SearchFilters] = None
+    page_size: Optional[int] = None  # rows per page (default 1000)
+    cursor: Optional[str] = None  # next_cursor from the previous page
+    include_total: bool = False  # also count all matching rows
+
+class BatchSuggestionRequest(BaseModel):
+    queries: List[str]  # e.g. pasted product descriptions, one per line
+    search_type: str  # 'product_name', 'unique_product_name' or 'entity'
+    limit: int = 5  # suggestions per query
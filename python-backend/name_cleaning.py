@@ -0,0 +1,50 @@
+# name_cleaning.py - Name normalization used by suggestion matching and corpus precomputation
+import re
+
+_LEADING_CODE = re.compile(r'^\d{8,}')
+_NUMERIC_WORD = re.compile(r'^\d+$')
+_WHITESPACE = re.compile(r'\s+')
+
+def clean_product_name(name: str) -> str:
+    """Clean product name by removing codes and unnecessary characters"""
+    # Remove leading numbers/codes (like 00000167343)
+    cleaned = _LEADING_CODE.sub('', name)
+    # Remove repeated text patterns
+    words = cleaned.split()
+    # Remove duplicates while preserving order and filter out numeric codes
+    seen = set()
+    unique_words = []
+    for word in words:
+        word_lower = word.lower()
+        # Skip if already seen or if it's a pure number
+        if word_lower not in seen and not _NUMERIC_WORD.match(word):
+            seen.add(word_lower)
+            unique_words.append(word)
+    return ' '.join(unique_words).strip()
+
+def clean_entity_name(name: str) -> str:
+    """Clean entity name by standardizing common company suffixes and formats"""
+    # Remove extra whitespace and normalize
+    cleaned = _WHITESPACE.sub(' ', name.strip())
+    
+    # Handle truncated names (common in entity data)
+    # If name ends abruptly without common suffix, it might be truncated
+    common_suffixes = ['LIMITED', 'LTD', 'PRIVATE', 'PVT', 'LLP', 'CORPORATION', 'CORP', 'INC', 'COMPANY', 'CO']
+    
+    # Check if name appears to be truncated (doesn't end with common business suffix)
+    ends_with_suffix = any(cleaned.upper().endswith(suffix) for suffix in common_suffixes)
+    
+    # If it doesn't end with a suffix and ends with incomplete words, it might be truncated
+    if not ends_with_suffix and len(cleaned) > 10:
+        words = cleaned.split()
+        last_word = words[-1] if words else ""
+        
+        # Special handling for common truncated patterns
+        if last_word.upper() in ['LIMI', 'PRIV', 'LIMIT', 'PRIVAT']:
+            # Remove the truncated word
+            cleaned = ' '.join(words[:-1])
+        elif len(last_word) < 4 and last_word.upper() not in ['LTD', 'LLC', 'INC', 'PVT', 'LLP', 'PTE']:
+            # Remove very short last words that might be truncated
+            cleaned = ' '.join(words[:-1])
+    
+    return cleaned.strip()
@@ -0,0 +1,60 @@
+# pagination.py - Keyset (cursor) pagination over (reg_date, id)
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+# Row order for every paginated search; the keyset predicate below must match it
+KEYSET_ORDER_BY = "ORDER BY reg_date DESC, id DESC"
+
+def clamp_page_size(page_size: Optional[int]) -> int:
+    """Requested page size bounded to [1, MAX_PAGE_SIZE], defaulting to DEFAULT_PAGE_SIZE"""
+    if not page_size:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+def _to_json_value(value: Any) -> Any:
+    if value is None:
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    return value
+
+def encode_cursor(reg_date: Any, row_id: Any) -> str:
+    """Opaque token pointing just after the row with this (reg_date, id)"""
+    payload = json.dumps({"d": _to_json_value(reg_date), "i": _to_json_value(row_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str) -> Tuple[Optional[Any], Any]:
+    """Inverse of encode_cursor; raises ValueError for malformed tokens"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        reg_date, row_id = payload["d"], payload["i"]
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+    # A forged token can carry any JSON types; only these reach the query
+    if not (reg_date is None or isinstance(reg_date, str)) or not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError("Invalid pagination cursor")
+    if reg_date is not None:
+        # Drivers such as asyncpg need real date objects, not ISO strings
+        reg_date = date.fromisoformat(reg_date) if len(reg_date) == 10 else datetime.fromisoformat(reg_date)
+    return reg_date, row_id
+
+def keyset_predicate(cursor: Optional[str], params: Dict[str, Any]) -> str:
+    """SQL predicate selecting rows after the cursor in KEYSET_ORDER_BY order ('' for the first page)"""
+    if not cursor:
+        return ""
+    reg_date, row_id = decode_cursor(cursor)
+    params["cursor_id"] = row_id
+    if reg_date is None:
+        # Postgres sorts NULL reg_date first under DESC, so every non-NULL row still follows
+        return " AND ((reg_date IS NULL AND id < :cursor_id) OR reg_date IS NOT NULL)"
+    params["cursor_reg_date"] = reg_date
+    # Row-value comparison lets Postgres walk a (reg_date, id) index straight to the page start
+    return " AND (reg_date, id) < (:cursor_reg_date, :cursor_id)"
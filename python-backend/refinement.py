@@ -0,0 +1,79 @@
+# refinement.py - Per-session candidate sets so each keystroke narrows the previous query's matches
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from metrics import Counter, ScrapeMetric, register
+
+SUGGESTION_SESSION_TTL = int(os.getenv("SUGGESTION_SESSION_TTL", "300"))
+SUGGESTION_SESSION_MAX = int(os.getenv("SUGGESTION_SESSION_MAX", "10000"))
+# Larger candidate sets (very short, very common queries) are not worth keeping per session
+SUGGESTION_SESSION_MAX_CANDIDATES = int(os.getenv("SUGGESTION_SESSION_MAX_CANDIDATES", "50000"))
+
+REFINEMENTS = register(Counter(
+    "trade_api_suggestion_refinements_total",
+    "Session suggestion lookups narrowed from the previous query (refined) or computed from the index (seeded)",
+    ("search_type", "result"),
+))
+
+class RefinementCache:
+    """LRU of (session, search_type) -> ids of corpus names containing the session's last query.
+
+    Any name containing an extended query also contains the query it extends, so the next
+    keystroke only has to re-check the previous candidates instead of the whole corpus.
+    """
+
+    def __init__(self, max_sessions: int, ttl: int):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _previous(self, key: Tuple[str, str], corpus: Any) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, entry_corpus, query_upper, ids = entry
+            # A refreshed corpus may hold new matches, so start over
+            if expires_at < time.monotonic() or entry_corpus is not corpus:
+                del self._entries[key]
+                return None
+            return query_upper, ids
+
+    def narrow(self, session_id: str, search_type: str, corpus: Any, query_upper: str) -> Optional[array]:
+        """Ids whose upper-cased name contains query_upper, derived from the previous query when it is a substring"""
+        previous = self._previous((session_id, search_type), corpus)
+        if previous is None or previous[0] not in query_upper:
+            REFINEMENTS.inc(search_type, "seeded")
+            return None
+        previous_query, ids = previous
+        REFINEMENTS.inc(search_type, "refined")
+        if previous_query == query_upper:
+            return ids
+        return corpus.upper.filter_ids(ids, query_upper)
+
+    def remember(self, session_id: str, search_type: str, corpus: Any, query_upper: str, ids: array):
+        key = (session_id, search_type)
+        with self._lock:
+            if len(ids) > SUGGESTION_SESSION_MAX_CANDIDATES:
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, corpus, query_upper, ids)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def forget(self, session_id: str, search_type: str):
+        with self._lock:
+            self._entries.pop((session_id, search_type), None)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+refinement_cache = RefinementCache(SUGGESTION_SESSION_MAX, SUGGESTION_SESSION_TTL)
+
+register(ScrapeMetric("trade_api_suggestion_sessions", "Suggestion sessions holding a candidate set",
+                      "gauge", (), lambda: {(): refinement_cache.size()}))
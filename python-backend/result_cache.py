@@ -0,0 +1,286 @@
+# result_cache.py - TTL + LRU cache for search and top-N results keyed on the normalized request
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from models import SearchFilters
+from filter_compiler import filter_key
+from metrics import Counter, ScrapeMetric, register
+from coalescing import single_flight
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory")  # 'memory' or 'redis'
+RESULT_CACHE_REDIS_URL = os.getenv("RESULT_CACHE_REDIS_URL", "redis://localhost:6379/0")
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "512"))
+# Approximate payload budget of the in-process cache, and the largest single result worth caching
+# (a full search page of 10000 rows is tens of MB as Python objects)
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESULT_CACHE_MAX_ENTRY_BYTES", str(16 * 1024 * 1024)))
+# Items sampled per list when estimating a result's size
+_SIZE_SAMPLE = 16
+
+def request_key(namespace: str, names: List[str], filters: Optional[SearchFilters], **extra) -> str:
+    """Cache key for a request: namespace plus a digest of sorted names, the canonical filter key and extras"""
+    payload = {
+        "names": sorted(set(names)),
+        "filters": filter_key(filters),
+        "extra": extra,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{namespace}:{hashlib.sha1(encoded.encode('utf-8')).hexdigest()}"
+
+def approximate_size(value: Any) -> int:
+    """Rough in-memory bytes of a JSON-like result; long lists are extrapolated from a sample of items
+    and dict keys are not counted (row dicts share their column-name strings)"""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approximate_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        size = sys.getsizeof(value)
+        if len(value) <= _SIZE_SAMPLE:
+            return size + sum(approximate_size(item) for item in value)
+        step = len(value) / _SIZE_SAMPLE
+        sampled = sum(approximate_size(value[int(i * step)]) for i in range(_SIZE_SAMPLE))
+        return size + sampled * len(value) // _SIZE_SAMPLE
+    return sys.getsizeof(value)
+
+class InProcessBackend:
+    """Per-process LRU dictionary with per-entry expiry, bounded by entry count and approximate bytes"""
+
+    def __init__(self, max_entries: int, max_bytes: int, max_entry_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.evictions = 0
+        self.oversized = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, size = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.nbytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int):
+        size = approximate_size(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous[2]
+            if size > min(self.max_entry_bytes, self.max_bytes):
+                # Caching one huge page would push out many small results
+                self.oversized += 1
+                return
+            self._entries[key] = (time.monotonic() + ttl, value, size)
+            self.nbytes += size
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def size(self) -> int:
+        return len(self._entries)
+
+class RedisBackend:
+    """Redis (or any Redis-compatible server) backend so workers share results; eviction is the server's maxmemory policy"""
+
+    def __init__(self, url: str, max_entry_bytes: int, prefix: str = "trade-api:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.max_entry_bytes = max_entry_bytes
+        self.prefix = prefix
+        # Held by the server, not this process
+        self.nbytes = None
+        self.evictions = 0
+        self.oversized = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: int):
+        raw = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(raw) > self.max_entry_bytes:
+            self.oversized += 1
+            return
+        self.client.setex(self.prefix + key, ttl, raw)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+    def size(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*"))
+
+class ResultCache:
+    """Result cache with hit/miss accounting over a pluggable backend"""
+
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            # A broken shared cache must never fail the request
+            self.errors += 1
+            print(f"Result cache get failed: {e}")
+            return None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            print(f"Result cache set failed: {e}")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            "enabled": RESULT_CACHE_ENABLED,
+            "backend": type(self.backend).__name__,
+            "ttl_seconds": self.ttl,
+            "max_entries": RESULT_CACHE_MAX_ENTRIES,
+            "entries": size,
+            "bytes": self.backend.nbytes,
+            "max_bytes": RESULT_CACHE_MAX_BYTES,
+            "max_entry_bytes": RESULT_CACHE_MAX_ENTRY_BYTES,
+            "oversized": self.backend.oversized,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.backend.evictions,
+            "errors": self.errors,
+        }
+
+def _create_backend():
+    if RESULT_CACHE_BACKEND == "redis":
+        try:
+            return RedisBackend(RESULT_CACHE_REDIS_URL, RESULT_CACHE_MAX_ENTRY_BYTES)
+        except Exception as e:
+            print(f"Redis result cache unavailable ({e}), using in-process cache")
+    return InProcessBackend(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_MAX_ENTRY_BYTES)
+
+result_cache = ResultCache(_create_backend(), RESULT_CACHE_TTL)
+
+CACHE_LOOKUPS = register(Counter("trade_api_result_cache_lookups_total", "Result cache lookups by service namespace",
+                                 ("namespace", "result")))
+
+register(ScrapeMetric("trade_api_result_cache_entries", "Entries held by the result cache backend",
+                      "gauge", (), lambda: {(): result_cache.backend.size()}))
+register(ScrapeMetric("trade_api_result_cache_bytes", "Approximate bytes held by the in-process result cache",
+                      "gauge", (), lambda: {(): result_cache.backend.nbytes}))
+register(ScrapeMetric("trade_api_result_cache_oversized_total", "Results too large to cache",
+                      "counter", (), lambda: {(): result_cache.backend.oversized}))
+register(ScrapeMetric("trade_api_result_cache_evictions_total", "Entries evicted to respect the size bound",
+                      "counter", (), lambda: {(): result_cache.backend.evictions}))
+register(ScrapeMetric("trade_api_result_cache_errors_total", "Failed result cache reads and writes",
+                      "counter", (), lambda: {(): result_cache.errors}))
+
+def _is_cacheable(result: Any) -> bool:
+    return isinstance(result, dict) and "error" not in result
+
+def _for_caller(result: Dict[str, Any], names: List[str]) -> Dict[str, Any]:
+    # Keys ignore name order, so echo back the names exactly as this caller sent them
+    if "products_searched" not in result:
+        return result
+    result = dict(result, products_searched=names)
+    # Combined (dashboard) results carry the names in each section too
+    for key, value in result.items():
+        if isinstance(value, dict) and "products_searched" in value:
+            result[key] = dict(value, products_searched=names)
+    return result
+
+def cached_result(namespace: str) -> Callable:
+    """Cache a service function's result on (names, filters, other args); works for sync and async functions.
+
+    Concurrent misses for the same key are coalesced into one call of the function.
+    The wrapped function must take the name list as its first argument and `filters` as a parameter.
+    Sync and async variants of one service should share a namespace so they share entries.
+    """
+    def decorator(fn: Callable) -> Callable:
+        signature = inspect.signature(fn)
+        names_param = next(iter(signature.parameters))
+
+        def key_for(args, kwargs) -> tuple:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            names = arguments.pop(names_param)
+            filters = arguments.pop("filters", None)
+            return request_key(namespace, names, filters, **arguments), names
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                key, names = key_for(args, kwargs)
+                if RESULT_CACHE_ENABLED:
+                    cached = result_cache.get(key)
+                    CACHE_LOOKUPS.inc(namespace, "miss" if cached is None else "hit")
+                    if cached is not None:
+                        return _for_caller(cached, names)
+
+                async def compute():
+                    result = await fn(*args, **kwargs)
+                    if RESULT_CACHE_ENABLED and _is_cacheable(result):
+                        result_cache.set(key, result)
+                    return result
+                # Identical requests arriving while this one runs wait for it instead of querying again
+                return _for_caller(await single_flight.run_async(key, compute, namespace), names)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key, names = key_for(args, kwargs)
+            if RESULT_CACHE_ENABLED:
+                cached = result_cache.get(key)
+                CACHE_LOOKUPS.inc(namespace, "miss" if cached is None else "hit")
+                if cached is not None:
+                    return _for_caller(cached, names)
+
+            def compute():
+                result = fn(*args, **kwargs)
+                if RESULT_CACHE_ENABLED and _is_cacheable(result):
+                    result_cache.set(key, result)
+                return result
+            return _for_caller(single_flight.run(key, compute, namespace), names)
+        return wrapper
+
+    return decorator
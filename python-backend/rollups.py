@@ -0,0 +1,327 @@
+# rollups.py - Monthly pre-aggregated rollups for top importers / suppliers, their refresh job and query router
+import os
+import sys
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from filter_compiler import CompiledFilters
+from db import get_engine
+from bulk_match import membership
+from metrics import Counter, register
+
+# Route top-N queries to the rollups when they can answer them exactly
+ROLLUP_ENABLED = os.getenv("ROLLUP_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+# Monotonic column used to find months touched by new rows
+ROLLUP_WATERMARK_COLUMN = os.getenv("ROLLUP_WATERMARK_COLUMN", "id")
+# Seconds between incremental refreshes of already-built rollups; 0 disables the refresher
+ROLLUP_REFRESH_INTERVAL = int(os.getenv("ROLLUP_REFRESH_INTERVAL", "900"))
+
+SOURCE_TABLE = "analytics.product_icegate_imports"
+STATE_TABLE = "analytics.rollup_state"
+# pg_advisory_xact_lock key serializing builds and refreshes across workers and the CLI
+ROLLUP_LOCK_KEY = 7312001
+ROLLUP_MONTH_SQL = "CAST(date_trunc('month', reg_date) AS DATE)"
+
+# Name columns a rollup row can be keyed by (stored in name_kind / name_value)
+ROLLUP_NAME_COLUMNS = ["product_name", "unique_product_name"]
+
+# Per rollup: grouping columns, the raw-table condition and the filter fields it can answer.
+# Dimensions behind COUNT(DISTINCT ...) outputs are kept as grouping columns so those counts stay exact,
+# and every other dimension is filterable. Where (name, entity) pairs rarely repeat within a month the
+# rollups hold about as many rows as the source and only win by being narrower and name-indexed;
+# `python rollups.py stats` shows how much they compress on real data.
+ROLLUPS = {
+    "top_importers": {
+        "table": "analytics.rollup_top_importers_monthly",
+        "entity_columns": ["true_importer_name", "importer_id", "city"],
+        "dimensions": ["hs_code", "indian_port", "foreign_port", "origin_country"],
+        "condition": "true_importer_name IS NOT NULL AND total_value_usd IS NOT NULL",
+        "filters": {"hs_code", "importer_id", "port_name"},
+    },
+    "top_suppliers": {
+        "table": "analytics.rollup_top_suppliers_monthly",
+        "entity_columns": ["true_supplier_name", "supplier_name"],
+        "dimensions": ["hs_code", "indian_port", "foreign_port", "true_importer_name"],
+        "condition": "true_supplier_name IS NOT NULL AND total_value_usd IS NOT NULL",
+        "filters": {"hs_code", "port_name"},
+    },
+}
+
+# Output columns of the raw top-N queries, re-aggregated from rollup measures
+ROLLUP_OUTPUT = {
+    "top_importers": """
+            COUNT(DISTINCT hs_code) as unique_hs_codes,
+            COUNT(DISTINCT origin_country) as unique_countries""",
+    "top_suppliers": """
+            COUNT(DISTINCT hs_code) as unique_hs_codes,
+            COUNT(DISTINCT true_importer_name) as unique_importers""",
+}
+ROLLUP_DATE_OUTPUT = {
+    "top_importers": ("first_import_date", "last_import_date"),
+    "top_suppliers": ("first_export_date", "last_export_date"),
+}
+
+_state_lock = threading.Lock()
+_watermark: Optional[Any] = None
+_refreshed_at: Optional[datetime] = None
+ROLLUP_ROUTES = register(Counter(
+    "trade_api_rollup_routes_total", "Top-N queries answered from the rollups or the raw table", ("target",)
+))
+
+# Build / refresh
+def _rollup_select(rollup: str, name_column: str, where: str = "") -> str:
+    spec = ROLLUPS[rollup]
+    group_columns = ", ".join(spec["entity_columns"] + spec["dimensions"])
+    return f"""
+        SELECT
+            '{name_column}' AS name_kind,
+            {name_column} AS name_value,
+            {ROLLUP_MONTH_SQL} AS month,
+            {group_columns},
+            COUNT(*) AS shipments,
+            SUM(total_value_usd) AS total_value_usd,
+            SUM(quantity) AS total_quantity,
+            SUM(unit_price_usd) AS unit_price_sum,
+            COUNT(unit_price_usd) AS unit_price_count,
+            MIN(reg_date) AS first_date,
+            MAX(reg_date) AS last_date
+        FROM {SOURCE_TABLE}
+        WHERE {name_column} IS NOT NULL AND {spec["condition"]}{where}
+        GROUP BY {name_column}, {ROLLUP_MONTH_SQL}, {group_columns}
+    """
+
+def _ensure_tables(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            name VARCHAR(64) PRIMARY KEY,
+            watermark BIGINT,
+            refreshed_at TIMESTAMP
+        )
+    """))
+    for rollup, spec in ROLLUPS.items():
+        # Column types follow the source table
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {spec['table']} AS {_rollup_select(rollup, ROLLUP_NAME_COLUMNS[0])} LIMIT 0"))
+        index_name = spec["table"].split(".")[-1] + "_lookup"
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {spec['table']} (name_kind, name_value, month)"))
+
+def _lock(conn):
+    """Hold the rollup lock until the transaction ends; every worker runs the refresher, and two
+    concurrent DELETE + INSERT runs over the same months would each miss the other's uncommitted rows"""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ROLLUP_LOCK_KEY})
+
+def _month_bounds(month: Any) -> Tuple[date, date]:
+    if isinstance(month, str):
+        month = date.fromisoformat(month[:10])
+    elif isinstance(month, datetime):
+        month = month.date()
+    start = month.replace(day=1)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+def _month_scope(month: Any) -> Tuple[str, str, Dict[str, Any]]:
+    """Rollup rows to delete, source rows to re-aggregate and their params for one month
+    (None: rows without a reg_date, which roll up under a NULL month)"""
+    if month is None:
+        return " WHERE month IS NULL", " AND reg_date IS NULL", {}
+    start, end = _month_bounds(month)
+    return (" WHERE month >= :month_start AND month < :month_end",
+            " AND reg_date >= :month_start AND reg_date < :month_end",
+            {"month_start": start, "month_end": end})
+
+def _rebuild(conn, months: Optional[List[Any]] = None):
+    """Recompute all rollup rows, or only those of the given months"""
+    scopes = [("", "", {})] if months is None else [_month_scope(month) for month in months]
+    for rollup, spec in ROLLUPS.items():
+        for delete_where, where, params in scopes:
+            conn.execute(text(f"DELETE FROM {spec['table']}{delete_where}"), params)
+            for name_column in ROLLUP_NAME_COLUMNS:
+                conn.execute(text(f"INSERT INTO {spec['table']} {_rollup_select(rollup, name_column, where)}"), params)
+
+def _save_state(conn, watermark: Any):
+    conn.execute(text(f"""
+        INSERT INTO {STATE_TABLE} (name, watermark, refreshed_at) VALUES ('top_rollups', :watermark, :refreshed_at)
+        ON CONFLICT (name) DO UPDATE SET watermark = excluded.watermark, refreshed_at = excluded.refreshed_at
+    """), {"watermark": watermark, "refreshed_at": datetime.utcnow()})
+
+def _set_state(watermark: Any, refreshed_at: Any):
+    global _watermark, _refreshed_at
+    with _state_lock:
+        _watermark, _refreshed_at = watermark, refreshed_at
+
+def build_rollups():
+    """Full (re)build of every rollup table; readers keep seeing the old rows until commit"""
+    engine = get_engine()
+    with engine.begin() as conn:
+        _ensure_tables(conn)
+        _lock(conn)
+        watermark = conn.execute(text(f"SELECT MAX({ROLLUP_WATERMARK_COLUMN}) FROM {SOURCE_TABLE}")).scalar()
+        _rebuild(conn)
+        _save_state(conn, watermark)
+    _set_state(watermark, datetime.utcnow())
+    print(f"Built rollups (watermark={watermark})")
+
+def refresh_rollups():
+    """Recompute only the months touched by rows added since the last build/refresh"""
+    engine = get_engine()
+    with engine.begin() as conn:
+        # Read under the lock: a worker that waited sees the watermark another one just committed and finds nothing new
+        _lock(conn)
+        previous = conn.execute(text(f"SELECT watermark FROM {STATE_TABLE} WHERE name = 'top_rollups'")).scalar()
+        if previous is None:
+            print("Rollups have not been built; run a full build first")
+            return
+        watermark = conn.execute(
+            text(f"SELECT MAX({ROLLUP_WATERMARK_COLUMN}) FROM {SOURCE_TABLE} WHERE {ROLLUP_WATERMARK_COLUMN} > :above"),
+            {"above": previous},
+        ).scalar()
+        if watermark is not None:
+            months = [row[0] for row in conn.execute(text(f"""
+                SELECT DISTINCT {ROLLUP_MONTH_SQL} FROM {SOURCE_TABLE}
+                WHERE {ROLLUP_WATERMARK_COLUMN} > :above AND {ROLLUP_WATERMARK_COLUMN} <= :upper
+            """), {"above": previous, "upper": watermark})]
+            _rebuild(conn, months)
+            _save_state(conn, watermark)
+            print(f"Refreshed rollups for {len(months)} month(s) (watermark={watermark})")
+        else:
+            watermark = previous
+    _set_state(watermark, datetime.utcnow())
+
+def rollup_stats() -> List[Dict[str, Any]]:
+    """Rows of each rollup and name kind next to the source rows they aggregate"""
+    stats = []
+    with get_engine().connect() as conn:
+        for rollup, spec in ROLLUPS.items():
+            for name_column in ROLLUP_NAME_COLUMNS:
+                rollup_rows = conn.execute(text(f"SELECT COUNT(*) FROM {spec['table']} WHERE name_kind = :kind"),
+                                           {"kind": name_column}).scalar()
+                source_rows = conn.execute(text(f"""
+                    SELECT COUNT(*) FROM {SOURCE_TABLE} WHERE {name_column} IS NOT NULL AND {spec["condition"]}
+                """)).scalar()
+                stats.append({
+                    "rollup": rollup,
+                    "name_kind": name_column,
+                    "rollup_rows": rollup_rows,
+                    "source_rows": source_rows,
+                    "ratio": round(rollup_rows / source_rows, 4) if source_rows else None,
+                })
+    return stats
+
+def load_rollup_state():
+    """Pick up the built rollups' watermark (routing stays off until rollups exist)"""
+    try:
+        with get_engine().connect() as conn:
+            row = conn.execute(text(f"SELECT watermark, refreshed_at FROM {STATE_TABLE} WHERE name = 'top_rollups'")).first()
+    except Exception as e:
+        print(f"Rollups unavailable, top-N queries use the raw table ({type(e).__name__})")
+        row = None
+    _set_state(*(row if row is not None else (None, None)))
+
+def get_rollup_status() -> Dict[str, Any]:
+    return {
+        "enabled": ROLLUP_ENABLED,
+        "available": _watermark is not None,
+        "watermark": _watermark,
+        "refreshed_at": _refreshed_at,
+        "routed_to_rollup": int(ROLLUP_ROUTES.value("rollup")),
+        "routed_to_raw": int(ROLLUP_ROUTES.value("raw")),
+    }
+
+# Query router
+def _month_aligned(compiled: CompiledFilters) -> bool:
+    """Whether the half-open date range starts and ends on month boundaries (or is unbounded)"""
+    return all(bound is None or bound.day == 1 for bound in compiled.date_range)
+
+def _routable(rollup: str, compiled: CompiledFilters) -> bool:
+    if not ROLLUP_ENABLED or _watermark is None:
+        return False
+    if compiled.fields - ROLLUPS[rollup]["filters"] - {"date"}:
+        return False
+    return _month_aligned(compiled)
+
+def route_top_query(rollup: str, name_column: str, names: List[str], compiled: CompiledFilters,
+                    limit: int) -> Optional[Tuple[str, Dict]]:
+    """Top-N query against the rollup when it answers the request exactly, else None (use the raw table)"""
+    if name_column not in ROLLUP_NAME_COLUMNS or not _routable(rollup, compiled):
+        ROLLUP_ROUTES.inc("raw")
+        return None
+    ROLLUP_ROUTES.inc("rollup")
+    spec = ROLLUPS[rollup]
+    name_sql, params = membership(["name_value"], names)
+    params["rollup_kind"] = name_column
+    query = f"""
+        SELECT
+            {", ".join(spec["entity_columns"])},
+            SUM(shipments) as total_shipments,
+            SUM(total_value_usd) as total_value_usd,
+            SUM(total_quantity) as total_quantity,
+            SUM(unit_price_sum) / NULLIF(SUM(unit_price_count), 0) as avg_unit_price_usd,
+            MIN(first_date) as {ROLLUP_DATE_OUTPUT[rollup][0]},
+            MAX(last_date) as {ROLLUP_DATE_OUTPUT[rollup][1]},{ROLLUP_OUTPUT[rollup]}
+        FROM {spec["table"]}
+        WHERE name_kind = :rollup_kind AND {name_sql}
+    """
+    first_month, end_month = compiled.date_range
+    if first_month is not None:
+        query += " AND month >= :rollup_first_month"
+        params["rollup_first_month"] = first_month
+    if end_month is not None:
+        query += " AND month < :rollup_end_month"
+        params["rollup_end_month"] = end_month
+    # Rollups keep the filterable columns under their source names, so the compiled predicates apply as-is
+    filter_sql, filter_params = compiled.predicate(exclude=("date",))
+    query += filter_sql
+    params.update(filter_params)
+    query += f"""
+        GROUP BY {", ".join(spec["entity_columns"])}
+        ORDER BY total_value_usd DESC
+        LIMIT {int(limit)}
+    """
+    return query, params
+
+# Background refresher
+_refresher_thread: Optional[threading.Thread] = None
+_refresher_stop = threading.Event()
+
+def _refresh_loop(interval: int):
+    while not _refresher_stop.wait(interval):
+        try:
+            if _watermark is None:
+                # Rollups may have been built since startup (e.g. by `python rollups.py build`)
+                load_rollup_state()
+                continue
+            refresh_rollups()
+        except Exception as e:
+            print(f"Error refreshing rollups: {e}")
+
+def start_rollup_refresher(interval: int = ROLLUP_REFRESH_INTERVAL):
+    """Load rollup state and start the incremental refresher thread (no-op when the interval is 0)"""
+    global _refresher_thread
+    load_rollup_state()
+    if interval <= 0 or _refresher_thread is not None:
+        return
+    _refresher_stop.clear()
+    _refresher_thread = threading.Thread(target=_refresh_loop, args=(interval,), name="rollup-refresher", daemon=True)
+    _refresher_thread.start()
+
+def stop_rollup_refresher():
+    global _refresher_thread
+    if _refresher_thread is not None:
+        _refresher_stop.set()
+        _refresher_thread.join(timeout=5)
+        _refresher_thread = None
+
+if __name__ == "__main__":
+    # python rollups.py build | refresh | stats
+    command = sys.argv[1] if len(sys.argv) > 1 else "refresh"
+    if command == "build":
+        build_rollups()
+    elif command == "refresh":
+        refresh_rollups()
+    elif command == "stats":
+        for row in rollup_stats():
+            print(f"{row['rollup']:14} {row['name_kind']:20} {row['rollup_rows']:>12} rollup rows "
+                  f"{row['source_rows']:>12} source rows  ratio {row['ratio']}")
+    else:
+        print("Usage: python rollups.py [build|refresh|stats]")
+        sys.exit(1)
@@ -0,0 +1,364 @@
+# search_index.py
+import heapq
+import re
+from array import array
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from string_pool import StringPool
+
+_NON_ALNUM = re.compile(r'[^0-9A-Z]')
+
+def normalize_for_index(text: str) -> str:
+    """Upper-case and blank out punctuation character-by-character (keeps substring relations intact)"""
+    return _NON_ALNUM.sub(' ', text.upper())
+
+def trigrams(text: str) -> List[str]:
+    """Distinct trigrams of an already normalized string, skipping pure-whitespace grams"""
+    grams = []
+    seen = set()
+    for i in range(len(text) - 2):
+        gram = text[i:i + 3]
+        if gram not in seen and gram.strip():
+            seen.add(gram)
+            grams.append(gram)
+    return grams
+
+def rank_matches(upper: StringPool, ids: Iterable[int], query_upper: str, limit: int,
+                 by_position: bool = False) -> List[int]:
+    """The first `limit` ids in the order fuzzy_match tiers their names: exact, prefix, other substring
+    matches (by match position with `by_position`), then names not containing the query; by id
+    within a tier. `upper` is a shortest-first pool, so exact matches precede longer prefix matches."""
+    if by_position:
+        ids = list(ids)
+        ranked = []
+        for string_id, (before, after) in zip(ids, upper.match_spans(ids, query_upper)):
+            if before < 0:
+                ranked.append((3, 0, string_id))
+            elif before == 0:
+                ranked.append((0 if after == 0 else 1, 0, string_id))
+            else:
+                ranked.append((2, before, string_id))
+        return [string_id for _, _, string_id in heapq.nsmallest(limit, ranked)]
+
+    # Prefix matches are found in id order straight from the buffer, then the remaining slots take
+    # the lowest-id substring matches; only as many names as the shortlist needs are checked
+    ids = ids if isinstance(ids, (set, frozenset)) else set(ids)
+    prefixed = upper.prefix_ids(query_upper, limit, ids)
+    spans = upper.match_spans(prefixed, query_upper)
+    shortlist = [string_id for string_id, span in zip(prefixed, spans) if span == (0, 0)]
+    shortlist += [string_id for string_id, span in zip(prefixed, spans) if span != (0, 0)]
+    taken = set(shortlist)
+    unmatched = []
+    for string_id in sorted(ids):
+        if len(shortlist) >= limit:
+            break
+        if string_id in taken:
+            continue
+        if upper.match_spans((string_id,), query_upper)[0][0] > 0:
+            shortlist.append(string_id)
+        elif len(unmatched) < limit:
+            unmatched.append(string_id)
+    return (shortlist + unmatched)[:limit]
+
+class TrigramIndex:
+    """In-memory trigram inverted index used to shortlist suggestion candidates"""
+
+    def __init__(self, corpus: StringPool):
+        # Ids are positions in `corpus`; callers keep parallel per-name arrays in the same order
+        self.strings = corpus
+        self.postings: Dict[str, array] = {}
+        self._add_postings(0)
+
+    def _add_postings(self, first_id: int):
+        postings = self.postings
+        for string_id, string in enumerate(self.strings[first_id:], first_id):
+            for gram in trigrams(normalize_for_index(string)):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array('I')
+                posting.append(string_id)
+
+    @classmethod
+    def from_postings(cls, strings: StringPool, postings: Dict[str, Any]) -> 'TrigramIndex':
+        """Index over already tokenized postings (e.g. memoryviews of a snapshot file)"""
+        index = cls.__new__(cls)
+        index.strings = strings
+        index.postings = postings
+        return index
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def remapped(self, strings: StringPool, new_ids: Any, added_ids: List[int]) -> 'TrigramIndex':
+        """Copy of the index over `strings`, where indexed string i now has id new_ids[i] (ascending)
+        and the strings at added_ids are new; only the new strings are tokenized"""
+        index = TrigramIndex.__new__(TrigramIndex)
+        index.strings = strings
+        mapping = np.asarray(new_ids, dtype=np.uint32)
+        index.postings = {}
+        for gram, posting in self.postings.items():
+            ids = array('I')
+            ids.frombytes(mapping[np.frombuffer(posting, dtype=np.uint32)].tobytes())
+            index.postings[gram] = ids
+        # New ids interleave with the remapped ones, so postings they join are re-sorted
+        grown = set()
+        for string_id, string in zip(added_ids, strings.take(added_ids)):
+            for gram in trigrams(normalize_for_index(string)):
+                posting = index.postings.get(gram)
+                if posting is None:
+                    posting = index.postings[gram] = array('I')
+                posting.append(string_id)
+                grown.add(gram)
+        for gram in grown:
+            index.postings[gram] = array('I', sorted(index.postings[gram]))
+        return index
+
+    def candidates(self, query: str, limit: int = 2000, min_overlap: float = 0.3,
+                   upper: Optional[StringPool] = None, by_position: bool = False) -> Optional[List[str]]:
+        """Strings for candidate_ids, or None when the query is too short to narrow"""
+        ids = self.candidate_ids(query, limit, min_overlap, upper, by_position)
+        return None if ids is None else self.strings.take(ids)
+
+    def candidate_ids(self, query: str, limit: int = 2000, min_overlap: float = 0.3,
+                      upper: Optional[StringPool] = None, by_position: bool = False) -> Optional[List[int]]:
+        """Return ids of a shortlist of strings likely to match the query.
+
+        Strings containing every query trigram (a superset of substring matches) come first,
+        then strings ranked by shared trigrams for the fuzzy stage. When more than `limit` strings
+        contain every trigram they are ranked with rank_matches before truncating, so prefix matches
+        are never crowded out by shorter substring matches. `upper` is the upper-cased pool parallel
+        to the indexed strings (the strings themselves by default). Returns None when the query is
+        too short to produce trigrams, meaning the caller should not narrow.
+        """
+        grams = trigrams(normalize_for_index(query).strip())
+        if not grams:
+            return None
+
+        posting_lists = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+        contains_ids = self._intersect(posting_lists)
+
+        if len(contains_ids) > limit:
+            return rank_matches(self.strings if upper is None else upper, contains_ids, query.upper(), limit, by_position)
+        shortlist = sorted(contains_ids)
+        if len(shortlist) >= limit:
+            return shortlist
+
+        # Not enough substring candidates: add strings sharing the most trigrams with the query
+        overlap: Dict[int, int] = {}
+        for posting in posting_lists:
+            for string_id in posting:
+                overlap[string_id] = overlap.get(string_id, 0) + 1
+
+        required = max(1, int(len(grams) * min_overlap))
+        fuzzy_ids = [
+            string_id for string_id, count in overlap.items()
+            if count >= required and string_id not in contains_ids
+        ]
+        fuzzy_ids.sort(key=lambda string_id: (-overlap[string_id], string_id))
+        shortlist.extend(fuzzy_ids[:limit - len(shortlist)])
+        return shortlist
+
+    def superset_ids(self, query: str) -> Optional[set]:
+        """Ids of every string containing all query trigrams (a superset of the strings containing
+        the query), or None when the query is too short to produce trigrams"""
+        grams = trigrams(normalize_for_index(query).strip())
+        if not grams:
+            return None
+        return self._intersect(sorted((self.postings.get(gram, ()) for gram in grams), key=len))
+
+    @staticmethod
+    def _intersect(posting_lists: List[Any]) -> set:
+        # Intersect smallest posting list first so the working set only shrinks
+        contains_ids = set(posting_lists[0])
+        for posting in posting_lists[1:]:
+            if not contains_ids:
+                break
+            contains_ids.intersection_update(posting)
+        return contains_ids
+
+class _SortedKeys:
+    """Upper-cased names in prefix order, decoded on access (what bisect probes)"""
+
+    __slots__ = ("upper", "order")
+
+    def __init__(self, upper: StringPool, order: Any):
+        self.upper = upper
+        self.order = order
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __getitem__(self, position: int) -> str:
+        return self.upper[self.order[position]]
+
+class PrefixIndex:
+    """Name ids sorted by upper-cased name, answering prefix lookups with bisect"""
+
+    # Prefixes this short match huge ranges, so their shortest hits are precomputed;
+    # longer prefixes select ranges small enough to rank on the fly
+    SHORT_PREFIX_LENGTH = 3
+    SHORT_PREFIX_HITS = 64
+
+    def __init__(self, names: StringPool, upper: StringPool):
+        name_list = names.to_list()
+        upper_list = name_list if upper is names else upper.to_list()
+        order = sorted(range(len(name_list)), key=lambda i: (upper_list[i], name_list[i]))
+        keys = [upper_list[i] for i in order]
+        short_prefix_ids: Dict[str, array] = {}
+        for length in range(1, self.SHORT_PREFIX_LENGTH + 1):
+            # Keys are sorted, so every prefix bucket is one contiguous run
+            start = 0
+            while start < len(keys):
+                prefix = keys[start][:length]
+                if len(prefix) < length:
+                    start += 1
+                    continue
+                end = bisect_left(keys, prefix + '\U0010ffff', start)
+                short_prefix_ids[prefix] = array('I', heapq.nsmallest(
+                    self.SHORT_PREFIX_HITS, order[start:end], key=lambda i: len(name_list[i])
+                ))
+                start = end
+        self._init(names, upper, array('I', order), short_prefix_ids)
+
+    def _init(self, names: StringPool, upper: StringPool, order: Any, short_prefix_ids: Dict[str, Any]):
+        self.names = names
+        self.upper = upper
+        self.order = order
+        self.keys = _SortedKeys(upper, order)
+        self._short_prefix_ids = short_prefix_ids
+
+    @classmethod
+    def from_order(cls, names: StringPool, upper: StringPool, order: Any,
+                   short_prefix_ids: Dict[str, Any]) -> 'PrefixIndex':
+        """Index from an already computed order and short-prefix hit ids (e.g. from a snapshot)"""
+        index = cls.__new__(cls)
+        index._init(names, upper, order, short_prefix_ids)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def _range(self, prefix_upper: str) -> Tuple[int, int]:
+        lo = bisect_left(self.keys, prefix_upper)
+        hi = bisect_left(self.keys, prefix_upper + '\U0010ffff', lo)
+        return lo, hi
+
+    def count(self, prefix: str) -> int:
+        """Number of keys starting with the prefix"""
+        lo, hi = self._range(prefix.upper())
+        return hi - lo
+
+    def search(self, prefix: str, limit: int) -> List[str]:
+        """Return up to `limit` values starting with the prefix, shortest first"""
+        prefix_upper = prefix.upper()
+        if not prefix_upper:
+            return []
+        if len(prefix_upper) <= self.SHORT_PREFIX_LENGTH and limit <= self.SHORT_PREFIX_HITS:
+            return self.names.take(self._short_prefix_ids.get(prefix_upper, ())[:limit])
+
+        lo, hi = self._range(prefix_upper)
+        values = self.names.take(self.order[lo:hi])
+        if hi - lo <= limit:
+            return sorted(values, key=len)
+        return heapq.nsmallest(limit, values, key=len)
+
+def _shortest_key(name: str) -> Tuple[int, str]:
+    return len(name), name
+
+def _shortest_first(names: List[str]) -> List[str]:
+    return sorted(names, key=_shortest_key)
+
+def _upper_pool(names: List[str], pool: StringPool) -> StringPool:
+    """Pool of upper-cased names; the names pool itself when they are all upper case already"""
+    upper = [name.upper() for name in names]
+    return pool if upper == names else StringPool.from_strings(upper)
+
+class SuggestionCorpus:
+    """A suggestion corpus with its derived indexes, replaced as a whole on refresh.
+
+    `names`, `upper` and `cleaned` are parallel string pools indexed by trigram ids (`upper` is
+    `names` when every name is upper case). Names are stored shortest-first, so low ids (and
+    truncated shortlists) favour short names.
+    """
+
+    def __init__(self, names: StringPool, upper: StringPool, cleaned: Optional[StringPool],
+                 watermark: Optional[Any], trigram_index: TrigramIndex,
+                 prefix_index: Optional[PrefixIndex] = None,
+                 cleaner: Optional[Callable[[str], str]] = None):
+        self.names = names
+        self.upper = upper
+        self.cleaned = cleaned
+        self.watermark = watermark
+        self.trigram_index = trigram_index
+        self.prefix_index = prefix_index
+        self.cleaner = cleaner
+
+    @classmethod
+    def build(cls, names: List[str], watermark: Optional[Any] = None, with_prefix_index: bool = False,
+              cleaner: Optional[Callable[[str], str]] = None) -> 'SuggestionCorpus':
+        """Build a corpus, its precomputed name variants and all of its indexes from scratch"""
+        names = _shortest_first(names)
+        pool = StringPool.from_strings(names)
+        upper = _upper_pool(names, pool)
+        return cls(
+            pool,
+            upper,
+            StringPool.from_strings([cleaner(name) for name in names]) if cleaner else None,
+            watermark,
+            TrigramIndex(pool),
+            PrefixIndex(pool, upper) if with_prefix_index else None,
+            cleaner,
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the name pools (the trigram postings come on top)"""
+        pools = {id(pool): pool for pool in (self.names, self.upper, self.cleaned) if pool is not None}
+        return sum(pool.nbytes for pool in pools.values())
+
+    def merged(self, new_names: List[str], watermark: Any) -> 'SuggestionCorpus':
+        """New corpus with unseen names merged into the shortest-first order (the same corpus a full
+        build over all names gives); the live corpus is left untouched"""
+        existing = set(self.names)
+        additions = _shortest_first([name for name in dict.fromkeys(new_names) if name not in existing])
+        if not additions:
+            return SuggestionCorpus(self.names, self.upper, self.cleaned, watermark,
+                                    self.trigram_index, self.prefix_index, self.cleaner)
+        old_names = self.names.to_list()
+        # Where each addition lands among the existing names (both lists are sorted by _shortest_key);
+        # an existing name moves up by one for every addition landing at or before it
+        positions = np.array([bisect_left(old_names, _shortest_key(name), key=_shortest_key) for name in additions])
+        added_ids = (positions + np.arange(len(additions))).tolist()
+        old_ids = np.arange(len(old_names))
+        new_ids = (old_ids + np.searchsorted(positions, old_ids, side="right")).astype(np.uint32)
+
+        def interleave(old: List[str], added: List[str]) -> List[str]:
+            merged_list: List[str] = [""] * (len(old) + len(added))
+            for new_id, value in zip(new_ids.tolist(), old):
+                merged_list[new_id] = value
+            for new_id, value in zip(added_ids, added):
+                merged_list[new_id] = value
+            return merged_list
+
+        names_list = interleave(old_names, additions)
+        names = StringPool.from_strings(names_list)
+        if self.upper is self.names and all(name == name.upper() for name in additions):
+            upper = names
+        else:
+            upper = StringPool.from_strings(interleave(self.upper.to_list(), [name.upper() for name in additions]))
+        cleaned = None
+        if self.cleaned is not None:
+            cleaned = StringPool.from_strings(interleave(self.cleaned.to_list(), [self.cleaner(name) for name in additions]))
+        return SuggestionCorpus(
+            names,
+            upper,
+            cleaned,
+            watermark,
+            self.trigram_index.remapped(names, new_ids, added_ids),
+            PrefixIndex(names, upper) if self.prefix_index is not None else None,
+            self.cleaner,
+        )
@@ -1,125 +1,100 @@
 # services.py - Complete file with new functions
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from typing import List, Dict, Any, Optional
-from sqlalchemy import create_engine, text
-from fuzzywuzzy import fuzz, process
+from typing import List, Dict, Any, NamedTuple, Optional, Sequence
+from sqlalchemy import text
 from models import SearchFilters
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Database connection
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-def get_engine():
-    if not DATABASE_URL:
-        raise Exception("DATABASE_URL not found in environment variables")
-    return create_engine(DATABASE_URL)
+from search_index import PrefixIndex, SuggestionCorpus, TrigramIndex, rank_matches
+from string_pool import StringPool
+from db import get_engine, get_async_engine, run_sync
+from corpora import get_corpus
+from name_cleaning import clean_product_name
+from fuzzy_scoring import extract_best, score_choices
+from result_cache import cached_result
+from coalescing import single_flight
+from refinement import SUGGESTION_SESSION_MAX_CANDIDATES, refinement_cache
+from metrics import observe_stage, stage
+from tracing import DEBUG, INFO, Preview, trace, trace_enabled
+from rollups import route_top_query
+from filter_compiler import CompiledFilters, compile_filters
+from bulk_match import load_temp_tables, load_temp_tables_async, membership, membership_predicates
+from pagination import KEYSET_ORDER_BY, clamp_page_size, encode_cursor, keyset_predicate
 
 # Fuzzy Search Functions
-def clean_product_name(name: str) -> str:
-    """Clean product name by removing codes and unnecessary characters"""
-    import re
-    # Remove leading numbers/codes (like 00000167343)
-    cleaned = re.sub(r'^\d{8,}', '', name)
-    # Remove repeated text patterns
-    words = cleaned.split()
-    # Remove duplicates while preserving order and filter out numeric codes
-    seen = set()
-    unique_words = []
-    for word in words:
-        word_lower = word.lower()
-        # Skip if already seen or if it's a pure number
-        if word_lower not in seen and not re.match(r'^\d+$', word):
-            seen.add(word_lower)
-            unique_words.append(word)
-    return ' '.join(unique_words).strip()
-
-def clean_entity_name(name: str) -> str:
-    """Clean entity name by standardizing common company suffixes and formats"""
-    import re
-    # Remove extra whitespace and normalize
-    cleaned = re.sub(r'\s+', ' ', name.strip())
-    
-    # Handle truncated names (common in entity data)
-    # If name ends abruptly without common suffix, it might be truncated
-    common_suffixes = ['LIMITED', 'LTD', 'PRIVATE', 'PVT', 'LLP', 'CORPORATION', 'CORP', 'INC', 'COMPANY', 'CO']
-    
-    # Check if name appears to be truncated (doesn't end with common business suffix)
-    ends_with_suffix = any(cleaned.upper().endswith(suffix) for suffix in common_suffixes)
-    
-    # If it doesn't end with a suffix and ends with incomplete words, it might be truncated
-    if not ends_with_suffix and len(cleaned) > 10:
-        words = cleaned.split()
-        last_word = words[-1] if words else ""
-        
-        # Special handling for common truncated patterns
-        if last_word.upper() in ['LIMI', 'PRIV', 'LIMIT', 'PRIVAT']:
-            # Remove the truncated word
-            cleaned = ' '.join(words[:-1])
-        elif len(last_word) < 4 and last_word.upper() not in ['LTD', 'LLC', 'INC', 'PVT', 'LLP', 'PTE']:
-            # Remove very short last words that might be truncated
-            cleaned = ' '.join(words[:-1])
-    
-    return cleaned.strip()
+def fuzzy_match(query: str, choices: Sequence[str], limit: int = 50, search_type: str = "general",
+                prefix_index: Optional[PrefixIndex] = None, choices_upper: Optional[Sequence[str]] = None,
+                choices_cleaned: Optional[Sequence[str]] = None) -> List[str]:
+    """Perform fuzzy matching and return top matches.
 
-def fuzzy_match(query: str, choices: List[str], limit: int = 50, search_type: str = "general") -> List[str]:
-    """Perform fuzzy matching and return top matches"""
+    `choices_upper` / `choices_cleaned` are optional sequences parallel to `choices` holding
+    precomputed upper-case and cleaned forms (computed here when omitted). `choices` may be a
+    whole corpus StringPool; with an upper-case pool its substring tiers scan the buffer directly.
+    """
     if not query or not choices:
         return []
     
-    # For product_name searches, clean the choices first
+    # For product_name searches, match against the cleaned names
     if search_type == "product_name":
+        if choices_upper is None:
+            choices_upper = [choice.upper() for choice in choices]
+        if choices_cleaned is None:
+            with stage("clean", search_type):
+                choices_cleaned = [clean_product_name(choice) for choice in choices]
         # Pre-filter choices by simple string matching for speed
+        started = time.perf_counter()
         query_upper = query.upper()
         
-        # Multi-tier filtering for better relevance
+        # Multi-tier filtering for better relevance (positions into choices)
         exact_matches = []
         starts_with_matches = []
         contains_matches = []
         
-        for choice in choices:
-            choice_upper = choice.upper()
+        # Over a pool only the names containing the query are decoded
+        if isinstance(choices_upper, StringPool):
+            scanned = choices_upper.items_containing(query_upper)
+        else:
+            scanned = enumerate(choices_upper)
+        for i, choice_upper in scanned:
             if choice_upper == query_upper:
-                exact_matches.append(choice)
+                exact_matches.append(i)
             elif choice_upper.startswith(query_upper):
-                starts_with_matches.append(choice)
+                starts_with_matches.append(i)
             elif query_upper in choice_upper:
-                contains_matches.append(choice)
+                contains_matches.append(i)
         
         # Prioritize matches: exact > starts_with > contains > fuzzy
         priority_candidates = exact_matches + starts_with_matches + contains_matches
         
         # If we have enough high-priority matches, use those; otherwise include more for fuzzy matching
         if len(priority_candidates) >= limit * 2:
-            choices_to_process = priority_candidates[:limit * 3]
+            candidates_to_process = priority_candidates[:limit * 3]
         else:
             # Add some non-matching choices for fuzzy matching, but limit total
-            remaining_choices = [c for c in choices if c not in priority_candidates][:2000]
-            choices_to_process = priority_candidates + remaining_choices
-        
-        # Create a mapping of cleaned names to original names
-        cleaned_to_original = {}
-        cleaned_choices = []
+            prioritized = set(priority_candidates)
+            remaining = [i for i in range(len(choices)) if i not in prioritized][:2000]
+            candidates_to_process = priority_candidates + remaining
         
-        for choice in choices_to_process:
-            cleaned = clean_product_name(choice)
-            if len(cleaned) > 2:  # Only include meaningful cleaned names
-                cleaned_choices.append(cleaned)
-                cleaned_to_original[cleaned] = choice
+        # Only include meaningful cleaned names, keyed by position so results map back to originals
+        cleaned_choices = {i: choices_cleaned[i] for i in candidates_to_process if len(choices_cleaned[i]) > 2}
+        observe_stage("prefilter", time.perf_counter() - started, search_type, items=len(choices))
         
-        # Perform fuzzy matching on cleaned names with optimized settings
-        matches = process.extractBests(
+        # Perform fuzzy matching (partial_ratio) on cleaned names in one batched call
+        started = time.perf_counter()
+        matches = extract_best(
             query, 
             cleaned_choices, 
-            scorer=fuzz.partial_ratio,  # Faster than token_sort_ratio
             score_cutoff=70,  # Higher cutoff for better quality
             limit=limit * 2  # Get more matches to account for deduplication
         )
+        observe_stage("score", time.perf_counter() - started, search_type, items=len(cleaned_choices))
         
         # Return original names
-        return [cleaned_to_original[match[0]] for match in matches]
+        return [choices[match[2]] for match in matches]
     
     elif search_type == "entity":
         # For entity searches, prioritize exact prefix matches
@@ -127,19 +102,18 @@ def fuzzy_match(query: str, choices: List[str], limit: int = 50, search_type: st
         all_results = []
         seen = set()
         
-        print(f"Debug fuzzy_match: Query='{query}', Query_upper='{query_upper}', Choices count={len(choices)}")
-        
-        # First: Find exact prefix matches (entities starting with the query)
-        prefix_matches = []
+        trace(DEBUG, "fuzzy_match entity: query=%r, %d choices", query, len(choices))
         
-        for choice in choices:
-            if choice.upper().startswith(query_upper):
-                prefix_matches.append(choice)
-        
-        print(f"Debug fuzzy_match: Found {len(prefix_matches)} prefix matches: {prefix_matches[:5]}")
+        # First: Find exact prefix matches (entities starting with the query),
+        # shorter names first as they're more likely to be exact matches
+        started = time.perf_counter()
+        if prefix_index is not None:
+            prefix_matches = prefix_index.search(query_upper, limit)
+        else:
+            prefix_matches = [choice for choice in choices if choice.upper().startswith(query_upper)]
+            prefix_matches.sort(key=len)
         
-        # Sort prefix matches by length (shorter names first, as they're more likely to be exact matches)
-        prefix_matches.sort(key=len)
+        trace(DEBUG, "fuzzy_match entity: %d prefix matches %s", len(prefix_matches), Preview(prefix_matches))
         
         # Add prefix matches first
         for match in prefix_matches:
@@ -149,12 +123,16 @@ def fuzzy_match(query: str, choices: List[str], limit: int = 50, search_type: st
         
         # Second: Find entities that contain the query anywhere
         if len(all_results) < limit:
-            contains_matches = []
-            for choice in choices:
-                if query_upper in choice.upper() and choice not in seen:
-                    contains_matches.append(choice)
+            if isinstance(choices_upper, StringPool):
+                contains_matches = [choice for choice in choices.take(choices_upper.find_ids(query_upper))
+                                    if choice not in seen]
+            else:
+                contains_matches = []
+                for choice in choices:
+                    if query_upper in choice.upper() and choice not in seen:
+                        contains_matches.append(choice)
             
-            print(f"Debug fuzzy_match: Found {len(contains_matches)} contains matches: {contains_matches[:5]}")
+            trace(DEBUG, "fuzzy_match entity: %d contains matches %s", len(contains_matches), Preview(contains_matches))
             
             # Sort by how early the query appears in the string
             contains_matches.sort(key=lambda x: x.upper().find(query_upper))
@@ -165,17 +143,20 @@ def fuzzy_match(query: str, choices: List[str], limit: int = 50, search_type: st
                     all_results.append(match)
                     seen.add(match)
         
+        observe_stage("prefilter", time.perf_counter() - started, search_type, items=len(choices))
+        
         # Third: If still not enough results, use fuzzy matching
         if len(all_results) < limit:
-            fuzzy_matches = process.extractBests(
+            started = time.perf_counter()
+            fuzzy_matches = extract_best(
                 query, 
                 [choice for choice in choices if choice not in seen], 
-                scorer=fuzz.partial_ratio,
                 score_cutoff=75,
                 limit=limit - len(all_results)
             )
+            observe_stage("score", time.perf_counter() - started, search_type, items=len(choices) - len(seen))
             
-            print(f"Debug fuzzy_match: Found {len(fuzzy_matches)} fuzzy matches: {[m[0] for m in fuzzy_matches][:5]}")
+            trace(DEBUG, "fuzzy_match entity: %d fuzzy matches %s", len(fuzzy_matches), Preview(fuzzy_matches))
             
             # Add fuzzy matches
             for match in fuzzy_matches:
@@ -183,102 +164,104 @@ def fuzzy_match(query: str, choices: List[str], limit: int = 50, search_type: st
                     all_results.append(match[0])
                     seen.add(match[0])
         
-        print(f"Debug fuzzy_match: Final results count={len(all_results)}: {all_results}")
+        trace(DEBUG, "fuzzy_match entity: %d results %s", len(all_results), Preview(all_results, limit))
         return all_results[:limit]
     
     else:
         # For other search types, use the original logic
-        matches = process.extractBests(
-            query, 
-            choices, 
-            scorer=fuzz.partial_ratio,
-            score_cutoff=60,
-            limit=limit
-        )
+        with stage("score", search_type):
+            matches = extract_best(
+                query, 
+                choices if isinstance(choices, list) else list(choices), 
+                score_cutoff=60,
+                limit=limit
+            )
         
         return [match[0] for match in matches]
 
-# Cache for database lookups
-_product_names_cache = None
-_unique_product_names_cache = None
-_entities_cache = None
+# Upper bound on candidates handed from the trigram index to fuzzy_match
+SUGGESTION_SHORTLIST_SIZE = 2000
+
+def shortlist_choices(query: str, choices: StringPool, index: Optional[TrigramIndex],
+                      upper: Optional[StringPool] = None, by_position: bool = False) -> Sequence[str]:
+    """Narrow a corpus to trigram candidates for the query, or return it unchanged for short queries"""
+    if index is None:
+        return choices
+    with stage("shortlist"):
+        candidates = index.candidates(query, limit=SUGGESTION_SHORTLIST_SIZE, upper=upper, by_position=by_position)
+    return choices if candidates is None else candidates
+
+def shortlist_ids(query: str, index: TrigramIndex, upper: Optional[StringPool] = None) -> Optional[List[int]]:
+    """Trigram candidate ids for the query, or None when the whole corpus should be considered"""
+    with stage("shortlist"):
+        return index.candidate_ids(query, limit=SUGGESTION_SHORTLIST_SIZE, upper=upper)
 
 def get_product_names():
-    """Get all distinct product names with limited count for faster performance"""
-    global _product_names_cache
-    if _product_names_cache is None:
-        try:
-            engine = get_engine()
-            # Limit to 10,000 most common products for faster performance
-            df = pd.read_sql(
-                """SELECT DISTINCT product_name 
-                   FROM analytics.product_icegate_imports 
-                   WHERE product_name IS NOT NULL 
-                   LIMIT 10000""",
-                engine
-            )
-            # Remove duplicates and clean empty entries
-            unique_products = list(set(df["product_name"].tolist()))
-            _product_names_cache = [p for p in unique_products if p.strip()]
-            print(f"Loaded {len(_product_names_cache)} unique product names into cache")
-        except Exception as e:
-            print(f"Error loading product names: {e}")
-            _product_names_cache = ["Sample Product 1", "Sample Product 2"]
-    return _product_names_cache
+    """Get all distinct product names"""
+    return get_corpus("product_name").names
 
 def get_unique_product_names():
     """Get all distinct unique product names"""
-    global _unique_product_names_cache
-    if _unique_product_names_cache is None:
-        try:
-            engine = get_engine()
-            df = pd.read_sql(
-                "SELECT DISTINCT unique_product_name FROM analytics.product_icegate_imports WHERE unique_product_name IS NOT NULL",
-                engine
-            )
-            _unique_product_names_cache = df["unique_product_name"].tolist()
-            print(f"Loaded {len(_unique_product_names_cache)} unique product names into cache")
-        except Exception as e:
-            print(f"Error loading unique product names: {e}")
-            _unique_product_names_cache = ["Sample Unique Product 1", "Sample Unique Product 2"]
-    return _unique_product_names_cache
+    return get_corpus("unique_product_name").names
 
 def get_entities():
     """Get all distinct entity names"""
-    global _entities_cache
-    if _entities_cache is None:
-        try:
-            engine = get_engine()
-            # Get ALL importers (no limit)
-            importer_df = pd.read_sql(
-                "SELECT DISTINCT true_importer_name FROM analytics.product_icegate_imports WHERE true_importer_name IS NOT NULL",
-                engine
-            )
-            
-            # Get ALL suppliers (no limit)
-            supplier_df = pd.read_sql(
-                "SELECT DISTINCT true_supplier_name FROM analytics.product_icegate_imports WHERE true_supplier_name IS NOT NULL",
-                engine
-            )
-            
-            # Combine
-            all_entities = set(
-                importer_df["true_importer_name"].tolist() + 
-                supplier_df["true_supplier_name"].tolist()
-            )
-            _entities_cache = list(all_entities)
-            print(f"Loaded {len(_entities_cache)} entities into cache")
-        except Exception as e:
-            print(f"Error loading entities: {e}")
-            _entities_cache = ["Sample Entity 1", "Sample Entity 2"]
-    return _entities_cache
-
-def get_fuzzy_suggestions(query: str, search_type: str, limit: int = 10) -> List[str]:
+    return get_corpus("entity").names
+
+def session_shortlist_ids(session_id: str, search_type: str, query: str, corpus: SuggestionCorpus,
+                          needed: int) -> Optional[List[int]]:
+    """Ids of names containing the query, narrowed from the session's previous query when it extends it.
+
+    Only substring matches are kept, so they replace the trigram shortlist only when there are at
+    least `needed` of them (enough that fuzzy_match never reaches its fuzzy tier); otherwise None.
+    """
+    query_upper = query.upper()
+    with stage("refine", search_type):
+        ids = refinement_cache.narrow(session_id, search_type, corpus, query_upper)
+        if ids is None:
+            superset = corpus.trigram_index.superset_ids(query)
+            if superset is None or len(superset) > SUGGESTION_SESSION_MAX_CANDIDATES:
+                # Too short or too common to be worth narrowing from; the next keystroke seeds again
+                refinement_cache.forget(session_id, search_type)
+                return None
+            ids = corpus.upper.filter_ids(sorted(superset), query_upper)
+        refinement_cache.remember(session_id, search_type, corpus, query_upper, ids)
+    if len(ids) < needed:
+        return None
+    if len(ids) > SUGGESTION_SHORTLIST_SIZE:
+        # Truncate the way the trigram shortlist does, so prefix matches survive a large candidate set
+        return rank_matches(corpus.upper, ids, query_upper, SUGGESTION_SHORTLIST_SIZE,
+                            by_position=search_type == "entity")
+    return ids.tolist()
+
+def get_fuzzy_suggestions(query: str, search_type: str, limit: int = 10, session_id: Optional[str] = None) -> List[str]:
     """Get fuzzy suggestions based on search type"""
+    if session_id:
+        # Session state advances with every keystroke, so these calls are not coalesced
+        return _compute_fuzzy_suggestions(query, search_type, limit, session_id)
+    # Analysts typing the same prefix at the same moment share one computation
+    return single_flight.run(("suggestions", search_type, query, limit),
+                             lambda: _compute_fuzzy_suggestions(query, search_type, limit), "suggestions")
+
+def _compute_fuzzy_suggestions(query: str, search_type: str, limit: int, session_id: Optional[str] = None) -> List[str]:
     try:
         if search_type == "product_name":
-            choices = get_product_names()
-            results = fuzzy_match(query, choices, limit * 2, search_type)  # Get more for deduplication
+            corpus = get_corpus(search_type)
+            # fuzzy_match below gets limit * 2 and skips its fuzzy tier once it has twice that many substring matches
+            ids = session_shortlist_ids(session_id, search_type, query, corpus, limit * 4) if session_id else None
+            # Upper-case and cleaned names were computed when the corpus loaded; pick the shortlist's rows
+            if ids is None:
+                ids = shortlist_ids(query, corpus.trigram_index, corpus.upper)
+            if ids is None:
+                names, upper, cleaned = corpus.names, corpus.upper, corpus.cleaned
+            else:
+                names = corpus.names.take(ids)
+                upper = corpus.upper.take(ids)
+                cleaned = corpus.cleaned.take(ids) if corpus.cleaned is not None else None
+            # Get more for deduplication
+            results = fuzzy_match(query, names, limit * 2, search_type,
+                                  choices_upper=upper, choices_cleaned=cleaned)
+            trace(INFO, "suggestions %s %r: %d shortlisted, %d results", search_type, query, len(names), len(results))
             
             # Remove duplicates while preserving order
             unique_results = []
@@ -293,21 +276,31 @@ def get_fuzzy_suggestions(query: str, search_type: str, limit: int = 10) -> List
             return unique_results[:limit]
             
         elif search_type == "unique_product_name":
-            choices = get_unique_product_names()
-            return fuzzy_match(query, choices, limit, search_type)
+            corpus = get_corpus(search_type)
+            choices = shortlist_choices(query, corpus.names, corpus.trigram_index, corpus.upper)
+            results = fuzzy_match(query, choices, limit, search_type)
+            trace(INFO, "suggestions %s %r: %d shortlisted, %d results", search_type, query, len(choices), len(results))
+            return results
             
         elif search_type == "entity":
-            choices = get_entities()
-            print(f"Debug: Found {len(choices)} entities in cache")
-            print(f"Debug: First 5 entities: {choices[:5] if choices else 'None'}")
+            corpus = get_corpus(search_type)
+            choices = corpus.names
+            if trace_enabled(DEBUG):
+                # Full-corpus diagnostic scan, only paid for while tracing
+                query_upper = query.upper()
+                containing = choices.take(corpus.upper.find_ids(query_upper))
+                trace(DEBUG, "entity suggestions: %d names cached, %d contain %r %s",
+                      len(choices), len(containing), query, Preview(containing, 10))
             
-            # Check if there are any entities containing KLJ
-            klj_entities = [entity for entity in choices if 'KLJ' in entity.upper()]
-            print(f"Debug: Found {len(klj_entities)} entities containing 'KLJ': {klj_entities[:10]}")
-            
-            # Use improved entity matching
-            results = fuzzy_match(query, choices, limit * 2, search_type)
-            print(f"Debug: Fuzzy match returned {len(results)} results: {results}")
+            # Use improved entity matching over the trigram shortlist (or the session's narrowed one)
+            ids = session_shortlist_ids(session_id, search_type, query, corpus, limit * 2) if session_id else None
+            if ids is not None:
+                shortlist = choices.take(ids)
+            else:
+                shortlist = shortlist_choices(query, choices, corpus.trigram_index, corpus.upper, by_position=True)
+            results = fuzzy_match(query, shortlist, limit * 2, search_type, prefix_index=corpus.prefix_index,
+                                  choices_upper=corpus.upper if shortlist is choices else None)
+            trace(INFO, "suggestions %s %r: %d shortlisted, %d results", search_type, query, len(shortlist), len(results))
             return results[:limit]
             
         else:
@@ -319,524 +312,574 @@ def get_fuzzy_suggestions(query: str, search_type: str, limit: int = 10) -> List
         traceback.print_exc()
         return []
 
-def build_query_with_filters_dict(base_query: str, params: Dict, filters: Optional[SearchFilters]) -> tuple:
-    """Build query with filters using dictionary parameters"""
-    query = base_query
-    
-    if not filters:
-        return query, params
-    
-    param_counter = len(params)
-    
-    # Additional filters
-    if filters.hs_code:
-        query += f" AND hs_code = :filter_param_{param_counter}"
-        params[f"filter_param_{param_counter}"] = int(filters.hs_code)
-        param_counter += 1
-    
-    if filters.importer_id:
-        query += f" AND importer_id LIKE :filter_param_{param_counter}"
-        params[f"filter_param_{param_counter}"] = f"%{filters.importer_id}%"
-        param_counter += 1
-    
-    if filters.port_name:
-        query += f" AND (indian_port LIKE :filter_param_{param_counter} OR foreign_port LIKE :filter_param_{param_counter + 1})"
-        params[f"filter_param_{param_counter}"] = f"%{filters.port_name}%"
-        params[f"filter_param_{param_counter + 1}"] = f"%{filters.port_name}%"
-        param_counter += 2
-    
-    # Date filters
-    if filters.date_mode == "single" and filters.single_date:
-        query += f" AND reg_date = :filter_param_{param_counter}"
-        params[f"filter_param_{param_counter}"] = filters.single_date
-        param_counter += 1
-    elif filters.date_mode == "range":
-        if filters.start_date:
-            query += f" AND reg_date >= :filter_param_{param_counter}"
-            params[f"filter_param_{param_counter}"] = filters.start_date
-            param_counter += 1
-        if filters.end_date:
-            query += f" AND reg_date <= :filter_param_{param_counter}"
-            params[f"filter_param_{param_counter}"] = filters.end_date
-            param_counter += 1
-    
-    query += " ORDER BY reg_date DESC LIMIT 1000"
+# Threads resolving the distinct queries of batch suggestion requests, shared by all of them
+SUGGESTION_BATCH_WORKERS = int(os.getenv("SUGGESTION_BATCH_WORKERS", "4"))
+# Queries accepted in one batch request
+SUGGESTION_BATCH_MAX_QUERIES = int(os.getenv("SUGGESTION_BATCH_MAX_QUERIES", "500"))
+
+_batch_executor: Optional[ThreadPoolExecutor] = None
+_batch_executor_lock = threading.Lock()
+
+def _get_batch_executor() -> ThreadPoolExecutor:
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(max_workers=SUGGESTION_BATCH_WORKERS,
+                                                     thread_name_prefix="suggestion-batch")
+    return _batch_executor
+
+def shutdown_batch_executor():
+    """Stop the batch suggestion thread pool"""
+    global _batch_executor
+    if _batch_executor is not None:
+        _batch_executor.shutdown(wait=False)
+        _batch_executor = None
+
+def _scored_suggestions(query: str, search_type: str, limit: int) -> List[Dict[str, Any]]:
+    suggestions = get_fuzzy_suggestions(query, search_type, limit)
+    # Score against what the matcher compared: product names are matched on their cleaned form
+    compared = [clean_product_name(name) for name in suggestions] if search_type == "product_name" else suggestions
+    return [{"name": name, "score": score} for name, score in zip(suggestions, score_choices(query, compared))]
+
+def get_batch_suggestions(queries: List[str], search_type: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """Top suggestions with partial_ratio scores for each query (in request order), resolving the
+    distinct queries concurrently over the shared corpus indexes"""
+    started = time.perf_counter()
+    distinct = list(dict.fromkeys(query.strip() for query in queries if query and query.strip()))
+    executor = _get_batch_executor()
+    # Each task carries the request's context (metric labels, trace sampling) into its thread
+    futures = {
+        query: executor.submit(contextvars.copy_context().run, _scored_suggestions, query, search_type, limit)
+        for query in distinct
+    }
+    resolved = {query: future.result() for query, future in futures.items()}
+    trace(INFO, "batch suggestions %s: %d queries (%d distinct) in %.1f ms", search_type, len(queries),
+          len(distinct), (time.perf_counter() - started) * 1000)
+    return [{"query": query, "suggestions": resolved.get(query.strip(), []) if query else []} for query in queries]
+
+def add_filter_predicates(query: str, params: Dict, filters: Optional[SearchFilters],
+                          compiled: Optional[CompiledFilters] = None) -> str:
+    """Append the SearchFilters predicates (compiled here unless already compiled) to a query's WHERE clause"""
+    if compiled is None:
+        compiled = compile_filters(filters)
+    sql, filter_params = compiled.predicate()
+    params.update(filter_params)
+    return query + sql
+
+def build_query_with_filters_dict(base_query: str, params: Dict, filters: Optional[SearchFilters],
+                                  page_size: Optional[int] = None, cursor: Optional[str] = None,
+                                  compiled: Optional[CompiledFilters] = None) -> tuple:
+    """Build a paginated row query: filters, keyset position, stable ordering and page limit"""
+    query = add_filter_predicates(base_query, params, filters, compiled)
+    query += keyset_predicate(cursor, params)
+    # Fetch one extra row to learn whether another page exists
+    params["page_limit"] = clamp_page_size(page_size) + 1
+    query += f" {KEYSET_ORDER_BY} LIMIT :page_limit"
+    return query, params
+
+# Columns returned by every row search
+SEARCH_COLUMNS = """
+    system_id, reg_date, month_year, hs_code, chapter, unique_product_name, 
+    quantity, unit_quantity, unit_price_usd, total_value_usd, importer_id, 
+    true_importer_name, city, cha_number, type, true_supplier_name, 
+    indian_port, foreign_port, exchange_rate_usd, duty, 
+    product_name, supplier_name, supplier_address, target_date, id, importer
+"""
+
+# Key used for placeholder rows when a search fails
+_SEARCH_ERROR_KEYS = {
+    "product_name": "product_name",
+    "unique_product_name": "unique_product_name",
+    "entity": "entity_name",
+}
+
+def name_match(name_column: str, names: List[str]) -> tuple:
+    """Predicate matching product_name or unique_product_name against a list (IN, array or temp table by size)"""
+    return membership([name_column], names)
+
+# Entity columns a search can match on; 'either' matches whichever of the two holds the name
+ENTITY_ROLES = ("importer", "supplier", "either")
+
+class EntityMatch(NamedTuple):
+    """Role-aware entity match: one predicate per UNION ALL branch, the SQL labelling a row's
+    matched_role ('importer', 'supplier' or 'both') and the params they share"""
+    branches: List[str]
+    role_sql: str
+    params: Dict[str, Any]
+
+def entity_match(entities: List[str], role: str = "either") -> EntityMatch:
+    """Match importer and/or supplier name against a list.
+
+    'either' is not one OR predicate (which can use neither column's index for ordering) but two
+    branches, each served by its own (name, reg_date, id) index; rows matching both columns belong
+    to the importer branch only, so the merged page has no duplicate ids.
+    """
+    if role not in ENTITY_ROLES:
+        raise ValueError(f"Unknown entity role '{role}', use one of {list(ENTITY_ROLES)}")
+    (importer, supplier), params = membership_predicates(["true_importer_name", "true_supplier_name"], entities)
+    role_sql = f"CASE WHEN {importer} AND {supplier} THEN 'both' WHEN {importer} THEN 'importer' ELSE 'supplier' END"
+    branches = {
+        "importer": [importer],
+        "supplier": [supplier],
+        "either": [importer, f"{supplier} AND NOT COALESCE({importer}, FALSE)"],
+    }[role]
+    return EntityMatch(branches, role_sql, params)
+
+def build_search_query(match_sql: str, match_params: Dict, filters: Optional[SearchFilters],
+                       page_size: Optional[int] = None, cursor: Optional[str] = None,
+                       compiled: Optional[CompiledFilters] = None) -> tuple:
+    """One page of full rows for a match predicate"""
+    base_query = f"""
+        SELECT {SEARCH_COLUMNS}
+        FROM analytics.product_icegate_imports 
+        WHERE {match_sql}
+    """
+    return build_query_with_filters_dict(base_query, dict(match_params), filters, page_size, cursor, compiled)
+
+def build_count_query(match_sql: str, match_params: Dict, filters: Optional[SearchFilters],
+                      compiled: Optional[CompiledFilters] = None) -> tuple:
+    """Total number of rows for a match predicate (ignores pagination)"""
+    params = dict(match_params)
+    query = add_filter_predicates(f"""
+        SELECT COUNT(*) AS total_records
+        FROM analytics.product_icegate_imports 
+        WHERE {match_sql}
+    """, params, filters, compiled)
     return query, params
 
-def search_by_product_names(product_names: List[str], filters: Optional[SearchFilters] = None) -> Dict[str, Any]:
-    """Search by product names - returns all columns"""
+def build_entity_search_query(match: EntityMatch, filters: Optional[SearchFilters],
+                              page_size: Optional[int] = None, cursor: Optional[str] = None,
+                              compiled: Optional[CompiledFilters] = None) -> tuple:
+    """One page of full rows plus matched_role; each branch stops at one page before the merge"""
+    if compiled is None:
+        compiled = compile_filters(filters)
+    params = dict(match.params)
+    branches = []
+    for predicate in match.branches:
+        branch = add_filter_predicates(f"""
+            SELECT {SEARCH_COLUMNS}
+            FROM analytics.product_icegate_imports
+            WHERE {predicate}
+        """, params, filters, compiled)
+        branches.append(branch + keyset_predicate(cursor, params) + f" {KEYSET_ORDER_BY} LIMIT :page_limit")
+    # Fetch one extra row to learn whether another page exists
+    params["page_limit"] = clamp_page_size(page_size) + 1
+    rows = " UNION ALL ".join(f"SELECT * FROM ({branch}) AS branch_{i}" for i, branch in enumerate(branches))
+    # Only the rows of the merged page are labelled
+    return f"""
+        SELECT matched.*, {match.role_sql} AS matched_role
+        FROM ({rows}) AS matched
+        {KEYSET_ORDER_BY} LIMIT :page_limit
+    """, params
+
+def build_entity_count_query(match: EntityMatch, filters: Optional[SearchFilters],
+                             compiled: Optional[CompiledFilters] = None) -> tuple:
+    """Total rows of a role-aware entity match: the branches are disjoint, so their counts add up"""
+    if compiled is None:
+        compiled = compile_filters(filters)
+    params = dict(match.params)
+    counts = [add_filter_predicates(f"""
+        SELECT COUNT(*)
+        FROM analytics.product_icegate_imports
+        WHERE {predicate}
+    """, params, filters, compiled) for predicate in match.branches]
+    return "SELECT " + " + ".join(f"({count})" for count in counts) + " AS total_records", params
+
+def build_match_search_query(match: Any, filters: Optional[SearchFilters], page_size: Optional[int] = None,
+                             cursor: Optional[str] = None, compiled: Optional[CompiledFilters] = None) -> tuple:
+    """Page query for a (predicate, params) match or an EntityMatch"""
+    if isinstance(match, EntityMatch):
+        return build_entity_search_query(match, filters, page_size, cursor, compiled)
+    return build_search_query(*match, filters, page_size, cursor, compiled)
+
+def build_match_count_query(match: Any, filters: Optional[SearchFilters],
+                            compiled: Optional[CompiledFilters] = None) -> tuple:
+    """Count query for a (predicate, params) match or an EntityMatch"""
+    if isinstance(match, EntityMatch):
+        return build_entity_count_query(match, filters, compiled)
+    return build_count_query(*match, filters, compiled)
+
+def build_top_importers_query(name_column: str, names: List[str], filters: Optional[SearchFilters], limit: int,
+                           match: Optional[tuple] = None, compiled: Optional[CompiledFilters] = None,
+                           use_rollups: bool = True) -> tuple:
+    """Top importers by total value for product_name or unique_product_name (from the rollups when
+    they answer it exactly, unless use_rollups is off)"""
+    if compiled is None:
+        compiled = compile_filters(filters)
+    routed = route_top_query("top_importers", name_column, names, compiled, limit) if use_rollups else None
+    if routed is not None:
+        return routed
+    match_sql, params = match if match is not None else name_match(name_column, names)
+    params = dict(params)
+    base_query = f"""
+        SELECT 
+            true_importer_name,
+            importer_id,
+            city,
+            COUNT(*) as total_shipments,
+            SUM(total_value_usd) as total_value_usd,
+            SUM(quantity) as total_quantity,
+            AVG(unit_price_usd) as avg_unit_price_usd,
+            MIN(reg_date) as first_import_date,
+            MAX(reg_date) as last_import_date,
+            COUNT(DISTINCT hs_code) as unique_hs_codes,
+            COUNT(DISTINCT origin_country) as unique_countries
+        FROM analytics.product_icegate_imports 
+        WHERE {match_sql}
+        AND true_importer_name IS NOT NULL
+        AND total_value_usd IS NOT NULL
+    """
+    base_query = add_filter_predicates(base_query, params, filters, compiled)
+    base_query += f"""
+        GROUP BY true_importer_name, importer_id, city
+        ORDER BY total_value_usd DESC
+        LIMIT {int(limit)}
+    """
+    return base_query, params
+
+def build_top_suppliers_query(name_column: str, names: List[str], filters: Optional[SearchFilters], limit: int,
+                           match: Optional[tuple] = None, compiled: Optional[CompiledFilters] = None,
+                           use_rollups: bool = True) -> tuple:
+    """Top suppliers by total value for product_name or unique_product_name (from the rollups when
+    they answer it exactly, unless use_rollups is off)"""
+    if compiled is None:
+        compiled = compile_filters(filters)
+    routed = route_top_query("top_suppliers", name_column, names, compiled, limit) if use_rollups else None
+    if routed is not None:
+        return routed
+    match_sql, params = match if match is not None else name_match(name_column, names)
+    params = dict(params)
+    base_query = f"""
+        SELECT 
+            true_supplier_name,
+            supplier_name,
+            COUNT(*) as total_shipments,
+            SUM(total_value_usd) as total_value_usd,
+            SUM(quantity) as total_quantity,
+            AVG(unit_price_usd) as avg_unit_price_usd,
+            MIN(reg_date) as first_export_date,
+            MAX(reg_date) as last_export_date,
+            COUNT(DISTINCT hs_code) as unique_hs_codes,
+            COUNT(DISTINCT true_importer_name) as unique_importers
+        FROM analytics.product_icegate_imports 
+        WHERE {match_sql}
+        AND true_supplier_name IS NOT NULL
+        AND total_value_usd IS NOT NULL
+    """
+    base_query = add_filter_predicates(base_query, params, filters, compiled)
+    base_query += f"""
+        GROUP BY true_supplier_name, supplier_name
+        ORDER BY total_value_usd DESC
+        LIMIT {int(limit)}
+    """
+    return base_query, params
+
+# Query execution - sync (pandas over the pooled engine) and async (asyncpg or thread pool)
+def _frame(rows: List[Any], columns: List[str]) -> pd.DataFrame:
+    # Same conversion pd.read_sql applies, so both paths return identical records
+    with stage("dataframe"):
+        return pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+def read_frame(query: str, params: Dict) -> pd.DataFrame:
+    """Execute a query on the shared engine and return a DataFrame"""
+    started = time.perf_counter()
+    with get_engine().connect() as conn:
+        connected = time.perf_counter()
+        params = load_temp_tables(conn, params)
+        result = conn.execute(text(query), params)
+        rows = result.fetchall()
+        columns = list(result.keys())
+    finished = time.perf_counter()
+    observe_stage("connect", connected - started)
+    observe_stage("execute", finished - connected, items=len(rows))
+    trace(DEBUG, "query: %d rows in %.1f ms (%.1f ms for a connection)",
+          len(rows), (finished - connected) * 1000, (connected - started) * 1000)
+    return _frame(rows, columns)
+
+async def read_frame_async(query: str, params: Dict) -> pd.DataFrame:
+    """Execute a query without blocking the event loop"""
+    engine = get_async_engine()
+    if engine is None:
+        return await run_sync(read_frame, query, params)
+    started = time.perf_counter()
+    async with engine.connect() as conn:
+        connected = time.perf_counter()
+        params = await load_temp_tables_async(conn, params)
+        result = await conn.execute(text(query), params)
+        rows = result.fetchall()
+        columns = list(result.keys())
+    finished = time.perf_counter()
+    observe_stage("connect", connected - started)
+    observe_stage("execute", finished - connected, items=len(rows))
+    trace(DEBUG, "query: %d rows in %.1f ms (%.1f ms for a connection)",
+          len(rows), (finished - connected) * 1000, (connected - started) * 1000)
+    return _frame(rows, columns)
+
+def _records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    with stage("to_dict"):
+        return df.to_dict('records')
+
+def _search_response(df: pd.DataFrame, search_type: str, page_size: Optional[int],
+                     total_records: Optional[int] = None) -> Dict[str, Any]:
+    page_size = clamp_page_size(page_size)
+    has_more = len(df) > page_size
+    if has_more:
+        df = df.iloc[:page_size]
+    next_cursor = None
+    if has_more:
+        last = df.iloc[-1]
+        next_cursor = encode_cursor(last["reg_date"], last["id"])
+    trace(INFO, "search %s: %d rows, has_more=%s, total=%s", search_type, len(df), has_more, total_records)
+    return {
+        "data": _records(df),
+        "count": len(df),
+        "search_type": search_type,
+        "total_records": total_records,
+        "page_size": page_size,
+        "has_more": has_more,
+        "next_cursor": next_cursor
+    }
+
+def _search_error(caller: str, e: Exception, names: List[str], search_type: str) -> Dict[str, Any]:
+    print(f"Error in {caller}: {e}")
+    name_key = _SEARCH_ERROR_KEYS[search_type]
+    return {
+        "data": [{name_key: name, "error": "Database error", "sample": True} for name in names],
+        "count": len(names),
+        "search_type": search_type,
+        "error": str(e)
+    }
+
+def _run_search(match: Any, filters: Optional[SearchFilters], page_size: Optional[int],
+                cursor: Optional[str], include_total: bool, search_type: str) -> Dict[str, Any]:
+    query, params = build_match_search_query(match, filters, page_size, cursor)
+    df = read_frame(query, params)
+    total_records = None
+    if include_total:
+        count_query, count_params = build_match_count_query(match, filters)
+        total_records = int(read_frame(count_query, count_params)["total_records"].iloc[0])
+    return _search_response(df, search_type, page_size, total_records)
+
+async def _run_search_async(match: Any, filters: Optional[SearchFilters], page_size: Optional[int],
+                            cursor: Optional[str], include_total: bool, search_type: str) -> Dict[str, Any]:
+    query, params = build_match_search_query(match, filters, page_size, cursor)
+    if not include_total:
+        return _search_response(await read_frame_async(query, params), search_type, page_size)
+    # Page and total are independent queries, so run them side by side
+    count_query, count_params = build_match_count_query(match, filters)
+    df, count_df = await asyncio.gather(read_frame_async(query, params), read_frame_async(count_query, count_params))
+    return _search_response(df, search_type, page_size, int(count_df["total_records"].iloc[0]))
+
+def _top_response(df: pd.DataFrame, search_type: str, names: List[str]) -> Dict[str, Any]:
+    return {
+        "data": _records(df),
+        "count": len(df),
+        "search_type": search_type,
+        "products_searched": names
+    }
+
+def _top_error(caller: str, e: Exception, search_type: str, names: List[str]) -> Dict[str, Any]:
+    print(f"Error in {caller}: {e}")
+    return {
+        "data": [],
+        "count": 0,
+        "search_type": search_type,
+        "error": str(e),
+        "products_searched": names
+    }
+
+@cached_result("search:product_name")
+def search_by_product_names(product_names: List[str], filters: Optional[SearchFilters] = None,
+                            page_size: Optional[int] = None, cursor: Optional[str] = None,
+                            include_total: bool = False) -> Dict[str, Any]:
+    """Search by product names - returns all columns, one keyset page at a time"""
     try:
-        engine = get_engine()
-        
-        # Select all columns
-        placeholders = ",".join([f":param_{i}" for i in range(len(product_names))])
-        base_query = f"""
-            SELECT system_id, reg_date, month_year, hs_code, chapter, unique_product_name, 
-                   quantity, unit_quantity, unit_price_usd, total_value_usd, importer_id, 
-                   true_importer_name, city, cha_number, type, true_supplier_name, 
-                   indian_port, foreign_port, exchange_rate_usd, duty, 
-                   product_name, supplier_name, supplier_address, target_date, id, importer
-            FROM analytics.product_icegate_imports 
-            WHERE product_name IN ({placeholders})
-        """
-        
-        # Create parameters dictionary
-        params = {f"param_{i}": name for i, name in enumerate(product_names)}
-        
-        # Add filters to query and params
-        query, params = build_query_with_filters_dict(base_query, params, filters)
-        
-        # Execute query using text() for proper parameter binding
-        df = pd.read_sql(text(query), engine, params=params)
-        
-        return {
-            "data": df.to_dict('records'),
-            "count": len(df),
-            "search_type": "product_name",
-            "total_records": len(df)
-        }
+        match = name_match("product_name", product_names)
+        return _run_search(match, filters, page_size, cursor, include_total, "product_name")
     except Exception as e:
-        print(f"Error in search_by_product_names: {e}")
-        return {
-            "data": [{"product_name": name, "error": "Database error", "sample": True} for name in product_names],
-            "count": len(product_names),
-            "search_type": "product_name",
-            "error": str(e)
-        }
-
-def search_by_unique_product_names(unique_product_names: List[str], filters: Optional[SearchFilters] = None) -> Dict[str, Any]:
-    """Search by unique product names - returns all columns"""
+        return _search_error("search_by_product_names", e, product_names, "product_name")
+
+@cached_result("search:product_name")
+async def search_by_product_names_async(product_names: List[str], filters: Optional[SearchFilters] = None,
+                                        page_size: Optional[int] = None, cursor: Optional[str] = None,
+                                        include_total: bool = False) -> Dict[str, Any]:
+    """Async variant of search_by_product_names"""
     try:
-        engine = get_engine()
-        
-        # Select all columns
-        placeholders = ",".join([f":param_{i}" for i in range(len(unique_product_names))])
-        base_query = f"""
-            SELECT system_id, reg_date, month_year, hs_code, chapter, unique_product_name, 
-                   quantity, unit_quantity, unit_price_usd, total_value_usd, importer_id, 
-                   true_importer_name, city, cha_number, type, true_supplier_name, 
-                   indian_port, foreign_port, exchange_rate_usd, duty, 
-                   product_name, supplier_name, supplier_address, target_date, id, importer
-            FROM analytics.product_icegate_imports 
-            WHERE unique_product_name IN ({placeholders})
-        """
-        
-        # Create parameters dictionary
-        params = {f"param_{i}": name for i, name in enumerate(unique_product_names)}
-        
-        # Add filters to query and params
-        query, params = build_query_with_filters_dict(base_query, params, filters)
-        
-        # Execute query using text() for proper parameter binding
-        df = pd.read_sql(text(query), engine, params=params)
-        
-        return {
-            "data": df.to_dict('records'),
-            "count": len(df),
-            "search_type": "unique_product_name",
-            "total_records": len(df)
-        }
+        match = name_match("product_name", product_names)
+        return await _run_search_async(match, filters, page_size, cursor, include_total, "product_name")
     except Exception as e:
-        print(f"Error in search_by_unique_product_names: {e}")
-        return {
-            "data": [{"unique_product_name": name, "error": "Database error", "sample": True} for name in unique_product_names],
-            "count": len(unique_product_names),
-            "search_type": "unique_product_name",
-            "error": str(e)
-        }
-
-def search_by_entities(entities: List[str], filters: Optional[SearchFilters] = None) -> Dict[str, Any]:
-    """Search by entity names - returns all columns"""
+        return _search_error("search_by_product_names_async", e, product_names, "product_name")
+
+@cached_result("search:unique_product_name")
+def search_by_unique_product_names(unique_product_names: List[str], filters: Optional[SearchFilters] = None,
+                                   page_size: Optional[int] = None, cursor: Optional[str] = None,
+                                   include_total: bool = False) -> Dict[str, Any]:
+    """Search by unique product names - returns all columns, one keyset page at a time"""
     try:
-        engine = get_engine()
-        
-        # Fixed: Use different parameter names for importer and supplier conditions
-        importer_placeholders = ",".join([f":imp_param_{i}" for i in range(len(entities))])
-        supplier_placeholders = ",".join([f":sup_param_{i}" for i in range(len(entities))])
-        
-        base_query = f"""
-            SELECT system_id, reg_date, month_year, hs_code, chapter, unique_product_name, 
-                   quantity, unit_quantity, unit_price_usd, total_value_usd, importer_id, 
-                   true_importer_name, city, cha_number, type, true_supplier_name, 
-                   indian_port, foreign_port, exchange_rate_usd, duty, 
-                   product_name, supplier_name, supplier_address, target_date, id, importer
-            FROM analytics.product_icegate_imports 
-            WHERE true_importer_name IN ({importer_placeholders}) 
-            OR true_supplier_name IN ({supplier_placeholders})
-        """
-        
-        # Create parameters dictionary with different names for importers and suppliers
-        params = {}
-        for i, entity in enumerate(entities):
-            params[f"imp_param_{i}"] = entity
-            params[f"sup_param_{i}"] = entity
-        
-        # Add filters to query and params
-        query, params = build_query_with_filters_dict(base_query, params, filters)
-        
-        # Execute query using text() for proper parameter binding
-        df = pd.read_sql(text(query), engine, params=params)
-        
-        return {
-            "data": df.to_dict('records'),
-            "count": len(df),
-            "search_type": "entity",
-            "total_records": len(df)
-        }
+        match = name_match("unique_product_name", unique_product_names)
+        return _run_search(match, filters, page_size, cursor, include_total, "unique_product_name")
+    except Exception as e:
+        return _search_error("search_by_unique_product_names", e, unique_product_names, "unique_product_name")
+
+@cached_result("search:unique_product_name")
+async def search_by_unique_product_names_async(unique_product_names: List[str], filters: Optional[SearchFilters] = None,
+                                               page_size: Optional[int] = None, cursor: Optional[str] = None,
+                                               include_total: bool = False) -> Dict[str, Any]:
+    """Async variant of search_by_unique_product_names"""
+    try:
+        match = name_match("unique_product_name", unique_product_names)
+        return await _run_search_async(match, filters, page_size, cursor, include_total, "unique_product_name")
     except Exception as e:
-        print(f"Error in search_by_entities: {e}")
-        return {
-            "data": [{"entity_name": name, "error": "Database error", "sample": True} for name in entities],
-            "count": len(entities),
-            "search_type": "entity",
-            "error": str(e)
-        }
+        return _search_error("search_by_unique_product_names_async", e, unique_product_names, "unique_product_name")
 
+@cached_result("search:entity")
+def search_by_entities(entities: List[str], filters: Optional[SearchFilters] = None,
+                       page_size: Optional[int] = None, cursor: Optional[str] = None,
+                       include_total: bool = False, role: str = "either") -> Dict[str, Any]:
+    """Search by entity names as importer, supplier or either - returns all columns plus matched_role"""
+    try:
+        return _run_search(entity_match(entities, role), filters, page_size, cursor, include_total, "entity")
+    except Exception as e:
+        return _search_error("search_by_entities", e, entities, "entity")
+
+@cached_result("search:entity")
+async def search_by_entities_async(entities: List[str], filters: Optional[SearchFilters] = None,
+                                   page_size: Optional[int] = None, cursor: Optional[str] = None,
+                                   include_total: bool = False, role: str = "either") -> Dict[str, Any]:
+    """Async variant of search_by_entities"""
+    try:
+        return await _run_search_async(entity_match(entities, role), filters, page_size, cursor,
+                                       include_total, "entity")
+    except Exception as e:
+        return _search_error("search_by_entities_async", e, entities, "entity")
+
+@cached_result("top_importers:product_name")
 def get_top_importers_by_product(product_names: List[str], filters: Optional[SearchFilters] = None, limit: int = 10) -> Dict[str, Any]:
     """Get top importers for specific products by total value"""
     try:
-        engine = get_engine()
-        
-        # Build the base query with aggregation
-        placeholders = ",".join([f":param_{i}" for i in range(len(product_names))])
-        base_query = f"""
-            SELECT 
-                true_importer_name,
-                importer_id,
-                city,
-                COUNT(*) as total_shipments,
-                SUM(total_value_usd) as total_value_usd,
-                SUM(quantity) as total_quantity,
-                AVG(unit_price_usd) as avg_unit_price_usd,
-                MIN(reg_date) as first_import_date,
-                MAX(reg_date) as last_import_date,
-                COUNT(DISTINCT hs_code) as unique_hs_codes,
-                COUNT(DISTINCT origin_country) as unique_countries
-            FROM analytics.product_icegate_imports 
-            WHERE product_name IN ({placeholders})
-            AND true_importer_name IS NOT NULL
-            AND total_value_usd IS NOT NULL
-        """
-        
-        # Create parameters dictionary
-        params = {f"param_{i}": name for i, name in enumerate(product_names)}
-        
-        # Add filters (simplified for aggregation query)
-        if filters:
-            param_counter = len(params)
-            
-            if filters.hs_code:
-                base_query += f" AND hs_code = :filter_param_{param_counter}"
-                params[f"filter_param_{param_counter}"] = int(filters.hs_code)
-                param_counter += 1
-            
-            if filters.importer_id:
-                base_query += f" AND importer_id LIKE :filter_param_{param_counter}"
-                params[f"filter_param_{param_counter}"] = f"%{filters.importer_id}%"
-                param_counter += 1
-            
-            if filters.port_name:
-                base_query += f" AND (indian_port LIKE :filter_param_{param_counter} OR foreign_port LIKE :filter_param_{param_counter + 1})"
-                params[f"filter_param_{param_counter}"] = f"%{filters.port_name}%"
-                params[f"filter_param_{param_counter + 1}"] = f"%{filters.port_name}%"
-                param_counter += 2
-                
-            if filters.date_mode == "single" and filters.single_date:
-                base_query += f" AND reg_date = :filter_param_{param_counter}"
-                params[f"filter_param_{param_counter}"] = filters.single_date
-                param_counter += 1
-            elif filters.date_mode == "range":
-                if filters.start_date:
-                    base_query += f" AND reg_date >= :filter_param_{param_counter}"
-                    params[f"filter_param_{param_counter}"] = filters.start_date
-                    param_counter += 1
-                if filters.end_date:
-                    base_query += f" AND reg_date <= :filter_param_{param_counter}"
-                    params[f"filter_param_{param_counter}"] = filters.end_date
-                    param_counter += 1
-        
-        # Group by and order by total value
-        base_query += f"""
-            GROUP BY true_importer_name, importer_id, city
-            ORDER BY total_value_usd DESC
-            LIMIT {limit}
-        """
-        
-        # Execute query
-        df = pd.read_sql(text(base_query), engine, params=params)
-        
-        return {
-            "data": df.to_dict('records'),
-            "count": len(df),
-            "search_type": "top_importers",
-            "products_searched": product_names
-        }
+        query, params = build_top_importers_query("product_name", product_names, filters, limit)
+        return _top_response(read_frame(query, params), "top_importers", product_names)
     except Exception as e:
-        print(f"Error in get_top_importers_by_product: {e}")
-        return {
-            "data": [],
-            "count": 0,
-            "search_type": "top_importers",
-            "error": str(e),
-            "products_searched": product_names
-        }
+        return _top_error("get_top_importers_by_product", e, "top_importers", product_names)
 
+@cached_result("top_importers:product_name")
+async def get_top_importers_by_product_async(product_names: List[str], filters: Optional[SearchFilters] = None, limit: int = 10) -> Dict[str, Any]:
+    """Async variant of get_top_importers_by_product"""
+    try:
+        query, params = build_top_importers_query("product_name", product_names, filters, limit)
+        return _top_response(await read_frame_async(query, params), "top_importers", product_names)
+    except Exception as e:
+        return _top_error("get_top_importers_by_product_async", e, "top_importers", product_names)
+
+@cached_result("top_importers:unique_product_name")
 def get_top_importers_by_unique_product(unique_product_names: List[str], filters: Optional[SearchFilters] = None, limit: int = 10) -> Dict[str, Any]:
     """Get top importers for specific unique products by total value"""
     try:
-        engine = get_engine()
-        
-        placeholders = ",".join([f":param_{i}" for i in range(len(unique_product_names))])
-        base_query = f"""
-            SELECT 
-                true_importer_name,
-                importer_id,
-                city,
-                COUNT(*) as total_shipments,
-                SUM(total_value_usd) as total_value_usd,
-                SUM(quantity) as total_quantity,
-                AVG(unit_price_usd) as avg_unit_price_usd,
-                MIN(reg_date) as first_import_date,
-                MAX(reg_date) as last_import_date,
-                COUNT(DISTINCT hs_code) as unique_hs_codes,
-                COUNT(DISTINCT origin_country) as unique_countries
-            FROM analytics.product_icegate_imports 
-            WHERE unique_product_name IN ({placeholders})
-            AND true_importer_name IS NOT NULL
-            AND total_value_usd IS NOT NULL
-        """
-        
-        params = {f"param_{i}": name for i, name in enumerate(unique_product_names)}
-        
-        # Add filters (similar to above)
-        if filters:
-            param_counter = len(params)
-            
-            if filters.hs_code:
-                base_query += f" AND hs_code = :filter_param_{param_counter}"
-                params[f"filter_param_{param_counter}"] = int(filters.hs_code)
-                param_counter += 1
-            
-            if filters.importer_id:
-                base_query += f" AND importer_id LIKE :filter_param_{param_counter}"
-                params[f"filter_param_{param_counter}"] = f"%{filters.importer_id}%"
-                param_counter += 1
-            
-            if filters.port_name:
-                base_query += f" AND (indian_port LIKE :filter_param_{param_counter} OR foreign_port LIKE :filter_param_{param_counter + 1})"
-                params[f"filter_param_{param_counter}"] = f"%{filters.port_name}%"
-                params[f"filter_param_{param_counter + 1}"] = f"%{filters.port_name}%"
-                param_counter += 2
-                
-            if filters.date_mode == "single" and filters.single_date:
-                base_query += f" AND reg_date = :filter_param_{param_counter}"
-                params[f"filter_param_{param_counter}"] = filters.single_date
-                param_counter += 1
-            elif filters.date_mode == "range":
-                if filters.start_date:
-                    base_query += f" AND reg_date >= :filter_param_{param_counter}"
-                    params[f"filter_param_{param_counter}"] = filters.start_date
-                    param_counter += 1
-                if filters.end_date:
-                    base_query += f" AND reg_date <= :filter_param_{param_counter}"
-                    params[f"filter_param_{param_counter}"] = filters.end_date
-                    param_counter += 1
-        
-        base_query += f"""
-            GROUP BY true_importer_name, importer_id, city
-            ORDER BY total_value_usd DESC
-            LIMIT {limit}
-        """
-        
-        df = pd.read_sql(text(base_query), engine, params=params)
-        
-        return {
-            "data": df.to_dict('records'),
-            "count": len(df),
-            "search_type": "top_importers",
-            "products_searched": unique_product_names
-        }
+        query, params = build_top_importers_query("unique_product_name", unique_product_names, filters, limit)
+        return _top_response(read_frame(query, params), "top_importers", unique_product_names)
+    except Exception as e:
+        return _top_error("get_top_importers_by_unique_product", e, "top_importers", unique_product_names)
+
+@cached_result("top_importers:unique_product_name")
+async def get_top_importers_by_unique_product_async(unique_product_names: List[str], filters: Optional[SearchFilters] = None, limit: int = 10) -> Dict[str, Any]:
+    """Async variant of get_top_importers_by_unique_product"""
+    try:
+        query, params = build_top_importers_query("unique_product_name", unique_product_names, filters, limit)
+        return _top_response(await read_frame_async(query, params), "top_importers", unique_product_names)
     except Exception as e:
-        print(f"Error in get_top_importers_by_unique_product: {e}")
-        return {
-            "data": [],
-            "count": 0,
-            "search_type": "top_importers",
-            "error": str(e),
-            "products_searched": unique_product_names
-        }
+        return _top_error("get_top_importers_by_unique_product_async", e, "top_importers", unique_product_names)
 
+@cached_result("top_suppliers:product_name")
 def get_top_suppliers_by_product(product_names: List[str], filters: Optional[SearchFilters] = None, limit: int = 10) -> Dict[str, Any]:
     """Get top suppliers for specific products by total value"""
     try:
-        engine = get_engine()
-        
-        # Build the base query with aggregation
-        placeholders = ",".join([f":param_{i}" for i in range(len(product_names))])
-        base_query = f"""
-            SELECT 
-                true_supplier_name,
-                supplier_name,
-                COUNT(*) as total_shipments,
-                SUM(total_value_usd) as total_value_usd,
-                SUM(quantity) as total_quantity,
-                AVG(unit_price_usd) as avg_unit_price_usd,
-                MIN(reg_date) as first_export_date,
-                MAX(reg_date) as last_export_date,
-                COUNT(DISTINCT hs_code) as unique_hs_codes,
-                COUNT(DISTINCT true_importer_name) as unique_importers
-            FROM analytics.product_icegate_imports 
-            WHERE product_name IN ({placeholders})
-            AND true_supplier_name IS NOT NULL
-            AND total_value_usd IS NOT NULL
-        """
-        
-        # Create parameters dictionary
-        params = {f"param_{i}": name for i, name in enumerate(product_names)}
-        
-        # Add filters (simplified for aggregation query)
-        if filters:
-            param_counter = len(params)
-            
-            if filters.hs_code:
-                base_query += f" AND hs_code = :filter_param_{param_counter}"
-                params[f"filter_param_{param_counter}"] = int(filters.hs_code)
-                param_counter += 1
-            
-            if filters.importer_id:
-                base_query += f" AND importer_id LIKE :filter_param_{param_counter}"
-                params[f"filter_param_{param_counter}"] = f"%{filters.importer_id}%"
-                param_counter += 1
-            
-            if filters.port_name:
-                base_query += f" AND (indian_port LIKE :filter_param_{param_counter} OR foreign_port LIKE :filter_param_{param_counter + 1})"
-                params[f"filter_param_{param_counter}"] = f"%{filters.port_name}%"
-                params[f"filter_param_{param_counter + 1}"] = f"%{filters.port_name}%"
-                param_counter += 2
-                
-            if filters.date_mode == "single" and filters.single_date:
-                base_query += f" AND reg_date = :filter_param_{param_counter}"
-                params[f"filter_param_{param_counter}"] = filters.single_date
-                param_counter += 1
-            elif filters.date_mode == "range":
-                if filters.start_date:
-                    base_query += f" AND reg_date >= :filter_param_{param_counter}"
-                    params[f"filter_param_{param_counter}"] = filters.start_date
-                    param_counter += 1
-                if filters.end_date:
-                    base_query += f" AND reg_date <= :filter_param_{param_counter}"
-                    params[f"filter_param_{param_counter}"] = filters.end_date
-                    param_counter += 1
-        
-        # Group by and order by total value
-        base_query += f"""
-            GROUP BY true_supplier_name, supplier_name
-            ORDER BY total_value_usd DESC
-            LIMIT {limit}
-        """
-        
-        # Execute query
-        df = pd.read_sql(text(base_query), engine, params=params)
-        
-        return {
-            "data": df.to_dict('records'),
-            "count": len(df),
-            "search_type": "top_suppliers",
-            "products_searched": product_names
-        }
+        query, params = build_top_suppliers_query("product_name", product_names, filters, limit)
+        return _top_response(read_frame(query, params), "top_suppliers", product_names)
     except Exception as e:
-        print(f"Error in get_top_suppliers_by_product: {e}")
-        return {
-            "data": [],
-            "count": 0,
-            "search_type": "top_suppliers",
-            "error": str(e),
-            "products_searched": product_names
-        }
+        return _top_error("get_top_suppliers_by_product", e, "top_suppliers", product_names)
 
+@cached_result("top_suppliers:product_name")
+async def get_top_suppliers_by_product_async(product_names: List[str], filters: Optional[SearchFilters] = None, limit: int = 10) -> Dict[str, Any]:
+    """Async variant of get_top_suppliers_by_product"""
+    try:
+        query, params = build_top_suppliers_query("product_name", product_names, filters, limit)
+        return _top_response(await read_frame_async(query, params), "top_suppliers", product_names)
+    except Exception as e:
+        return _top_error("get_top_suppliers_by_product_async", e, "top_suppliers", product_names)
+
+@cached_result("top_suppliers:unique_product_name")
 def get_top_suppliers_by_unique_product(unique_product_names: List[str], filters: Optional[SearchFilters] = None, limit: int = 10) -> Dict[str, Any]:
     """Get top suppliers for specific unique products by total value"""
     try:
-        engine = get_engine()
-        
-        # Build the base query with aggregation
-        placeholders = ",".join([f":param_{i}" for i in range(len(unique_product_names))])
-        base_query = f"""
-            SELECT 
-                true_supplier_name,
-                supplier_name,
-                COUNT(*) as total_shipments,
-                SUM(total_value_usd) as total_value_usd,
-                SUM(quantity) as total_quantity,
-                AVG(unit_price_usd) as avg_unit_price_usd,
-                MIN(reg_date) as first_export_date,
-                MAX(reg_date) as last_export_date,
-                COUNT(DISTINCT hs_code) as unique_hs_codes,
-                COUNT(DISTINCT true_importer_name) as unique_importers
-            FROM analytics.product_icegate_imports 
-            WHERE unique_product_name IN ({placeholders})
-            AND true_supplier_name IS NOT NULL
-            AND total_value_usd IS NOT NULL
-        """
-        
-        # Create parameters dictionary
-        params = {f"param_{i}": name for i, name in enumerate(unique_product_names)}
-        
-        # Add filters (simplified for aggregation query)
-        if filters:
-            param_counter = len(params)
-            
-            if filters.hs_code:
-                base_query += f" AND hs_code = :filter_param_{param_counter}"
-                params[f"filter_param_{param_counter}"] = int(filters.hs_code)
-                param_counter += 1
-            
-            if filters.importer_id:
-                base_query += f" AND importer_id LIKE :filter_param_{param_counter}"
-                params[f"filter_param_{param_counter}"] = f"%{filters.importer_id}%"
-                param_counter += 1
-            
-            if filters.port_name:
-                base_query += f" AND (indian_port LIKE :filter_param_{param_counter} OR foreign_port LIKE :filter_param_{param_counter + 1})"
-                params[f"filter_param_{param_counter}"] = f"%{filters.port_name}%"
-                params[f"filter_param_{param_counter + 1}"] = f"%{filters.port_name}%"
-                param_counter += 2
-                
-            if filters.date_mode == "single" and filters.single_date:
-                base_query += f" AND reg_date = :filter_param_{param_counter}"
-                params[f"filter_param_{param_counter}"] = filters.single_date
-                param_counter += 1
-            elif filters.date_mode == "range":
-                if filters.start_date:
-                    base_query += f" AND reg_date >= :filter_param_{param_counter}"
-                    params[f"filter_param_{param_counter}"] = filters.start_date
-                    param_counter += 1
-                if filters.end_date:
-                    base_query += f" AND reg_date <= :filter_param_{param_counter}"
-                    params[f"filter_param_{param_counter}"] = filters.end_date
-                    param_counter += 1
-        
-        base_query += f"""
-            GROUP BY true_supplier_name, supplier_name
-            ORDER BY total_value_usd DESC
-            LIMIT {limit}
-        """
-        
-        # Execute query
-        df = pd.read_sql(text(base_query), engine, params=params)
-        
-        return {
-            "data": df.to_dict('records'),
-            "count": len(df),
-            "search_type": "top_suppliers",
-            "products_searched": unique_product_names
-        }
+        query, params = build_top_suppliers_query("unique_product_name", unique_product_names, filters, limit)
+        return _top_response(read_frame(query, params), "top_suppliers", unique_product_names)
+    except Exception as e:
+        return _top_error("get_top_suppliers_by_unique_product", e, "top_suppliers", unique_product_names)
+
+@cached_result("top_suppliers:unique_product_name")
+async def get_top_suppliers_by_unique_product_async(unique_product_names: List[str], filters: Optional[SearchFilters] = None, limit: int = 10) -> Dict[str, Any]:
+    """Async variant of get_top_suppliers_by_unique_product"""
+    try:
+        query, params = build_top_suppliers_query("unique_product_name", unique_product_names, filters, limit)
+        return _top_response(await read_frame_async(query, params), "top_suppliers", unique_product_names)
+    except Exception as e:
+        return _top_error("get_top_suppliers_by_unique_product_async", e, "top_suppliers", unique_product_names)
+
+# Dashboard - rows, top importers and top suppliers for one request in a single round-trip
+async def _run_dashboard_async(name_column: str, names: List[str], filters: Optional[SearchFilters],
+                               page_size: Optional[int], cursor: Optional[str], include_total: bool,
+                               limit: int, search_type: str) -> Dict[str, Any]:
+    # Names and filters are compiled once and shared by every query
+    match = name_match(name_column, names)
+    compiled = compile_filters(filters)
+    match_sql, match_params = match
+    queries = [
+        build_search_query(match_sql, match_params, filters, page_size, cursor, compiled),
+        build_top_importers_query(name_column, names, filters, limit, match, compiled),
+        build_top_suppliers_query(name_column, names, filters, limit, match, compiled),
+    ]
+    if include_total:
+        queries.append(build_count_query(match_sql, match_params, filters, compiled))
+    # Each query runs on its own pooled connection, so the database work overlaps
+    frames = await asyncio.gather(*(read_frame_async(query, params) for query, params in queries))
+    total_records = int(frames[3]["total_records"].iloc[0]) if include_total else None
+    return {
+        "search": _search_response(frames[0], search_type, page_size, total_records),
+        "top_importers": _top_response(frames[1], "top_importers", names),
+        "top_suppliers": _top_response(frames[2], "top_suppliers", names),
+        "search_type": search_type,
+        "products_searched": names
+    }
+
+def _dashboard_error(caller: str, e: Exception, names: List[str], search_type: str) -> Dict[str, Any]:
+    return {
+        "search": _search_error(caller, e, names, search_type),
+        "top_importers": _top_error(caller, e, "top_importers", names),
+        "top_suppliers": _top_error(caller, e, "top_suppliers", names),
+        "search_type": search_type,
+        "error": str(e),
+        "products_searched": names
+    }
+
+@cached_result("dashboard:product_name")
+async def get_dashboard_by_product_async(product_names: List[str], filters: Optional[SearchFilters] = None,
+                                         page_size: Optional[int] = None, cursor: Optional[str] = None,
+                                         include_total: bool = False, limit: int = 10) -> Dict[str, Any]:
+    """Rows page, top importers and top suppliers for product names, queried concurrently"""
+    try:
+        return await _run_dashboard_async("product_name", product_names, filters, page_size, cursor,
+                                          include_total, limit, "product_name")
+    except Exception as e:
+        return _dashboard_error("get_dashboard_by_product_async", e, product_names, "product_name")
+
+@cached_result("dashboard:unique_product_name")
+async def get_dashboard_by_unique_product_async(unique_product_names: List[str], filters: Optional[SearchFilters] = None,
+                                                page_size: Optional[int] = None, cursor: Optional[str] = None,
+                                                include_total: bool = False, limit: int = 10) -> Dict[str, Any]:
+    """Rows page, top importers and top suppliers for unique product names, queried concurrently"""
+    try:
+        return await _run_dashboard_async("unique_product_name", unique_product_names, filters, page_size, cursor,
+                                          include_total, limit, "unique_product_name")
     except Exception as e:
-        print(f"Error in get_top_suppliers_by_unique_product: {e}")
-        return {
-            "data": [],
-            "count": 0,
-            "search_type": "top_suppliers",
-            "error": str(e),
-            "products_searched": unique_product_names
-        }
\ No newline at end of file
+        return _dashboard_error("get_dashboard_by_unique_product_async", e, unique_product_names, "unique_product_name")
@@ -0,0 +1,137 @@
+# string_pool.py - Compact immutable string arrays: one UTF-8 buffer plus an offsets array
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Any, Container, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+_SEPARATOR = b"\0"
+# Buffer scans give up once at least this many hits show one string in _DENSE_RATIO matching
+_DENSE_MIN_HITS = 256
+_DENSE_RATIO = 8
+
+class StringPool:
+    """Immutable sequence of strings stored contiguously instead of as one heap object each.
+
+    String i is buffer[base + offsets[i]:base + offsets[i + 1] - 1]; every string is followed
+    by a NUL separator, so a substring search over the whole buffer never matches across two
+    strings. The buffer may be bytes or a memory-mapped file (base is the pool's start in it).
+    """
+
+    __slots__ = ("buffer", "offsets", "base")
+
+    def __init__(self, buffer: Any, offsets: Sequence[int], base: int = 0):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.base = base
+
+    @classmethod
+    def from_strings(cls, strings: Iterable[str]) -> 'StringPool':
+        encoded = [string.encode("utf-8") for string in strings]
+        buffer = _SEPARATOR.join(encoded) + _SEPARATOR if encoded else b""
+        if len(buffer) >= 2 ** 32:
+            raise ValueError("string pool exceeds 4 GiB")
+        return cls(buffer, array('I', accumulate((len(data) + 1 for data in encoded), initial=0)))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return self.take(range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        start = self.base + self.offsets[index]
+        return self.buffer[start:self.base + self.offsets[index + 1] - 1].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.to_list())
+
+    def to_list(self) -> List[str]:
+        """Decode every string at once (a single decode and split of the buffer)"""
+        if len(self) == 0:
+            return []
+        return self.buffer[self.base:self.base + self.offsets[-1] - 1].decode("utf-8").split("\0")
+
+    def take(self, ids: Iterable[int]) -> List[str]:
+        """Strings at the given ids, in that order"""
+        buffer, offsets, base = self.buffer, self.offsets, self.base
+        return [buffer[base + offsets[i]:base + offsets[i + 1] - 1].decode("utf-8") for i in ids]
+
+    def _scan(self, encoded: bytes) -> Optional[array]:
+        """Ascending ids of the strings containing `encoded`, found by scanning the buffer without
+        decoding; None as soon as matches turn out dense (decoding everything is cheaper then)"""
+        buffer, offsets, base = self.buffer, self.offsets, self.base
+        end = base + offsets[-1]
+        ids = array('I')
+        position = buffer.find(encoded, base, end)
+        while position >= 0:
+            i = bisect_right(offsets, position - base) - 1
+            ids.append(i)
+            if len(ids) >= _DENSE_MIN_HITS and len(ids) * _DENSE_RATIO > i:
+                return None
+            # Further hits inside the same string add nothing
+            position = buffer.find(encoded, base + offsets[i + 1], end)
+        return ids
+
+    def find_ids(self, needle: str) -> array:
+        """Ascending ids of the strings containing `needle`"""
+        ids = self._scan(needle.encode("utf-8")) if needle else None
+        if ids is None:
+            return array('I', [i for i, string in enumerate(self.to_list()) if needle in string])
+        return ids
+
+    def items_containing(self, needle: str) -> List[Tuple[int, str]]:
+        """(id, string) pairs of the strings containing `needle`, ascending by id"""
+        ids = self._scan(needle.encode("utf-8")) if needle else None
+        if ids is None:
+            return [(i, string) for i, string in enumerate(self.to_list()) if needle in string]
+        return list(zip(ids, self.take(ids)))
+
+    def filter_ids(self, ids: Iterable[int], needle: str) -> array:
+        """The ids (order kept) whose string contains `needle`"""
+        encoded = needle.encode("utf-8")
+        buffer, offsets, base = self.buffer, self.offsets, self.base
+        return array('I', [i for i in ids if buffer.find(encoded, base + offsets[i], base + offsets[i + 1] - 1) >= 0])
+
+    def prefix_ids(self, prefix: str, limit: int, within: Optional[Container[int]] = None) -> array:
+        """Ascending ids of the first `limit` strings starting with `prefix` (only ids in `within`,
+        when given), found by scanning the buffer for the prefix right after a separator"""
+        encoded = prefix.encode("utf-8")
+        buffer, offsets, base = self.buffer, self.offsets, self.base
+        ids = array('I')
+        if len(self) == 0 or not encoded or limit <= 0:
+            return ids
+        if buffer.find(encoded, base, base + offsets[1] - 1) == base and (within is None or 0 in within):
+            ids.append(0)
+        marker = _SEPARATOR + encoded
+        end = base + offsets[-1]
+        position = buffer.find(marker, base, end)
+        while position >= 0 and len(ids) < limit:
+            i = bisect_left(offsets, position + 1 - base)
+            if within is None or i in within:
+                ids.append(i)
+            position = buffer.find(marker, position + 1, end)
+        return ids
+
+    def match_spans(self, ids: Iterable[int], needle: str) -> List[Tuple[int, int]]:
+        """(characters before `needle`, bytes after it) of its first occurrence in each string at ids,
+        (-1, -1) where it is absent; (0, 0) means the string equals `needle`"""
+        encoded = needle.encode("utf-8")
+        buffer, offsets, base = self.buffer, self.offsets, self.base
+        spans = []
+        for i in ids:
+            start, end = base + offsets[i], base + offsets[i + 1] - 1
+            position = buffer.find(encoded, start, end)
+            if position < 0:
+                spans.append((-1, -1))
+            else:
+                before = position - start
+                if before:
+                    before = len(buffer[start:position].decode("utf-8"))
+                spans.append((before, end - position - len(encoded)))
+        return spans
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the buffer and offsets (shared page cache when memory-mapped)"""
+        return self.offsets[-1] + len(self.offsets) * 4
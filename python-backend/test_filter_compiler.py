@@ -0,0 +1,26 @@
+# test_filter_compiler.py - HS code, text and date filter compilation
+import pytest
+from filter_compiler import compile_filters, hs_code_range
+from models import SearchFilters
+
+def test_seven_digit_hs_code_is_exact_with_leading_zero():
+    compiled = compile_filters(SearchFilters(hs_code="9011100"))
+    assert compiled.sql == " AND hs_code = :filter_hs_code"
+    assert compiled.params == {"filter_hs_code": 9011100}
+
+def test_hs_code_prefixes_become_ranges():
+    assert hs_code_range("90") == (90000000, 91000000)
+    assert hs_code_range("0901") == (9010000, 9020000)
+    assert hs_code_range("901") == (9010000, 9020000)
+    assert hs_code_range("8471.30") == (84713000, 84713100)
+    assert hs_code_range("84713010") == (84713010, 84713011)
+    assert hs_code_range("8471301099") == (84713010, 84713011)
+
+def test_invalid_hs_code_raises():
+    with pytest.raises(ValueError):
+        hs_code_range("84A1")
+
+def test_port_name_defaults_to_substring():
+    compiled = compile_filters(SearchFilters(port_name="SHEVA"))
+    assert compiled.params == {"filter_port": "%SHEVA%"}
+    assert compile_filters(SearchFilters(port_name="INNSA1")).params == {"filter_port": "INNSA1"}
@@ -0,0 +1,26 @@
+# test_pagination.py - Cursor encoding and validation
+import base64
+import json
+from datetime import date
+import pytest
+from pagination import decode_cursor, encode_cursor
+
+def _token(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(date(2024, 3, 1), 42)) == (date(2024, 3, 1), 42)
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+
+@pytest.mark.parametrize("payload", [
+    {"d": 1, "i": 2},
+    {"d": None},
+    {"d": ["2024-03-01"], "i": 2},
+    {"d": "2024-03-01", "i": "2"},
+    {"d": "2024-03-01", "i": None},
+    {"d": "not a date", "i": 2},
+    [1, 2],
+])
+def test_malformed_cursor_raises_value_error(payload):
+    with pytest.raises(ValueError):
+        decode_cursor(_token(payload))
@@ -0,0 +1,23 @@
+# test_result_cache.py - In-process result cache bounds
+from result_cache import InProcessBackend, approximate_size
+
+def _page(rows: int):
+    return {"data": [{"name": f"IMPORTER {i}", "value": float(i)} for i in range(rows)], "count": rows}
+
+def test_cache_is_bounded_by_bytes():
+    page_size = approximate_size(_page(100))
+    backend = InProcessBackend(max_entries=100, max_bytes=page_size * 3, max_entry_bytes=page_size * 2)
+    for i in range(5):
+        backend.set(f"page{i}", _page(100), 60)
+    assert backend.size() == 3
+    assert backend.evictions == 2
+    assert backend.nbytes <= backend.max_bytes
+    assert backend.get("page0") is None and backend.get("page4") is not None
+
+def test_oversized_results_are_not_cached():
+    backend = InProcessBackend(max_entries=100, max_bytes=10 ** 9, max_entry_bytes=approximate_size(_page(10)))
+    backend.set("small", _page(10), 60)
+    backend.set("large", _page(10000), 60)
+    assert backend.get("large") is None
+    assert backend.oversized == 1
+    assert backend.nbytes == approximate_size(_page(10))
@@ -0,0 +1,31 @@
+# test_search_index.py - Trigram shortlists and their ranking
+from name_cleaning import clean_product_name
+from search_index import SuggestionCorpus, rank_matches
+from services import SUGGESTION_SHORTLIST_SIZE, fuzzy_match, shortlist_ids
+from string_pool import StringPool
+
+def _crowded_names():
+    # More short substring matches than the shortlist holds, plus longer prefix matches
+    return ([f"AB STEEL {i:04d}" for i in range(SUGGESTION_SHORTLIST_SIZE + 1000)]
+            + [f"STEEL PIPE SEAMLESS GRADE {i:02d}" for i in range(50)] + ["STEEL"])
+
+def test_shortlist_keeps_prefix_matches_when_crowded():
+    corpus = SuggestionCorpus.build(_crowded_names(), cleaner=clean_product_name)
+    ids = shortlist_ids("steel", corpus.trigram_index, corpus.upper)
+    assert len(ids) == SUGGESTION_SHORTLIST_SIZE
+    shortlisted = corpus.names.take(ids)
+    assert shortlisted[0] == "STEEL"
+    assert all(name.startswith("STEEL PIPE") for name in shortlisted[1:51])
+
+    full = fuzzy_match("STEEL", corpus.names, 20, "product_name",
+                       choices_upper=corpus.upper, choices_cleaned=corpus.cleaned)
+    narrowed = fuzzy_match("STEEL", corpus.names.take(ids), 20, "product_name",
+                           choices_upper=corpus.upper.take(ids), choices_cleaned=corpus.cleaned.take(ids))
+    assert narrowed == full
+    assert narrowed[1].startswith("STEEL PIPE")
+
+def test_rank_matches_tiers():
+    pool = StringPool.from_strings(["XX AB", "AB", "ABC", "X AB", "A-B"])
+    assert rank_matches(pool, range(5), "AB", 5) == [1, 2, 0, 3, 4]
+    assert rank_matches(pool, range(5), "AB", 2) == [1, 2]
+    assert rank_matches(pool, range(5), "AB", 5, by_position=True) == [1, 2, 3, 0, 4]
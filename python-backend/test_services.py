@@ -0,0 +1,22 @@
+# test_services.py - Suggestion paths over an in-memory corpus
+import pytest
+import services
+from name_cleaning import clean_product_name
+from search_index import SuggestionCorpus
+
+def _crowded_names():
+    # More short substring matches than the shortlist holds, plus longer prefix matches
+    return ([f"AB STEEL {i:04d}" for i in range(services.SUGGESTION_SHORTLIST_SIZE + 1000)]
+            + [f"STEEL PIPE SEAMLESS GRADE {i:02d}" for i in range(50)] + ["XSTEEL TUBE"])
+
+@pytest.mark.parametrize("search_type", ["product_name", "entity"])
+def test_session_refined_suggestions_match_unrefined(monkeypatch, search_type):
+    corpus = SuggestionCorpus.build(_crowded_names(), with_prefix_index=search_type == "entity",
+                                    cleaner=clean_product_name if search_type == "product_name" else None)
+    monkeypatch.setattr(services, "get_corpus", lambda _: corpus)
+    for query in ("STE", "STEE", "STEEL"):
+        refined = services._compute_fuzzy_suggestions(query, search_type, 10, session_id="session")
+    assert services.refinement_cache.narrow("session", search_type, corpus, "STEEL") is not None
+    unrefined = services._compute_fuzzy_suggestions("STEEL", search_type, 10)
+    assert refined == unrefined
+    assert refined[0].startswith("STEEL PIPE")
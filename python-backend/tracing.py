@@ -0,0 +1,104 @@
+# tracing.py - Leveled, per-request sampled tracing written off the request path through a queue
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from typing import Optional
+
+# off, error, warning, info or debug
+TRACE_LEVEL = os.getenv("TRACE_LEVEL", "off").strip().lower()
+# Fraction of requests traced when tracing is on (decided once per request)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+_LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+# Anything above CRITICAL disables tracing entirely
+_OFF = logging.CRITICAL + 10
+
+_threshold = _LEVELS.get(TRACE_LEVEL, _OFF)
+_sampled: ContextVar[bool] = ContextVar("trace_sampled", default=True)
+
+logger = logging.getLogger("trade_api.trace")
+logger.propagate = False
+_listener: Optional[logging.handlers.QueueListener] = None
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue the record untouched; the listener thread does all of the message formatting"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def _start_listener():
+    """Route trace records through a queue so emitting never blocks on stdout"""
+    global _listener
+    if _listener is not None:
+        return
+    records: "queue.SimpleQueue" = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter("%(asctime)s trace %(levelname)s %(message)s"))
+    logger.handlers = [_DeferredQueueHandler(records)]
+    logger.setLevel(DEBUG)
+    _listener = logging.handlers.QueueListener(records, stream)
+    _listener.start()
+
+def configure_tracing(level: str = TRACE_LEVEL, sample_rate: float = TRACE_SAMPLE_RATE):
+    """Set the trace level and sample rate (e.g. from a shell or a test)"""
+    global _threshold, TRACE_SAMPLE_RATE
+    _threshold = _LEVELS.get(level.strip().lower(), _OFF)
+    TRACE_SAMPLE_RATE = sample_rate
+    if _threshold != _OFF:
+        _start_listener()
+
+def stop_tracing():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def trace_enabled(level: int = DEBUG) -> bool:
+    """Whether a record at `level` would be written for the current request; guard diagnostic work with it"""
+    return level >= _threshold and _sampled.get()
+
+def trace(level: int, message: str, *args):
+    """Emit a trace record; `message % args` is only formatted when the record is actually written"""
+    if level >= _threshold and _sampled.get():
+        logger.log(level, message, *args)
+
+class Preview:
+    """Lazy `items[:count]` for trace arguments: nothing is sliced or formatted unless the record is written"""
+
+    __slots__ = ("items", "count")
+
+    def __init__(self, items, count: int = 5):
+        self.items = items
+        self.count = count
+
+    def __str__(self) -> str:
+        return str(list(self.items[:self.count]))
+
+class TracingMiddleware:
+    """ASGI middleware making one sampling decision per request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _threshold == _OFF or TRACE_SAMPLE_RATE >= 1.0:
+            await self.app(scope, receive, send)
+            return
+        token = _sampled.set(random.random() < TRACE_SAMPLE_RATE)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _sampled.reset(token)
+
+if _threshold != _OFF:
+    _start_listener()